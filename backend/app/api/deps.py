@@ -18,11 +18,37 @@ def get_db():
         db.close()
 
 
+def get_session_factory():
+    """Session factory for long-lived handlers such as WebSockets and SSE streams.
+
+    They open a short-lived session per unit of work instead of holding a
+    pooled connection for as long as the client stays connected.
+    """
+    return SessionLocal
+
+
+def with_session(session_factory, fn, *args):
+    """Run ``fn(db, *args)`` in a session from ``session_factory`` that is closed straight afterwards."""
+    db = session_factory()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db),
 ) -> User:
-    token = credentials.credentials
+    return get_user_from_token(db, credentials.credentials)
+
+
+def get_user_from_token(db: Session, token: str) -> User:
+    """Resolve a JWT access token to its user, raising 401 if it is invalid.
+
+    Shared by the bearer-header dependency and the WebSocket handshake, which
+    passes the token as a query parameter.
+    """
     payload = decode_access_token(token)
     if payload is None:
         raise HTTPException(
@@ -1,20 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import re
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from datetime import datetime, timedelta
 
 from app.api.deps import get_current_user, get_db
-from app.crud.match import get_match_by_id, get_matches
-from app.crud.message import create_message, get_messages, get_unread_count, mark_messages_read
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core.config import settings
+from app.crud.match import get_match_by_id
+from app.crud.message import (
+    create_message,
+    get_message,
+    get_inbox,
+    get_messages,
+    get_read_watermarks,
+    get_unread_count,
+    mark_messages_read,
+    search_messages,
+)
 from app.crud.spotify import get_spotify_tokens, save_spotify_tokens
 from app.models.user import User
 from app.schemas.message import (
+    InboxEntryResponse,
     MessageResponse,
+    MessageSearchHit,
     SendMessageRequest,
     SongSearchResult,
     UnreadCountResponse,
 )
-from app.services.spotify import is_mock_mode, refresh_access_token, search_tracks
+from app.services.message_writer import writer as message_writer
+from app.services.spotify import is_mock_mode, refresh_access_token, search_tracks_cached
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -53,18 +70,136 @@ def _verify_match_access(db: Session, match_id: int, user_id: int):
     return match
 
 
+@router.get("/inbox", response_model=list[InboxEntryResponse])
+def inbox(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """List every conversation with its last message and unread count, most recently active first.
+
+    Returns at most ``limit`` entries. When more remain, the X-Next-Cursor
+    response header carries a cursor to pass back for the next page.
+    """
+    before = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+    rows = get_inbox(db, current_user.id, limit + 1, before)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last[3].isoformat(), last[0].id)
+
+    entries = []
+    for match, other_user, message, last_activity, unread, watermark in rows:
+        last_message = None
+        if message is not None:
+            last_message = MessageResponse.model_validate(message)
+            last_message.is_read = watermark is not None and message.id <= watermark
+        entries.append(InboxEntryResponse(
+            id=match.id,
+            other_user={
+                "id": other_user.id,
+                "display_name": other_user.display_name,
+                "course": other_user.course if other_user.show_course else None,
+                "year": other_user.year if other_user.show_year else None,
+                "faculty": other_user.faculty if other_user.show_faculty else None,
+                "profile_picture": other_user.profile_picture,
+            },
+            compatibility_score=match.compatibility_score,
+            created_at=match.created_at,
+            last_message=last_message,
+            last_activity=last_activity,
+            unread_count=unread,
+        ))
+    return entries
+
+
 @router.get("/{match_id}", response_model=list[MessageResponse])
 def get_conversation(
     match_id: int,
-    limit: int = Query(50, le=100),
-    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    before_id: int | None = Query(None),
+    after_id: int | None = Query(None),
+    offset: int | None = Query(None, ge=0),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Get messages for a match conversation."""
-    _verify_match_access(db, match_id, current_user.id)
-    messages = get_messages(db, match_id, limit=limit, offset=offset)
-    return messages
+    """Get messages for a match conversation, oldest first.
+
+    Without parameters this is the latest ``limit`` messages. ``before_id``
+    pages back through older history and ``after_id`` fetches anything newer
+    than the last message seen. ``offset`` (from the oldest message) is kept
+    for older clients.
+    """
+    match = _verify_match_access(db, match_id, current_user.id)
+    if sum(p is not None for p in (before_id, after_id, offset)) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use only one of before_id, after_id and offset.",
+        )
+
+    messages = get_messages(
+        db, match_id, limit=limit, offset=offset,
+        before=_page_anchor(db, match_id, before_id),
+        after=_page_anchor(db, match_id, after_id),
+    )
+    return _with_read_state(db, match, messages)
+
+
+def _with_read_state(db: Session, match, messages) -> list[MessageResponse]:
+    """Report each message as read if it is at or below its recipient's read watermark."""
+    watermarks = get_read_watermarks(db, match.id)
+    responses = []
+    for message in messages:
+        recipient_id = match.user2_id if message.sender_id == match.user1_id else match.user1_id
+        response = MessageResponse.model_validate(message)
+        response.is_read = message.id <= watermarks.get(recipient_id, 0)
+        responses.append(response)
+    return responses
+
+
+def _page_anchor(db: Session, match_id: int, message_id: int | None):
+    """Resolve a before_id / after_id cursor to its message, or raise 400."""
+    if message_id is None:
+        return None
+    message = get_message(db, match_id, message_id)
+    if message is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Message not found in this conversation.",
+        )
+    return message
+
+
+@router.get("/{match_id}/search", response_model=list[MessageSearchHit])
+def search_conversation(
+    match_id: int,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Search a conversation's messages, newest first.
+
+    Every word of ``q`` must appear; the last may be a prefix. When more hits
+    remain, the X-Next-Cursor response header carries a cursor to pass back
+    for the next page.
+    """
+    match = _verify_match_access(db, match_id, current_user.id)
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return []
+    before_id = decode_cursor(cursor, int)[0] if cursor else None
+    hits = search_messages(db, match_id, terms, limit + 1, before_id)
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(hits[-1][0].id)
+
+    messages = _with_read_state(db, match, [message for message, _ in hits])
+    return [MessageSearchHit(message=message, snippet=snippet) for message, (_, snippet) in zip(messages, hits)]
 
 
 @router.post("/{match_id}", response_model=MessageResponse)
@@ -91,6 +226,24 @@ def send_message(
 
     song_dict = request.song_data.model_dump() if request.song_data else None
 
+    if message_writer.running:
+        try:
+            queued = message_writer.submit(
+                match_id=match_id,
+                sender_id=current_user.id,
+                content=request.content,
+                message_type=request.message_type,
+                song_data=song_dict,
+            )
+        except RuntimeError:
+            queued = None  # the writer began stopping after the check; insert directly
+        if queued is not None:
+            try:
+                return queued.result(timeout=settings.CHAT_WRITE_QUEUE_TIMEOUT)
+            except FutureTimeout:
+                # Withdraw it and insert directly; if the writer already took it, wait for that write
+                if not queued.cancel():
+                    return queued.result()
     msg = create_message(
         db,
         match_id=match_id,
@@ -120,9 +273,7 @@ def unread_count(
     db: Session = Depends(get_db),
 ):
     """Get unread message counts across all matches."""
-    matches = get_matches(db, current_user.id)
-    match_ids = [m.id for m in matches]
-    by_match = get_unread_count(db, current_user.id, match_ids)
+    by_match = get_unread_count(db, current_user.id)
     total = sum(by_match.values())
     return UnreadCountResponse(total=total, by_match=by_match)
 
@@ -174,7 +325,7 @@ def search_song(
             pass
 
     try:
-        return search_tracks(access_token, q.strip())
+        return search_tracks_cached(access_token, q)
     except Exception:
         results = [
             s for s in MOCK_SONG_RESULTS
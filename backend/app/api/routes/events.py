@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_session_factory, get_user_from_token, with_session
+from app.services import events
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+
+
+@router.get("/stream")
+async def event_stream(
+    token: str = Query(...),
+    last_event_id: str | None = Header(None),
+    session_factory=Depends(get_session_factory),
+):
+    """Server-sent events for the authenticated user: unread counts, new matches and reactions.
+
+    Pass the access token as ``?token=`` since EventSource cannot set headers.
+    Browsers resend the last ``id`` they saw as Last-Event-ID on reconnect,
+    and the events missed in between are replayed. See app.services.events
+    for the event types.
+
+    The token is checked in a session of its own, closed before streaming
+    starts, so idle streams hold no pooled connection.
+    """
+    user_id = await run_in_threadpool(with_session, session_factory, _user_id, token)
+    return StreamingResponse(
+        events.stream(user_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _user_id(db: Session, token: str) -> int:
+    return get_user_from_token(db, token).id
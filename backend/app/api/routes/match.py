@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import heapq
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, get_db
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.core import metrics
+from app.core.config import settings
 from app.crud.match import (
     check_mutual_like,
     create_match,
     create_swipe,
-    get_candidates,
     get_match_by_id,
-    get_matches,
+    get_matches_with_users,
+    get_scoring_pool,
     get_swipe,
 )
+from app.crud.feed_snapshot import get_snapshot, mark_feed_dirty
 from app.crud.playlist import add_member as add_playlist_member, create_playlist, get_playlist_by_match
 from app.crud.spotify import get_music_profile
 from app.models.user import User
@@ -18,10 +25,15 @@ from app.schemas.match import (
     CandidateResponse,
     CompatibilityBreakdown,
     MatchResponse,
+    SwipeBatchRequest,
+    SwipeBatchResponse,
+    SwipeBatchResult,
     SwipeRequest,
     SwipeResponse,
 )
-from app.services.compatibility import compute_compatibility
+from app.services.compat_cache import get_compatibility, get_compatibility_many
+from app.services.events import publish_match
+from app.services.feed_snapshots import snapshot_page
 from app.services.spotify import is_mock_mode
 
 router = APIRouter(prefix="/api/match", tags=["match"])
@@ -29,13 +41,29 @@ router = APIRouter(prefix="/api/match", tags=["match"])
 
 @router.get("/feed", response_model=list[CandidateResponse])
 def match_feed(
+    response: Response,
     course: str | None = Query(None),
     year: int | None = Query(None),
     faculty: str | None = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Get swipe-ready candidates with compatibility scores."""
+    """Get swipe-ready candidates with compatibility scores, best first.
+
+    Unfiltered requests are served from the user's feed snapshot when one has
+    been built for their current profile version; otherwise, or once the user
+    has swiped through a full snapshot, candidates are scored live.
+
+    Returns at most ``limit`` candidates. When more remain, the X-Next-Cursor
+    response header carries a cursor to pass back for the next page.
+    """
+    after = None
+    if cursor:
+        last_score, last_user_id = decode_cursor(cursor, float, int)
+        after = (-last_score, last_user_id)
+
     my_profile = get_music_profile(db, current_user.id)
     if not my_profile:
         from app.services.spotify import generate_mock_profile
@@ -44,27 +72,34 @@ def match_feed(
         save_music_profile(db, current_user.id, profile_data)
         my_profile = get_music_profile(db, current_user.id)
 
-    candidates = get_candidates(db, current_user.id, course, year, faculty)
+    snapshot = None if (course or year or faculty) else get_snapshot(db, current_user.id)
+    if snapshot is not None and snapshot.profile_version != my_profile.profile_version:
+        # Ranked against a profile the user has since re-synced: its order
+        # and scores no longer hold, so rank live until it is rebuilt
+        metrics.incr("feed_snapshots.stale")
+        mark_feed_dirty(db, current_user.id)
+        snapshot = None
+    page = None
+    if snapshot is not None:
+        page = snapshot_page(db, my_profile, snapshot, after, limit + 1)
+        if len(page) <= limit and len(snapshot.candidate_ids) >= settings.FEED_SNAPSHOT_SIZE:
+            # A full snapshot was cut off at FEED_SNAPSHOT_SIZE, so candidates
+            # past its end may remain: rank live and queue a fresh snapshot
+            metrics.incr("feed_snapshots.exhausted")
+            mark_feed_dirty(db, current_user.id)
+            page = None
+        else:
+            metrics.incr("feed_snapshots.served")
+    if page is None:
+        page = _live_page(db, my_profile, course, year, faculty, after, limit + 1)
+
+    if len(page) > limit:
+        page = page[:limit]
+        last_key = page[-1][0]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(-last_key[0], last_key[1])
 
     results = []
-    for user in candidates:
-        their_profile = get_music_profile(db, user.id)
-        if not their_profile:
-            continue
-
-        my_data = {
-            "top_artists": my_profile.top_artists or [],
-            "top_genres": my_profile.top_genres or [],
-            "listening_patterns": my_profile.listening_patterns or {},
-        }
-        their_data = {
-            "top_artists": their_profile.top_artists or [],
-            "top_genres": their_profile.top_genres or [],
-            "listening_patterns": their_profile.listening_patterns or {},
-        }
-
-        compat = compute_compatibility(my_data, their_data)
-
+    for _, user, their_profile, compat in page:
         top_artist_names = [a["name"] for a in (their_profile.top_artists or [])[:5]]
 
         results.append(CandidateResponse(
@@ -87,10 +122,28 @@ def match_feed(
             top_artists=top_artist_names,
         ))
 
-    results.sort(key=lambda c: c.compatibility_score, reverse=True)
+    # Persist any newly computed scores only after the rows above were read,
+    # since committing expires every loaded instance
+    db.commit()
+
     return results
 
 
+def _live_page(db: Session, my_profile, course, year, faculty, after, size: int) -> list[tuple]:
+    """Up to ``size`` (key, user, profile, compat) entries after ``after``, scored now."""
+    candidates = get_scoring_pool(db, my_profile, course, year, faculty)
+    scores = get_compatibility_many(db, my_profile, [their_profile for _, their_profile in candidates])
+
+    def ranked():
+        for (user, their_profile), compat in zip(candidates, scores):
+            key = (-compat["score"], user.id)
+            if after is None or key > after:
+                yield key, user, their_profile, compat
+
+    # Bounded heap: only size entries are held while scanning the pool
+    return heapq.nsmallest(size, ranked(), key=lambda item: item[0])
+
+
 @router.post("/swipe", response_model=SwipeResponse)
 def swipe(
     request: SwipeRequest,
@@ -98,6 +151,55 @@ def swipe(
     db: Session = Depends(get_db),
 ):
     """Like or pass on a user. Returns whether it's a mutual match."""
+    result = _apply_swipe(db, current_user, request)
+    db.commit()
+    if result.is_match:
+        publish_match(result.match_id, current_user.id, request.target_user_id)
+    return result
+
+
+@router.post("/swipes", response_model=SwipeBatchResponse)
+def swipe_batch(
+    request: SwipeBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Apply many queued swipes in one transaction.
+
+    Swipes are applied in order and each gets its own result; one that is
+    rejected (e.g. a duplicate) does not stop the rest.
+    """
+    results = []
+    for item in request.swipes:
+        try:
+            outcome = _apply_swipe(db, current_user, item)
+        except HTTPException as exc:
+            results.append(SwipeBatchResult(
+                target_user_id=item.target_user_id,
+                status_code=exc.status_code,
+                detail=exc.detail,
+            ))
+            continue
+        results.append(SwipeBatchResult(
+            target_user_id=item.target_user_id,
+            status_code=status.HTTP_200_OK,
+            detail=outcome.message,
+            is_match=outcome.is_match,
+            match_id=outcome.match_id,
+        ))
+    db.commit()
+    for result in results:
+        if result.is_match:
+            publish_match(result.match_id, current_user.id, result.target_user_id)
+    return SwipeBatchResponse(results=results)
+
+
+def _apply_swipe(db: Session, current_user: User, request: SwipeRequest) -> SwipeResponse:
+    """Record one swipe and any resulting match and playlist, without committing.
+
+    Everything is flushed into the caller's transaction so the whole
+    swipe -> match -> playlist flow lands in a single commit.
+    """
     if request.action not in ("like", "pass"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -117,13 +219,13 @@ def swipe(
             detail="You have already swiped on this user.",
         )
 
-    create_swipe(db, current_user.id, request.target_user_id, request.action)
+    create_swipe(db, current_user.id, request.target_user_id, request.action, commit=False)
 
     # In mock mode, auto-generate a reciprocal like so testing works with a single user
     if request.action == "like" and is_mock_mode():
         reverse = get_swipe(db, request.target_user_id, current_user.id)
         if not reverse:
-            create_swipe(db, request.target_user_id, current_user.id, "like")
+            create_swipe(db, request.target_user_id, current_user.id, "like", commit=False)
 
     is_match = False
     match_id = None
@@ -135,26 +237,18 @@ def swipe(
         score = 0
         breakdown = {}
         if my_profile and their_profile:
-            my_data = {
-                "top_artists": my_profile.top_artists or [],
-                "top_genres": my_profile.top_genres or [],
-                "listening_patterns": my_profile.listening_patterns or {},
-            }
-            their_data = {
-                "top_artists": their_profile.top_artists or [],
-                "top_genres": their_profile.top_genres or [],
-                "listening_patterns": their_profile.listening_patterns or {},
-            }
-            compat = compute_compatibility(my_data, their_data)
+            compat = get_compatibility(db, my_profile, their_profile)
             score = compat["score"]
             breakdown = compat
 
-        match = create_match(db, current_user.id, request.target_user_id, score, breakdown)
+        match = create_match(db, current_user.id, request.target_user_id, score, breakdown, commit=False)
         is_match = True
         match_id = match.id
 
         # Auto-create shared playlist for the match
-        _auto_create_playlist(db, match, current_user, request.target_user_id, breakdown)
+        _auto_create_playlist(
+            db, match, current_user, request.target_user_id, breakdown, my_profile, their_profile,
+        )
 
     return SwipeResponse(
         message="It's a match!" if is_match else "Swipe recorded.",
@@ -165,19 +259,26 @@ def swipe(
 
 @router.get("/matches", response_model=list[MatchResponse])
 def list_matches(
+    response: Response,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """List all matches for the current user."""
-    matches = get_matches(db, current_user.id)
+    """List the current user's matches, newest first.
+
+    Returns at most ``limit`` matches. When more remain, the X-Next-Cursor
+    response header carries a cursor to pass back for the next page.
+    """
+    before = decode_cursor(cursor, datetime.fromisoformat, int) if cursor else None
+    rows = get_matches_with_users(db, current_user.id, limit + 1, before)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at.isoformat(), last.id)
 
     results = []
-    for match in matches:
-        other_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
-        other_user = db.query(User).filter(User.id == other_id).first()
-        if not other_user:
-            continue
-
+    for match, other_user in rows:
         breakdown = match.breakdown or {}
         results.append(MatchResponse(
             id=match.id,
@@ -240,10 +341,10 @@ def match_detail(
     )
 
 
-def _auto_create_playlist(db: Session, match, current_user, target_user_id: int, breakdown: dict):
-    """Create a shared playlist when a match is formed."""
-    from datetime import datetime
-
+def _auto_create_playlist(
+    db: Session, match, current_user, target_user_id: int, breakdown: dict, my_profile, their_profile,
+):
+    """Create a shared playlist when a match is formed. Flushes but does not commit."""
     existing = get_playlist_by_match(db, match.id)
     if existing:
         return
@@ -253,9 +354,6 @@ def _auto_create_playlist(db: Session, match, current_user, target_user_id: int,
         return
 
     # Build initial tracks from shared artists
-    my_profile = get_music_profile(db, current_user.id)
-    their_profile = get_music_profile(db, target_user_id)
-
     initial_tracks = []
     if my_profile and their_profile:
         shared_artist_names = set(breakdown.get("shared_artists", []))
@@ -271,8 +369,6 @@ def _auto_create_playlist(db: Session, match, current_user, target_user_id: int,
                     "image_url": t.get("image_url"),
                     "spotify_url": None,
                     "spotify_id": t["spotify_id"],
-                    "added_by": current_user.id,
-                    "added_at": datetime.utcnow().isoformat(),
                 })
 
     playlist_name = f"{current_user.display_name} & {other_user.display_name}'s Mix"
@@ -284,7 +380,8 @@ def _auto_create_playlist(db: Session, match, current_user, target_user_id: int,
         description=f"Shared playlist from your {match.compatibility_score:.0f}% music match!",
         match_id=match.id,
         tracks=initial_tracks,
+        commit=False,
     )
 
-    add_playlist_member(db, playlist.id, current_user.id, role="owner")
-    add_playlist_member(db, playlist.id, target_user_id, role="owner")
+    add_playlist_member(db, playlist.id, current_user.id, role="owner", commit=False)
+    add_playlist_member(db, playlist.id, target_user_id, role="owner", commit=False)
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_current_user
+from app.core import metrics
+from app.models.user import User
+from app.services import search_cache
+from app.services.compat_cache import cache_stats
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@router.get("")
+def get_metrics(current_user: User = Depends(get_current_user)):
+    """In-process counters and gauges for this worker (cache hit rates, queue depths)."""
+    return {**metrics.snapshot(), "compat_cache": cache_stats(), "search_cache": search_cache.cache_stats()}
@@ -1,21 +1,24 @@
-from datetime import datetime
-
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user, get_db
+from app.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
 from app.crud.match import get_match_by_id, get_matches
 from app.crud.playlist import (
     add_member,
     add_track,
+    add_tracks,
     create_playlist,
-    generate_weekly_recap,
     get_latest_recap,
     get_member,
-    get_members,
     get_playlist,
     get_playlist_by_match,
+    get_playlist_counts,
+    get_track_counts,
+    get_tracks,
     get_user_playlists,
+    load_members,
     remove_member,
     remove_track,
 )
@@ -24,11 +27,14 @@ from app.models.user import User
 from app.schemas.playlist import (
     AddMemberRequest,
     AddTrackRequest,
+    AddTracksBatchRequest,
+    AddTracksBatchResponse,
     CreatePlaylistRequest,
     PlaylistMemberResponse,
     PlaylistResponse,
     PlaylistSummaryResponse,
     PlaylistTrack,
+    PlaylistTrackDelta,
     WeeklyRecapResponse,
 )
 from app.services.compatibility import compute_compatibility
@@ -36,19 +42,37 @@ from app.services.compatibility import compute_compatibility
 router = APIRouter(prefix="/api/playlist", tags=["playlist"])
 
 
-def _build_playlist_response(db: Session, playlist) -> PlaylistResponse:
-    members = get_members(db, playlist.id)
-    member_responses = []
-    for m in members:
-        user = db.query(User).filter(User.id == m.user_id).first()
-        if user:
-            member_responses.append(PlaylistMemberResponse(
-                user_id=user.id,
-                display_name=user.display_name,
-                role=m.role,
-            ))
+TRACK_PAGE_SIZE = 100
+EXPORT_BATCH_SIZE = 500
+
+
+def _member_responses(db: Session, playlist_id: int) -> list[PlaylistMemberResponse]:
+    return [
+        PlaylistMemberResponse(user_id=user.id, display_name=user.display_name, role=m.role)
+        for m, user in load_members(db, [playlist_id]).get(playlist_id, [])
+    ]
+
 
-    tracks = [PlaylistTrack(**t) for t in (playlist.tracks or [])]
+def _build_playlist_response(
+    db: Session,
+    playlist,
+    response: Response | None = None,
+    limit: int = TRACK_PAGE_SIZE,
+    after: tuple[int, int] | None = None,
+) -> PlaylistResponse:
+    """The playlist with its members and one page of tracks.
+
+    When more tracks remain and ``response`` is given, its X-Next-Cursor
+    header carries a cursor for the next page.
+    """
+    member_responses = _member_responses(db, playlist.id)
+
+    rows = get_tracks(db, playlist.id, limit + 1, after)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].position, rows[-1].id)
+    tracks = [PlaylistTrack.model_validate(t) for t in rows]
 
     return PlaylistResponse(
         id=playlist.id,
@@ -57,7 +81,7 @@ def _build_playlist_response(db: Session, playlist) -> PlaylistResponse:
         playlist_type=playlist.playlist_type,
         match_id=playlist.match_id,
         spotify_playlist_id=playlist.spotify_playlist_id,
-        track_count=len(tracks),
+        track_count=get_track_counts(db, [playlist.id]).get(playlist.id, 0),
         member_count=len(member_responses),
         tracks=tracks,
         members=member_responses,
@@ -66,6 +90,18 @@ def _build_playlist_response(db: Session, playlist) -> PlaylistResponse:
     )
 
 
+def _require_member(db: Session, playlist_id: int, user_id: int):
+    """The active playlist, or 404 if it doesn't exist and 403 if ``user_id`` isn't a member."""
+    playlist = get_playlist(db, playlist_id)
+    if not playlist:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+
+    member = get_member(db, playlist_id, user_id)
+    if not member:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this playlist.")
+    return playlist
+
+
 @router.get("", response_model=list[PlaylistSummaryResponse])
 def list_playlists(
     current_user: User = Depends(get_current_user),
@@ -73,17 +109,18 @@ def list_playlists(
 ):
     """List all playlists the user belongs to."""
     playlists = get_user_playlists(db, current_user.id)
+    counts = get_playlist_counts(db, [p.id for p in playlists])
     results = []
     for p in playlists:
-        members = get_members(db, p.id)
+        member_count, track_count = counts.get(p.id, (0, 0))
         results.append(PlaylistSummaryResponse(
             id=p.id,
             name=p.name,
             description=p.description,
             playlist_type=p.playlist_type,
             match_id=p.match_id,
-            track_count=len(p.tracks or []),
-            member_count=len(members),
+            track_count=track_count,
+            member_count=member_count,
             created_at=p.created_at,
         ))
     return results
@@ -92,24 +129,57 @@ def list_playlists(
 @router.get("/{playlist_id}", response_model=PlaylistResponse)
 def get_playlist_detail(
     playlist_id: int,
+    response: Response,
+    limit: int = Query(TRACK_PAGE_SIZE, ge=1, le=500),
+    cursor: str | None = Query(None),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Get playlist details including tracks and members."""
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+    """Get playlist details, members and a page of tracks.
+
+    ``tracks`` holds at most ``limit`` tracks in playlist order. When more
+    remain, the X-Next-Cursor response header carries a cursor to pass back
+    for the next page.
+    """
+    playlist = _require_member(db, playlist_id, current_user.id)
+    after = decode_cursor(cursor, int, int) if cursor else None
+    return _build_playlist_response(db, playlist, response, limit, after)
 
-    member = get_member(db, playlist_id, current_user.id)
-    if not member:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this playlist.")
 
-    return _build_playlist_response(db, playlist)
+@router.get("/{playlist_id}/tracks/export")
+def export_playlist_tracks(
+    playlist_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Stream every track as newline-delimited JSON, in playlist order.
+
+    Tracks are read in fixed-size keyset batches, so memory use does not
+    grow with the playlist.
+    """
+    _require_member(db, playlist_id, current_user.id)
+
+    def lines():
+        after = None
+        while True:
+            rows = get_tracks(db, playlist_id, EXPORT_BATCH_SIZE, after)
+            for row in rows:
+                yield PlaylistTrack.model_validate(row).model_dump_json() + "\n"
+            if len(rows) < EXPORT_BATCH_SIZE:
+                return
+            after = (rows[-1].position, rows[-1].id)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="playlist-{playlist_id}.ndjson"'},
+    )
 
 
 @router.post("", response_model=PlaylistResponse)
 def create_new_playlist(
     request: CreatePlaylistRequest,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -133,63 +203,75 @@ def create_new_playlist(
                 if user:
                     add_member(db, playlist.id, uid, role="editor")
 
-    return _build_playlist_response(db, playlist)
+    return _build_playlist_response(db, playlist, response)
 
 
-@router.post("/{playlist_id}/tracks", response_model=PlaylistResponse)
+@router.post("/{playlist_id}/tracks", response_model=PlaylistTrackDelta)
 def add_playlist_track(
     playlist_id: int,
     request: AddTrackRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Add a track to the playlist."""
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+    """Add a track to the playlist. Returns the added track and the new track count."""
+    _require_member(db, playlist_id, current_user.id)
 
-    member = get_member(db, playlist_id, current_user.id)
-    if not member:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this playlist.")
-
-    # Check for duplicate
-    existing_ids = {t.get("spotify_id") for t in (playlist.tracks or [])}
-    if request.spotify_id in existing_ids:
+    track = add_track(db, playlist_id, request.model_dump(), current_user.id)
+    if track is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Track already in playlist.")
+    return PlaylistTrackDelta(
+        added=PlaylistTrack.model_validate(track),
+        track_count=get_track_counts(db, [playlist_id]).get(playlist_id, 0),
+    )
+
 
-    track_data = request.model_dump()
-    updated = add_track(db, playlist_id, track_data, current_user.id)
-    return _build_playlist_response(db, updated)
+@router.post("/{playlist_id}/tracks:batch", response_model=AddTracksBatchResponse)
+def add_playlist_tracks_batch(
+    playlist_id: int,
+    request: AddTracksBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Add up to 500 tracks in one transaction.
+
+    Tracks already in the playlist, or repeated within the request, are
+    reported in ``skipped`` instead of failing the batch.
+    """
+    _require_member(db, playlist_id, current_user.id)
+
+    added, skipped = add_tracks(db, playlist_id, [t.model_dump() for t in request.tracks], current_user.id)
+    return AddTracksBatchResponse(
+        added=[PlaylistTrack.model_validate(t) for t in added],
+        skipped=skipped,
+        track_count=get_track_counts(db, [playlist_id]).get(playlist_id, 0),
+    )
 
 
-@router.delete("/{playlist_id}/tracks/{spotify_id}", response_model=PlaylistResponse)
+@router.delete("/{playlist_id}/tracks/{spotify_id}", response_model=PlaylistTrackDelta)
 def remove_playlist_track(
     playlist_id: int,
     spotify_id: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Remove a track from the playlist."""
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+    """Remove a track from the playlist. Returns its spotify_id and the new track count."""
+    _require_member(db, playlist_id, current_user.id)
 
-    member = get_member(db, playlist_id, current_user.id)
-    if not member:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this playlist.")
-
-    updated = remove_track(db, playlist_id, spotify_id)
-    return _build_playlist_response(db, updated)
+    removed = remove_track(db, playlist_id, spotify_id)
+    return PlaylistTrackDelta(
+        removed=spotify_id if removed else None,
+        track_count=get_track_counts(db, [playlist_id]).get(playlist_id, 0),
+    )
 
 
-@router.post("/{playlist_id}/members", response_model=PlaylistResponse)
+@router.post("/{playlist_id}/members", response_model=list[PlaylistMemberResponse])
 def add_playlist_member(
     playlist_id: int,
     request: AddMemberRequest,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Add a member to a group playlist (owner only)."""
+    """Add a member to a group playlist (owner only). Returns the members."""
     playlist = get_playlist(db, playlist_id)
     if not playlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
@@ -210,17 +292,17 @@ def add_playlist_member(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 
     add_member(db, playlist_id, request.user_id, role="editor")
-    return _build_playlist_response(db, playlist)
+    return _member_responses(db, playlist_id)
 
 
-@router.delete("/{playlist_id}/members/{user_id}", response_model=PlaylistResponse)
+@router.delete("/{playlist_id}/members/{user_id}", response_model=list[PlaylistMemberResponse])
 def remove_playlist_member(
     playlist_id: int,
     user_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Remove a member from a group playlist (owner only)."""
+    """Remove a member from a group playlist (owner only). Returns the members."""
     playlist = get_playlist(db, playlist_id)
     if not playlist:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
@@ -239,7 +321,7 @@ def remove_playlist_member(
     if not removed:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Member not found.")
 
-    return _build_playlist_response(db, playlist)
+    return _member_responses(db, playlist_id)
 
 
 @router.get("/{playlist_id}/recap", response_model=WeeklyRecapResponse | None)
@@ -248,19 +330,13 @@ def get_recap(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Get or generate the weekly recap for a playlist."""
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Playlist not found.")
+    """Get the latest weekly recap for a playlist, or null before its first one.
 
-    member = get_member(db, playlist_id, current_user.id)
-    if not member:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this playlist.")
+    Recaps are written by the weekly recap job, never by this endpoint.
+    """
+    _require_member(db, playlist_id, current_user.id)
 
     recap = get_latest_recap(db, playlist_id)
-    if not recap:
-        recap = generate_weekly_recap(db, playlist_id)
-
     if not recap:
         return None
 
@@ -276,6 +352,7 @@ def get_recap(
 @router.post("/auto-create/{match_id}", response_model=PlaylistResponse)
 def auto_create_match_playlist(
     match_id: int,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
@@ -290,7 +367,7 @@ def auto_create_match_playlist(
     # Check if playlist already exists for this match
     existing = get_playlist_by_match(db, match_id)
     if existing:
-        return _build_playlist_response(db, existing)
+        return _build_playlist_response(db, existing, response)
 
     other_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
     other_user = db.query(User).filter(User.id == other_id).first()
@@ -318,8 +395,6 @@ def auto_create_match_playlist(
                     "image_url": t.get("image_url"),
                     "spotify_url": None,
                     "spotify_id": t["spotify_id"],
-                    "added_by": current_user.id,
-                    "added_at": datetime.utcnow().isoformat(),
                 })
 
     playlist_name = f"{current_user.display_name} & {other_user.display_name}'s Mix"
@@ -336,4 +411,4 @@ def auto_create_match_playlist(
     add_member(db, playlist.id, current_user.id, role="owner")
     add_member(db, playlist.id, other_id, role="owner")
 
-    return _build_playlist_response(db, playlist)
+    return _build_playlist_response(db, playlist, response)
@@ -7,6 +7,7 @@ from typing import Optional
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
 from app.models.daily_tune import DailyTune, Reaction
+from app.services.events import publish_reaction
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/posts", tags=["posts"])
@@ -105,8 +106,9 @@ def react_to_tune(tune_id: int, req: ReactRequest, db: Session = Depends(get_db)
         raise HTTPException(status_code=404, detail="Tune not found.")
 
     existing = db.query(Reaction).filter(Reaction.daily_tune_id == tune_id, Reaction.user_id == current_user.id).first()
+    toggled_off = existing is not None and existing.reaction_type == req.reaction_type
     if existing:
-        if existing.reaction_type == req.reaction_type:
+        if toggled_off:
             # Toggle off
             db.delete(existing)
         else:
@@ -116,6 +118,8 @@ def react_to_tune(tune_id: int, req: ReactRequest, db: Session = Depends(get_db)
         db.add(reaction)
 
     db.commit()
+    if not toggled_off and tune.user_id != current_user.id:
+        publish_reaction(tune.user_id, tune_id, current_user.id, req.reaction_type)
     return get_post_response(tune, db, current_user.id)
 
 @router.delete("/{tune_id}")
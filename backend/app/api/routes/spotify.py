@@ -31,7 +31,7 @@ from app.services.spotify import (
     is_mock_mode,
     refresh_access_token,
     save_track_to_library,
-    search_tracks,
+    search_tracks_cached,
 )
 
 router = APIRouter(prefix="/api/spotify", tags=["spotify"])
@@ -206,7 +206,7 @@ def spotify_search(
         return results[:10]
     try:
         access_token = _get_valid_token(db, current_user.id)
-        return search_tracks(access_token, q.strip())
+        return search_tracks_cached(access_token, q)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Spotify search failed: {str(e)}")
 
@@ -0,0 +1,95 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_session_factory, get_user_from_token, with_session
+from app.core import metrics
+from app.crud.match import get_match_by_id, get_matches
+from app.services.chat_broker import Subscriber, broker
+
+router = APIRouter(tags=["chat"])
+
+
+@router.websocket("/ws/chat")
+async def chat_socket(
+    websocket: WebSocket,
+    token: str = Query(...),
+    session_factory=Depends(get_session_factory),
+):
+    """Real-time chat events for the authenticated user.
+
+    Connect with ``?token=<access token>``. The socket is subscribed to all of
+    the user's matches on connect; send ``{"action": "subscribe", "match_id": N}``
+    for matches formed later. Server events are JSON objects with a ``type``:
+
+    - ``message``: a new message, serialised like GET /api/chat/{match_id}
+    - ``read``: ``reader_id`` read ``count`` messages in ``match_id``
+    - ``ready``: sent once subscriptions are in place, listing the match ids
+    - ``resync``: events were dropped; refetch over REST
+    - ``subscribed`` / ``unsubscribed`` / ``error``: replies to client actions
+    """
+    try:
+        user_id, match_ids = await run_in_threadpool(with_session, session_factory, _authenticate, token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    subscriber = Subscriber()
+    for match_id in match_ids:
+        broker.subscribe(match_id, subscriber)
+    metrics.incr("chat_ws.connections")
+    # Anything sent before this point must be fetched over REST
+    await websocket.send_json({"type": "ready", "match_ids": match_ids})
+
+    async def send_events():
+        while True:
+            await websocket.send_json(await subscriber.queue.get())
+
+    async def receive_actions():
+        while True:
+            data = await websocket.receive_json()
+            await _handle_action(websocket, session_factory, user_id, subscriber, data)
+
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_actions())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            exc = task.exception()
+            if exc is not None and not isinstance(exc, WebSocketDisconnect):
+                raise exc
+    finally:
+        for task in tasks:
+            task.cancel()
+        broker.unsubscribe_all(subscriber)
+
+
+def _authenticate(db: Session, token: str) -> tuple[int, list[int]]:
+    user = get_user_from_token(db, token)
+    return user.id, [m.id for m in get_matches(db, user.id)]
+
+
+def _is_participant(db: Session, match_id: int, user_id: int) -> bool:
+    match = get_match_by_id(db, match_id)
+    return match is not None and user_id in (match.user1_id, match.user2_id)
+
+
+async def _handle_action(websocket: WebSocket, session_factory, user_id: int, subscriber: Subscriber, data) -> None:
+    action = data.get("action") if isinstance(data, dict) else None
+    match_id = data.get("match_id") if isinstance(data, dict) else None
+    if action not in ("subscribe", "unsubscribe") or not isinstance(match_id, int):
+        await websocket.send_json({"type": "error", "detail": "Expected {action: subscribe|unsubscribe, match_id}."})
+        return
+
+    if action == "unsubscribe":
+        broker.unsubscribe(match_id, subscriber)
+        await websocket.send_json({"type": "unsubscribed", "match_id": match_id})
+        return
+
+    if not await run_in_threadpool(with_session, session_factory, _is_participant, match_id, user_id):
+        await websocket.send_json({"type": "error", "match_id": match_id, "detail": "Not your match."})
+        return
+    broker.subscribe(match_id, subscriber)
+    await websocket.send_json({"type": "subscribed", "match_id": match_id})
@@ -0,0 +1,44 @@
+"""Fill in the packed artist/genre term ids for music profiles synced before they existed.
+
+Usage: python -m app.commands.backfill_profile_features
+"""
+from app.core.database import Base, SessionLocal, engine, upgrade_schema
+from app.models.music_profile import MusicProfile
+from app.services.features import build_feature_blobs
+
+BATCH_SIZE = 500
+
+
+def backfill(db) -> int:
+    """Encode every profile missing its feature blobs, committing per batch. Returns the count."""
+    done = 0
+    while True:
+        profiles = (
+            db.query(MusicProfile)
+            .filter((MusicProfile.artist_ids.is_(None)) | (MusicProfile.genre_ids.is_(None)))
+            .order_by(MusicProfile.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not profiles:
+            return done
+        for profile in profiles:
+            profile.artist_ids, profile.genre_ids = build_feature_blobs(
+                db, profile.top_artists or [], profile.top_genres or [],
+            )
+        db.commit()
+        done += len(profiles)
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        print(f"Backfilled {backfill(db)} music profiles.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
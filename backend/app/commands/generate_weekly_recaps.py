@@ -0,0 +1,37 @@
+"""Generate weekly playlist recaps now instead of waiting for the scheduler.
+
+Writes the recap of the last completed week, or of the week starting on
+the given Monday, for every active playlist that doesn't have one yet.
+First it enforces one recap per playlist and week on databases created
+before that constraint, deleting any duplicates; run it once after
+upgrading. Usage: python -m app.commands.generate_weekly_recaps [YYYY-MM-DD]
+"""
+import sys
+from datetime import date, datetime
+
+from app.core.database import Base, SessionLocal, engine, upgrade_schema
+from app.crud.playlist import add_weekly_recap_unique_index, week_start_of
+from app.services.weekly_recaps import last_completed_week, run_recaps
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    if len(sys.argv) > 1:
+        week = week_start_of(date.fromisoformat(sys.argv[1]))
+    else:
+        week = last_completed_week(datetime.utcnow())
+    db = SessionLocal()
+    try:
+        duplicates = add_weekly_recap_unique_index(db)
+        db.commit()
+        if duplicates:
+            print(f"Deleted {duplicates} duplicate recaps.")
+        written = run_recaps(db, week)
+        print(f"Wrote {written} recaps for the week of {week}.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
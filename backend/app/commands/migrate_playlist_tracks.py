@@ -0,0 +1,27 @@
+"""Move playlist tracks out of the legacy SharedPlaylist.tracks JSON column.
+
+Explodes each playlist's JSON array into playlist_tracks rows, in order,
+and empties the array, then recounts the weekly contribution counters
+used by the recaps. create_all does the same when it first adds the
+playlist_tracks table; this command re-runs it by hand and is harmless to
+repeat. Usage: python -m app.commands.migrate_playlist_tracks
+"""
+from app.core.database import Base, SessionLocal, engine, upgrade_schema
+from app.crud.playlist import migrate_json_tracks, rebuild_contributions
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        moved = migrate_json_tracks(db)
+        rebuild_contributions(db)
+        db.commit()
+        print(f"Moved {moved} playlist tracks.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Recompute the unread_counters table from the messages themselves.
+
+The counters are backfilled automatically when the table is first created;
+run this whenever they are suspected to have drifted.
+Usage: python -m app.commands.rebuild_unread_counters
+"""
+from app.core.database import Base, SessionLocal, engine, upgrade_schema
+from app.crud.message import rebuild_unread_counters
+
+
+def main() -> None:
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    db = SessionLocal()
+    try:
+        rows = rebuild_unread_counters(db)
+        db.commit()
+        print(f"Rebuilt {rows} unread counters.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,57 @@ class Settings(BaseSettings):
     # Set FORCE_MOCK_MODE=true in .env to always use mock Spotify data (useful for demos)
     FORCE_MOCK_MODE: bool = False
 
+    # Max pairwise compatibility results kept in the in-process LRU
+    COMPAT_CACHE_SIZE: int = 50000
+    # Spotify track searches cached per normalized query (see app.services.search_cache)
+    SEARCH_CACHE_SIZE: int = 2048
+    SEARCH_CACHE_TTL_SECONDS: float = 300.0
+    # Upper bound on candidates scored per match feed request
+    MATCH_FEED_MAX_CANDIDATES: int = 5000
+    # Above this many music profiles the feed shortlists candidates with MinHash LSH
+    MATCH_LSH_MIN_PROFILES: int = 20000
+    # Size of the LSH shortlist that is re-scored exactly
+    MATCH_LSH_CANDIDATES: int = 300
+    # The index is asked for this many times MATCH_LSH_CANDIDATES neighbours,
+    # so swiped and filtered-out users still leave a full shortlist
+    MATCH_LSH_OVERFETCH: int = 4
+    # Where the LSH index is saved on shutdown; empty keeps it in memory only
+    LSH_INDEX_PATH: str = "./db/lsh_index.npz"
+
+    # Background rebuilding of precomputed match feeds
+    FEED_SNAPSHOT_WORKER: bool = True
+    FEED_SNAPSHOT_INTERVAL_SECONDS: float = 30.0
+    # Snapshots rebuilt per worker pass
+    FEED_SNAPSHOT_BATCH: int = 50
+    # Ranked candidates kept per snapshot
+    FEED_SNAPSHOT_SIZE: int = 500
+
+    # How chat events reach sockets held by other worker processes:
+    # "memory" (single process), "sqlite" (workers on one host) or "redis"
+    # (needs the redis package, which is not in requirements.txt)
+    CHAT_FANOUT_BACKEND: str = "memory"
+    CHAT_FANOUT_SQLITE_PATH: str = "./db/fanout.db"
+    CHAT_FANOUT_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Group-commit chat message inserts on a single writer thread (see
+    # app.services.message_writer): wait this long for more messages to join
+    # a batch, and cap a batch at this many. A send still queued after
+    # CHAT_WRITE_QUEUE_TIMEOUT seconds is withdrawn and inserted directly
+    CHAT_WRITE_QUEUE: bool = False
+    CHAT_WRITE_QUEUE_MAX_WAIT_MS: float = 5.0
+    CHAT_WRITE_QUEUE_MAX_BATCH: int = 200
+    CHAT_WRITE_QUEUE_TIMEOUT: float = 5.0
+
+    # Server-sent event stream (/api/events/stream): seconds between
+    # keep-alive comments, and events per user kept for Last-Event-ID replay
+    EVENT_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    EVENT_REPLAY_SIZE: int = 100
+
+    # Generate last week's playlist recaps in the background once the week
+    # (Monday-Sunday, UTC) is over, checking this often
+    WEEKLY_RECAP_SCHEDULER: bool = True
+    WEEKLY_RECAP_INTERVAL_SECONDS: float = 600.0
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,69 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.compatibility import CompatibilityScore
+
+# Above this many pairs, fetch every cached row for the user instead of an IN list
+_IN_LIST_LIMIT = 500
+
+
+def get_cached_scores(
+    db: Session,
+    user_id: int,
+    profile_version: int,
+    other_versions: dict[int, int],
+) -> dict[int, dict]:
+    """Return cached breakdowns keyed by the other user's id, for pairs whose versions still match."""
+    if not other_versions:
+        return {}
+
+    query = db.query(CompatibilityScore)
+    if len(other_versions) <= _IN_LIST_LIMIT:
+        other_ids = list(other_versions)
+        query = query.filter(or_(
+            (CompatibilityScore.user_a_id == user_id) & CompatibilityScore.user_b_id.in_(other_ids),
+            (CompatibilityScore.user_b_id == user_id) & CompatibilityScore.user_a_id.in_(other_ids),
+        ))
+    else:
+        query = query.filter(or_(
+            CompatibilityScore.user_a_id == user_id,
+            CompatibilityScore.user_b_id == user_id,
+        ))
+
+    cached = {}
+    for row in query.all():
+        if row.user_a_id == user_id:
+            other_id, mine, theirs = row.user_b_id, row.profile_version_a, row.profile_version_b
+        else:
+            other_id, mine, theirs = row.user_a_id, row.profile_version_b, row.profile_version_a
+        if mine == profile_version and other_versions.get(other_id) == theirs:
+            cached[other_id] = row.breakdown
+    return cached
+
+
+def save_scores(db: Session, rows: list[dict]) -> None:
+    """Upsert computed scores. Each row has user_a_id < user_b_id, both versions, score and breakdown.
+
+    Does not commit; the caller's transaction carries the write.
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(db, CompatibilityScore)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_a_id", "user_b_id"],
+        set_={
+            "profile_version_a": stmt.excluded.profile_version_a,
+            "profile_version_b": stmt.excluded.profile_version_b,
+            "score": stmt.excluded.score,
+            "breakdown": stmt.excluded.breakdown,
+            "computed_at": stmt.excluded.computed_at,
+        },
+    )
+    db.execute(stmt, rows)
+
+
+def delete_user_scores(db: Session, user_id: int) -> None:
+    db.query(CompatibilityScore).filter(
+        or_(CompatibilityScore.user_a_id == user_id, CompatibilityScore.user_b_id == user_id)
+    ).delete(synchronize_session=False)
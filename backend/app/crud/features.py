@@ -0,0 +1,29 @@
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.feature_term import FeatureTerm
+
+
+def intern_terms(db: Session, kind: str, keys: list[str]) -> list[int]:
+    """Map each key to its feature_terms id, inserting keys seen for the first time.
+
+    Does not commit; the ids are only valid once the caller's transaction does.
+    """
+    distinct = list(dict.fromkeys(keys))
+    if not distinct:
+        return []
+
+    def lookup() -> dict[str, int]:
+        return dict(
+            db.query(FeatureTerm.key, FeatureTerm.id)
+            .filter(FeatureTerm.kind == kind, FeatureTerm.key.in_(distinct))
+            .all()
+        )
+
+    ids = lookup()
+    new = [k for k in distinct if k not in ids]
+    if new:
+        stmt = dialect_insert(db, FeatureTerm).on_conflict_do_nothing(index_elements=["kind", "key"])
+        db.execute(stmt, [{"kind": kind, "key": k} for k in new])
+        ids = lookup()
+    return [ids[k] for k in keys]
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.core.database import dialect_insert
+from app.models.feed_snapshot import FeedDirtyUser, FeedSnapshot
+
+
+def get_snapshot(db: Session, user_id: int) -> FeedSnapshot | None:
+    return db.query(FeedSnapshot).filter(FeedSnapshot.user_id == user_id).first()
+
+
+def save_snapshot(db: Session, user_id: int, profile_version: int, candidate_ids: list[int], scores: list[float]) -> None:
+    """Upsert a user's snapshot. Does not commit."""
+    stmt = dialect_insert(db, FeedSnapshot)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "candidate_ids": stmt.excluded.candidate_ids,
+            "scores": stmt.excluded.scores,
+            "profile_version": stmt.excluded.profile_version,
+            "built_at": stmt.excluded.built_at,
+        },
+    )
+    db.execute(stmt, {
+        "user_id": user_id,
+        "candidate_ids": candidate_ids,
+        "scores": scores,
+        "profile_version": profile_version,
+        "built_at": datetime.utcnow(),
+    })
+
+
+def delete_snapshot(db: Session, user_id: int) -> None:
+    db.query(FeedSnapshot).filter(FeedSnapshot.user_id == user_id).delete(synchronize_session=False)
+
+
+def mark_feed_dirty(db: Session, user_id: int) -> None:
+    """Queue a rebuild of ``user_id``'s snapshot. Does not commit."""
+    mark_feeds_dirty(db, [user_id])
+
+
+def mark_feeds_dirty(db: Session, user_ids: list[int]) -> None:
+    """Queue rebuilds of several users' snapshots. Does not commit."""
+    if not user_ids:
+        return
+    now = datetime.utcnow()
+    stmt = dialect_insert(db, FeedDirtyUser)
+    stmt = stmt.on_conflict_do_update(index_elements=["user_id"], set_={"queued_at": now})
+    db.execute(stmt, [{"user_id": user_id, "queued_at": now} for user_id in user_ids])
+
+
+def claim_dirty(db: Session, limit: int) -> list[int]:
+    """Dequeue up to ``limit`` of the longest-waiting users and return their ids. Does not commit.
+
+    The rows are taken with a single DELETE ... RETURNING, so when several
+    worker processes drain the queue each user is claimed by only one of
+    them. A user queued again while being rebuilt gets a fresh row.
+    """
+    oldest = select(FeedDirtyUser.user_id).order_by(FeedDirtyUser.queued_at).limit(limit)
+    rows = db.execute(
+        delete(FeedDirtyUser).where(FeedDirtyUser.user_id.in_(oldest)).returning(FeedDirtyUser.user_id)
+    ).all()
+    return [user_id for (user_id,) in rows]
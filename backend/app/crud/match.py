@@ -1,14 +1,27 @@
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from datetime import datetime
 
+from sqlalchemy import and_, case, or_
+from sqlalchemy.orm import Session, load_only
+
+from app.core.config import settings
 from app.models.match import Match, Swipe
 from app.models.music_profile import MusicProfile
 from app.models.user import User
+from app.services.lsh import retrieve_candidates
+
+# Multiplicative hashing constants for get_candidates' capped pool order
+_SHUFFLE_MULTIPLIER = 2654435761
+_SHUFFLE_OFFSET = 40503
+_SHUFFLE_MODULUS = 4294967291
 
 
-def create_swipe(db: Session, user_id: int, target_id: int, action: str) -> Swipe:
+def create_swipe(db: Session, user_id: int, target_id: int, action: str, commit: bool = True) -> Swipe:
+    """Record a swipe. With ``commit=False`` it is only flushed, joining the caller's transaction."""
     swipe = Swipe(user_id=user_id, target_user_id=target_id, action=action)
     db.add(swipe)
+    if not commit:
+        db.flush()
+        return swipe
     db.commit()
     db.refresh(swipe)
     return swipe
@@ -30,7 +43,9 @@ def check_mutual_like(db: Session, user_id: int, target_id: int) -> bool:
     ).first() is not None
 
 
-def create_match(db: Session, user1_id: int, user2_id: int, score: float, breakdown: dict) -> Match:
+def create_match(
+    db: Session, user1_id: int, user2_id: int, score: float, breakdown: dict, commit: bool = True,
+) -> Match:
     match = Match(
         user1_id=user1_id,
         user2_id=user2_id,
@@ -38,6 +53,9 @@ def create_match(db: Session, user1_id: int, user2_id: int, score: float, breakd
         breakdown=breakdown,
     )
     db.add(match)
+    if not commit:
+        db.flush()
+        return match
     db.commit()
     db.refresh(match)
     return match
@@ -49,6 +67,31 @@ def get_matches(db: Session, user_id: int) -> list[Match]:
     ).order_by(Match.created_at.desc()).all()
 
 
+def get_matches_with_users(
+    db: Session,
+    user_id: int,
+    limit: int,
+    before: tuple[datetime, int] | None = None,
+) -> list[tuple[Match, User]]:
+    """Get up to ``limit`` (match, other user) pairs, newest first, in one query.
+
+    ``before`` is the (created_at, id) of the last match on the previous page.
+    """
+    other_id = case((Match.user1_id == user_id, Match.user2_id), else_=Match.user1_id)
+    query = (
+        db.query(Match, User)
+        .join(User, User.id == other_id)
+        .filter(or_(Match.user1_id == user_id, Match.user2_id == user_id))
+    )
+    if before is not None:
+        created_at, match_id = before
+        query = query.filter(or_(
+            Match.created_at < created_at,
+            and_(Match.created_at == created_at, Match.id < match_id),
+        ))
+    return query.order_by(Match.created_at.desc(), Match.id.desc()).limit(limit).all()
+
+
 def get_match_by_id(db: Session, match_id: int) -> Match | None:
     return db.query(Match).filter(Match.id == match_id).first()
 
@@ -64,15 +107,40 @@ def get_candidates(
     course: str | None = None,
     year: int | None = None,
     faculty: str | None = None,
-) -> list[User]:
-    """Get users with music profiles, excluding self and already swiped."""
-    swiped_ids = get_swiped_user_ids(db, user_id)
-    exclude_ids = swiped_ids | {user_id}
+    limit: int | None = None,
+    user_ids: list[int] | None = None,
+) -> list[tuple[User, MusicProfile]]:
+    """Get (user, music profile) pairs for swipe candidates in one query.
+
+    Excludes self and already swiped users. Only the columns the feed renders
+    and scores are loaded. ``limit`` caps how many candidates are returned,
+    sampled evenly across sign-ups; ``user_ids`` restricts them to a
+    precomputed shortlist.
+    """
+    # Anti-join instead of binding every swiped id into NOT IN; each probe is a
+    # lookup on the (user_id, target_user_id) index behind uq_user_target_swipe
+    already_swiped = (
+        db.query(Swipe.id)
+        .filter(Swipe.user_id == user_id, Swipe.target_user_id == User.id)
+        .exists()
+    )
 
     query = (
-        db.query(User)
+        db.query(User, MusicProfile)
         .join(MusicProfile, MusicProfile.user_id == User.id)
-        .filter(User.id.notin_(exclude_ids))
+        .options(
+            load_only(
+                User.id, User.display_name, User.course, User.year, User.faculty,
+                User.show_course, User.show_year, User.show_faculty,
+                User.age, User.bio, User.hobbies, User.profile_picture,
+            ),
+            load_only(
+                MusicProfile.id, MusicProfile.user_id, MusicProfile.top_artists,
+                MusicProfile.top_genres, MusicProfile.listening_patterns, MusicProfile.profile_version,
+                MusicProfile.artist_ids, MusicProfile.genre_ids,
+            ),
+        )
+        .filter(User.id != user_id, ~already_swiped)
     )
 
     if course:
@@ -81,5 +149,39 @@ def get_candidates(
         query = query.filter(User.year == year)
     if faculty:
         query = query.filter(User.faculty == faculty)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    if limit:
+        # Cap on a per-viewer shuffle of user ids rather than on id order, so
+        # the pool isn't always the earliest sign-ups. It's a fixed
+        # permutation for each viewer, keeping feed pages consistent.
+        shuffle = (User.id * _SHUFFLE_MULTIPLIER + user_id * _SHUFFLE_OFFSET) % _SHUFFLE_MODULUS
+        query = query.order_by(shuffle, User.id).limit(limit)
+
+    return [(user, profile) for user, profile in query.all()]
 
-    return query.all()
+
+def get_scoring_pool(
+    db: Session,
+    profile: MusicProfile,
+    course: str | None = None,
+    year: int | None = None,
+    faculty: str | None = None,
+) -> list[tuple[User, MusicProfile]]:
+    """The (user, profile) candidates to score for ``profile``'s feed.
+
+    At campus scale this is the ``MATCH_LSH_CANDIDATES`` nearest LSH
+    neighbours that survive the swipe exclusion and filters. The index is
+    over-fetched so those don't eat the shortlist. If less than a full
+    shortlist survives (a narrow filter, or a user who has swiped through
+    their neighbourhood), it falls back to the capped SQL pool.
+    """
+    wanted = settings.MATCH_LSH_CANDIDATES
+    shortlist = retrieve_candidates(db, profile, limit=wanted * settings.MATCH_LSH_OVERFETCH)
+    if shortlist is not None:
+        rank = {user_id: i for i, user_id in enumerate(shortlist)}
+        survivors = get_candidates(db, profile.user_id, course, year, faculty, user_ids=shortlist)
+        if len(survivors) >= wanted:
+            survivors.sort(key=lambda pair: rank[pair[0].id])
+            return survivors[:wanted]
+    return get_candidates(db, profile.user_id, course, year, faculty, limit=settings.MATCH_FEED_MAX_CANDIDATES)
@@ -1,7 +1,18 @@
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+import html
+import re
+import secrets
+from collections import Counter
+from datetime import datetime
 
-from app.models.message import Message
+from sqlalchemy import and_, case, func, or_, select, text, tuple_, update
+from sqlalchemy.orm import Session, aliased
+
+from app.core.database import dialect_insert
+from app.models.match import Match
+from app.models.message import Message, UnreadCounter
+from app.models.user import User
+from app.services.chat_broker import publish_message, publish_read
+from app.services.events import publish_unread
 
 
 def create_message(
@@ -19,49 +30,310 @@ def create_message(
         message_type=message_type,
         song_data=song_data,
     )
-    db.add(msg)
+    unread = add_messages(db, [msg])
     db.commit()
     db.refresh(msg)
+    publish_new_messages([msg], unread)
     return msg
 
 
-def get_messages(db: Session, match_id: int, limit: int = 50, offset: int = 0) -> list[Message]:
-    return (
-        db.query(Message)
-        .filter(Message.match_id == match_id)
-        .order_by(Message.created_at.asc())
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
+def add_messages(db: Session, messages: list[Message]) -> dict[tuple[int, int], int]:
+    """Add ``messages`` and bump their recipients' unread counters, without committing.
+
+    Returns the new unread count for each (recipient id, match id) touched.
+    """
+    participants = {
+        match_id: (user1_id, user2_id)
+        for match_id, user1_id, user2_id in db.query(Match.id, Match.user1_id, Match.user2_id)
+        .filter(Match.id.in_({m.match_id for m in messages}))
+    }
+    db.add_all(messages)
+    bumps: Counter[tuple[int, int]] = Counter()
+    for msg in messages:
+        pair = participants.get(msg.match_id)
+        if pair is not None:
+            bumps[pair[1] if msg.sender_id == pair[0] else pair[0], msg.match_id] += 1
+    return {key: _bump_unread(db, *key, by=by) for key, by in bumps.items()}
+
+
+def publish_new_messages(messages: list[Message], unread: dict[tuple[int, int], int]) -> None:
+    """Announce committed messages and the unread counts add_messages returned for them."""
+    for msg in messages:
+        publish_message(msg)
+    for (user_id, match_id), count in unread.items():
+        publish_unread(user_id, match_id, count)
+
+
+def _bump_unread(db: Session, user_id: int, match_id: int, by: int = 1) -> int:
+    """Add ``by`` to ``user_id``'s unread counter in ``match_id`` and return the new count."""
+    stmt = dialect_insert(db, UnreadCounter).values(user_id=user_id, match_id=match_id, count=by)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "match_id"],
+        set_={"count": UnreadCounter.count + by},
+    ).returning(UnreadCounter.count)
+    return db.execute(stmt).scalar_one()
+
+
+def get_message(db: Session, match_id: int, message_id: int) -> Message | None:
+    return db.query(Message).filter(Message.id == message_id, Message.match_id == match_id).first()
+
+
+def get_messages(
+    db: Session,
+    match_id: int,
+    limit: int = 50,
+    offset: int | None = None,
+    before: Message | None = None,
+    after: Message | None = None,
+) -> list[Message]:
+    """Get a page of a conversation, oldest first.
+
+    ``before`` / ``after`` return the ``limit`` messages immediately older or
+    newer than that message. The row-value comparison lets the database seek
+    straight into the (match_id, created_at, id) index.
+    With neither, the latest ``limit`` messages are returned, unless a legacy
+    ``offset`` from the start of the conversation is given.
+    """
+    query = db.query(Message).filter(Message.match_id == match_id)
+    if offset is not None:
+        return query.order_by(Message.created_at.asc(), Message.id.asc()).offset(offset).limit(limit).all()
+
+    if after is not None:
+        return (
+            query.filter(tuple_(Message.created_at, Message.id) > (after.created_at, after.id))
+            .order_by(Message.created_at.asc(), Message.id.asc())
+            .limit(limit)
+            .all()
+        )
+
+    if before is not None:
+        query = query.filter(tuple_(Message.created_at, Message.id) < (before.created_at, before.id))
+    page = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+    page.reverse()
+    return page
 
 
 def mark_messages_read(db: Session, match_id: int, reader_id: int) -> int:
-    count = (
-        db.query(Message)
-        .filter(
+    """Move ``reader_id``'s read watermark up to the newest message in the match.
+
+    Only the reader's unread_counters row is written; the messages
+    themselves are not rewritten. The counter is lowered by the messages
+    the watermark passes over, in the same UPDATE that moves it, rather than
+    zeroed: a message sent after ``newest`` was read has already incremented
+    it and stays unread. Returns how many messages were marked read.
+    """
+    newest = db.query(func.max(Message.id)).filter(Message.match_id == match_id).scalar()
+    if newest is None:
+        return 0
+    # Participants who never had a message yet have no row for the UPDATE to move
+    db.execute(
+        dialect_insert(db, UnreadCounter)
+        .values(user_id=reader_id, match_id=match_id, count=0)
+        .on_conflict_do_nothing(index_elements=["user_id", "match_id"])
+    )
+    # Correlated to the counter row, so it counts from that row's current watermark
+    passed = (
+        select(func.count(Message.id))
+        .where(
             Message.match_id == match_id,
             Message.sender_id != reader_id,
-            Message.is_read == False,
+            Message.id > func.coalesce(UnreadCounter.last_read_message_id, 0),
+            Message.id <= newest,
+        )
+        .scalar_subquery()
+    )
+    mine = and_(UnreadCounter.user_id == reader_id, UnreadCounter.match_id == match_id)
+    read = db.execute(select(passed).where(mine)).scalar() or 0
+    db.execute(
+        update(UnreadCounter)
+        .where(mine, func.coalesce(UnreadCounter.last_read_message_id, 0) < newest)
+        .values(
+            count=case((UnreadCounter.count > passed, UnreadCounter.count - passed), else_=0),
+            last_read_message_id=newest,
         )
-        .update({"is_read": True})
     )
     db.commit()
-    return count
+    if read:
+        remaining = (
+            db.query(UnreadCounter.count)
+            .filter(UnreadCounter.user_id == reader_id, UnreadCounter.match_id == match_id)
+            .scalar()
+        ) or 0
+        publish_read(match_id, reader_id, read, newest)
+        publish_unread(reader_id, match_id, remaining)
+    return read
+
+
+def _fts_query(terms: list[str]) -> str:
+    # Quote every term so user input can never be parsed as FTS5 syntax; the
+    # last one is a prefix so results follow the user as they type
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _highlight(snippet: str, start: str, end: str) -> str:
+    """HTML-escape a raw engine snippet, turning its ``start``/``end`` match markers into <mark></mark>."""
+    parts = []
+    pos = 0
+    for match in re.finditer(f"{re.escape(start)}(.*?){re.escape(end)}", snippet, re.S):
+        parts.append(html.escape(snippet[pos:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(1))}</mark>")
+        pos = match.end()
+    parts.append(html.escape(snippet[pos:]))
+    return "".join(parts)
+
 
+def search_messages(
+    db: Session,
+    match_id: int,
+    terms: list[str],
+    limit: int,
+    before_id: int | None = None,
+) -> list[tuple[Message, str]]:
+    """Messages in ``match_id`` containing every term, newest first.
 
-def get_unread_count(db: Session, user_id: int, match_ids: list[int]) -> dict[int, int]:
-    if not match_ids:
-        return {}
+    Returns (message, snippet) rows. The snippet is HTML-escaped with the
+    matches wrapped in <mark></mark>. Pages are keyed on message id
+    (``before_id`` is the last hit of the previous page) rather than on
+    relevance: bm25 / ts_rank scores shift as messages are added anywhere,
+    so a score cursor would skip or repeat hits between pages.
+    """
+    # The engine marks matches with per-query random markers, which message
+    # text can't forge, and _highlight escapes everything around them
+    nonce = secrets.token_hex(8)
+    match_start, match_end = f"[{nonce}[", f"]{nonce}]"
+    params = {"match_id": match_id, "limit": limit}
+    if db.get_bind().dialect.name == "postgresql":
+        params["q"] = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        params["headline_options"] = f"StartSel={match_start}, StopSel={match_end}, MaxFragments=1"
+        hits = (
+            "SELECT m.id AS id, ts_headline('simple', m.content, q, :headline_options) AS snippet "
+            "FROM messages m, to_tsquery('simple', :q) q "
+            "WHERE to_tsvector('simple', m.content) @@ q AND m.match_id = :match_id"
+        )
+    else:
+        params["q"] = _fts_query(terms)
+        params["match_start"], params["match_end"] = match_start, match_end
+        hits = (
+            "SELECT m.id AS id, snippet(messages_fts, 0, :match_start, :match_end, '…', 12) AS snippet "
+            "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            "WHERE messages_fts MATCH :q AND m.match_id = :match_id"
+        )
+    sql = f"SELECT id, snippet FROM ({hits}) hits"
+    if before_id is not None:
+        sql += " WHERE id < :before_id"
+        params["before_id"] = before_id
+    rows = db.execute(text(sql + " ORDER BY id DESC LIMIT :limit"), params).all()
 
+    messages = {m.id: m for m in db.query(Message).filter(Message.id.in_([row.id for row in rows]))}
+    return [(messages[row.id], _highlight(row.snippet, match_start, match_end)) for row in rows]
+
+
+def get_read_watermarks(db: Session, match_id: int) -> dict[int, int]:
+    """Each participant's last_read_message_id in ``match_id``, by user id."""
     rows = (
-        db.query(Message.match_id, func.count(Message.id))
-        .filter(
-            Message.match_id.in_(match_ids),
-            Message.sender_id != user_id,
-            Message.is_read == False,
+        db.query(UnreadCounter.user_id, UnreadCounter.last_read_message_id)
+        .filter(UnreadCounter.match_id == match_id, UnreadCounter.last_read_message_id.isnot(None))
+        .all()
+    )
+    return dict(rows)
+
+
+def get_inbox(
+    db: Session,
+    user_id: int,
+    limit: int,
+    before: tuple[datetime, int] | None = None,
+) -> list[tuple]:
+    """Up to ``limit`` conversations, most recently active first, in one query.
+
+    Each row is (match, other user, last message or None, last activity,
+    unread count, read watermark of the last message's recipient). Last activity is the last
+    message's timestamp, or the match's for a conversation with no messages.
+    ``before`` is the (last activity, match id) of the last row on the
+    previous page.
+    """
+    other_id = case((Match.user1_id == user_id, Match.user2_id), else_=Match.user1_id)
+    last_message_id = (
+        select(Message.id)
+        .where(Message.match_id == Match.id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+        .correlate(Match)
+        .scalar_subquery()
+    )
+    mine, theirs = aliased(UnreadCounter), aliased(UnreadCounter)
+    last_activity = func.coalesce(Message.created_at, Match.created_at).label("last_activity")
+    query = (
+        db.query(
+            Match, User, Message, last_activity,
+            func.coalesce(mine.count, 0),
+            case((Message.sender_id == user_id, theirs.last_read_message_id), else_=mine.last_read_message_id),
         )
-        .group_by(Message.match_id)
+        .join(User, User.id == other_id)
+        .outerjoin(Message, Message.id == last_message_id)
+        .outerjoin(mine, and_(mine.match_id == Match.id, mine.user_id == user_id))
+        .outerjoin(theirs, and_(theirs.match_id == Match.id, theirs.user_id == other_id))
+        .filter(or_(Match.user1_id == user_id, Match.user2_id == user_id))
+    )
+    if before is not None:
+        query = query.filter(tuple_(last_activity, Match.id) < tuple(before))
+    return query.order_by(last_activity.desc(), Match.id.desc()).limit(limit).all()
+
+
+def get_unread_count(db: Session, user_id: int) -> dict[int, int]:
+    """Unread message counts by match id, from the materialized counters."""
+    rows = (
+        db.query(UnreadCounter.match_id, UnreadCounter.count)
+        .filter(UnreadCounter.user_id == user_id, UnreadCounter.count > 0)
         .all()
     )
     return {match_id: count for match_id, count in rows}
+
+
+def rebuild_unread_counters(db: Session) -> int:
+    """Recompute every counter from the messages and read watermarks. Does not commit.
+
+    Participants without a watermark yet get one from the legacy per-message
+    is_read flags. Returns how many participants have unread messages.
+    """
+    recipient_id = case((Message.sender_id == Match.user1_id, Match.user2_id), else_=Match.user1_id)
+    states = {(s.user_id, s.match_id): s for s in db.query(UnreadCounter).all()}
+
+    def state(user_id: int, match_id: int) -> UnreadCounter:
+        if (user_id, match_id) not in states:
+            states[user_id, match_id] = UnreadCounter(user_id=user_id, match_id=match_id, count=0)
+            db.add(states[user_id, match_id])
+        return states[user_id, match_id]
+
+    legacy = (
+        db.query(recipient_id, Message.match_id, func.max(Message.id))
+        .join(Match, Match.id == Message.match_id)
+        .filter(Message.is_read == True)  # noqa: E712
+        .group_by(recipient_id, Message.match_id)
+        .all()
+    )
+    for user_id, match_id, last_read in legacy:
+        row = state(user_id, match_id)
+        if row.last_read_message_id is None:
+            row.last_read_message_id = last_read
+    db.flush()
+
+    unread = (
+        db.query(recipient_id, Message.match_id, func.count(Message.id))
+        .join(Match, Match.id == Message.match_id)
+        .outerjoin(UnreadCounter, and_(
+            UnreadCounter.user_id == recipient_id, UnreadCounter.match_id == Message.match_id,
+        ))
+        .filter(Message.id > func.coalesce(UnreadCounter.last_read_message_id, 0))
+        .group_by(recipient_id, Message.match_id)
+        .all()
+    )
+    counts = {(user_id, match_id): count for user_id, match_id, count in unread}
+    for key, row in list(states.items()):
+        row.count = counts.get(key, 0)
+    for (user_id, match_id), count in counts.items():
+        state(user_id, match_id).count = count
+    db.flush()
+    return len(counts)
@@ -1,8 +1,16 @@
-from datetime import datetime, timedelta
+from collections import Counter
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
 
+from sqlalchemy import delete, func, insert, select, text, tuple_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.models.playlist import PlaylistMember, SharedPlaylist, WeeklyRecap
+from app.core.database import dialect_insert
+from app.models.playlist import PlaylistContribution, PlaylistMember, PlaylistTrack, SharedPlaylist, WeeklyRecap
+from app.models.user import User
+
+TRACK_FIELDS = ("spotify_id", "track_name", "artist", "album", "image_url", "spotify_url")
 
 
 def create_playlist(
@@ -13,6 +21,7 @@ def create_playlist(
     description: str | None = None,
     match_id: int | None = None,
     tracks: list | None = None,
+    commit: bool = True,
 ) -> SharedPlaylist:
     playlist = SharedPlaylist(
         name=name,
@@ -20,14 +29,43 @@ def create_playlist(
         created_by=created_by,
         playlist_type=playlist_type,
         match_id=match_id,
-        tracks=tracks or [],
+        tracks=[],
     )
     db.add(playlist)
+    db.flush()
+    if tracks:
+        now = datetime.utcnow()
+        rows = [
+            _track_values(playlist.id, position, track, added_by=created_by, added_at=now)
+            for position, track in enumerate(tracks)
+        ]
+        db.execute(insert(PlaylistTrack), rows)
+        _bump_contributions(db, playlist.id, [(row["added_by"], row["added_at"]) for row in rows])
+    if not commit:
+        return playlist
     db.commit()
     db.refresh(playlist)
     return playlist
 
 
+def _track_values(playlist_id: int, position: int, track: dict, added_by: int | None, added_at: datetime) -> dict:
+    """playlist_tracks column values for a track dict; its own added_by/added_at win."""
+    values = {field: track.get(field) for field in TRACK_FIELDS}
+    track_added_at = track.get("added_at")
+    if isinstance(track_added_at, str):
+        try:
+            track_added_at = datetime.fromisoformat(track_added_at)
+        except ValueError:
+            track_added_at = None
+    values.update(
+        playlist_id=playlist_id,
+        position=position,
+        added_by=track.get("added_by", added_by),
+        added_at=track_added_at or added_at,
+    )
+    return values
+
+
 def get_playlist(db: Session, playlist_id: int) -> SharedPlaylist | None:
     return db.query(SharedPlaylist).filter(
         SharedPlaylist.id == playlist_id,
@@ -45,9 +83,14 @@ def get_user_playlists(db: Session, user_id: int) -> list[SharedPlaylist]:
     ).order_by(SharedPlaylist.updated_at.desc()).all()
 
 
-def add_member(db: Session, playlist_id: int, user_id: int, role: str = "editor") -> PlaylistMember:
+def add_member(
+    db: Session, playlist_id: int, user_id: int, role: str = "editor", commit: bool = True,
+) -> PlaylistMember:
     member = PlaylistMember(playlist_id=playlist_id, user_id=user_id, role=role)
     db.add(member)
+    if not commit:
+        db.flush()
+        return member
     db.commit()
     db.refresh(member)
     return member
@@ -75,31 +118,238 @@ def get_members(db: Session, playlist_id: int) -> list[PlaylistMember]:
     ).all()
 
 
-def add_track(db: Session, playlist_id: int, track: dict, added_by: int) -> SharedPlaylist:
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
+def load_members(db: Session, playlist_ids: list[int]) -> dict[int, list[tuple[PlaylistMember, User]]]:
+    """Members of many playlists with their users, in one joined query.
+
+    Returns (member, user) pairs by playlist id, in join order; playlists
+    with no members are omitted.
+    """
+    rows = db.query(PlaylistMember, User).join(User, User.id == PlaylistMember.user_id).filter(
+        PlaylistMember.playlist_id.in_(playlist_ids),
+    ).order_by(PlaylistMember.playlist_id, PlaylistMember.id).all()
+    members: dict[int, list[tuple[PlaylistMember, User]]] = {}
+    for member, user in rows:
+        members.setdefault(member.playlist_id, []).append((member, user))
+    return members
+
+
+def get_playlist_counts(db: Session, playlist_ids: list[int]) -> dict[int, tuple[int, int]]:
+    """(member count, track count) for many playlists, in one query of two GROUP BYs.
+
+    Playlists with no members are omitted.
+    """
+    members = select(PlaylistMember.playlist_id, func.count().label("n")).where(
+        PlaylistMember.playlist_id.in_(playlist_ids),
+    ).group_by(PlaylistMember.playlist_id).subquery()
+    tracks = select(PlaylistTrack.playlist_id, func.count().label("n")).where(
+        PlaylistTrack.playlist_id.in_(playlist_ids),
+    ).group_by(PlaylistTrack.playlist_id).subquery()
+    rows = db.execute(
+        select(members.c.playlist_id, members.c.n, func.coalesce(tracks.c.n, 0))
+        .outerjoin(tracks, tracks.c.playlist_id == members.c.playlist_id)
+    ).all()
+    return {playlist_id: (member_count, track_count) for playlist_id, member_count, track_count in rows}
+
+
+def get_tracks(
+    db: Session,
+    playlist_id: int,
+    limit: int | None = None,
+    after: tuple[int, int] | None = None,
+) -> list[PlaylistTrack]:
+    """Tracks in playlist order, optionally a page of ``limit`` after (position, id) ``after``."""
+    query = db.query(PlaylistTrack).filter(PlaylistTrack.playlist_id == playlist_id)
+    if after is not None:
+        query = query.filter(tuple_(PlaylistTrack.position, PlaylistTrack.id) > tuple(after))
+    query = query.order_by(PlaylistTrack.position, PlaylistTrack.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def get_track_counts(db: Session, playlist_ids: list[int]) -> dict[int, int]:
+    """Number of tracks in each playlist, by playlist id; empty playlists are omitted."""
+    rows = db.query(PlaylistTrack.playlist_id, func.count(PlaylistTrack.id)).filter(
+        PlaylistTrack.playlist_id.in_(playlist_ids),
+    ).group_by(PlaylistTrack.playlist_id).all()
+    return dict(rows)
+
+
+def add_track(db: Session, playlist_id: int, track: dict, added_by: int) -> PlaylistTrack | None:
+    """Append ``track`` to the playlist in a single INSERT.
+
+    The position is computed inside the statement, and the unique
+    (playlist_id, spotify_id) index rejects duplicates: returns None if the
+    track is already in the playlist.
+    """
+    next_position = select(func.coalesce(func.max(PlaylistTrack.position), -1) + 1).where(
+        PlaylistTrack.playlist_id == playlist_id,
+    ).scalar_subquery()
+    values = {field: track.get(field) for field in TRACK_FIELDS}
+    stmt = insert(PlaylistTrack).values(
+        **values,
+        playlist_id=playlist_id,
+        position=next_position,
+        added_by=added_by,
+        added_at=datetime.utcnow(),
+    ).returning(PlaylistTrack)
+    try:
+        with db.begin_nested():
+            row = db.scalars(stmt).one()
+    except IntegrityError:
         return None
-    tracks = list(playlist.tracks or [])
-    track["added_by"] = added_by
-    track["added_at"] = datetime.utcnow().isoformat()
-    tracks.append(track)
-    playlist.tracks = tracks
-    playlist.updated_at = datetime.utcnow()
+    _bump_contributions(db, playlist_id, [(added_by, row.added_at)])
+    _touch(db, playlist_id)
     db.commit()
-    db.refresh(playlist)
-    return playlist
+    return row
 
 
-def remove_track(db: Session, playlist_id: int, spotify_id: str) -> SharedPlaylist:
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        return None
-    tracks = [t for t in (playlist.tracks or []) if t.get("spotify_id") != spotify_id]
-    playlist.tracks = tracks
-    playlist.updated_at = datetime.utcnow()
+def add_tracks(
+    db: Session, playlist_id: int, tracks: list[dict], added_by: int,
+) -> tuple[list[PlaylistTrack], list[str]]:
+    """Append many tracks in one transaction, skipping any already in the playlist.
+
+    Existing spotify_ids are looked up in a single query, the new tracks get
+    consecutive positions after the current last one, and they are written
+    with one multi-row INSERT. A track added concurrently by someone else is
+    skipped by the unique index rather than failing the batch.
+    Returns (added tracks in order, skipped spotify_ids).
+    """
+    requested = [track["spotify_id"] for track in tracks]
+    existing = set(db.scalars(select(PlaylistTrack.spotify_id).where(
+        PlaylistTrack.playlist_id == playlist_id,
+        PlaylistTrack.spotify_id.in_(set(requested)),
+    )))
+    fresh, seen = [], set(existing)
+    for track in tracks:
+        if track["spotify_id"] not in seen:
+            seen.add(track["spotify_id"])
+            fresh.append(track)
+
+    added = []
+    if fresh:
+        position = db.scalar(
+            select(func.coalesce(func.max(PlaylistTrack.position), -1) + 1)
+            .where(PlaylistTrack.playlist_id == playlist_id)
+        )
+        now = datetime.utcnow()
+        stmt = dialect_insert(db, PlaylistTrack).values([
+            _track_values(playlist_id, position + i, track, added_by=added_by, added_at=now)
+            for i, track in enumerate(fresh)
+        ]).on_conflict_do_nothing(index_elements=["playlist_id", "spotify_id"]).returning(PlaylistTrack.id)
+        ids = db.scalars(stmt).all()
+        added = db.query(PlaylistTrack).filter(PlaylistTrack.id.in_(ids)).order_by(
+            PlaylistTrack.position, PlaylistTrack.id,
+        ).all()
+        _bump_contributions(db, playlist_id, [(t.added_by, t.added_at) for t in added])
+        _touch(db, playlist_id)
     db.commit()
-    db.refresh(playlist)
-    return playlist
+
+    added_ids = {t.spotify_id for t in added}
+    skipped = []
+    for spotify_id in requested:
+        if spotify_id in added_ids:
+            added_ids.discard(spotify_id)
+        else:
+            skipped.append(spotify_id)
+    return added, skipped
+
+
+def remove_track(db: Session, playlist_id: int, spotify_id: str) -> bool:
+    """Delete one track from the playlist. Returns False if it was not in it."""
+    removed = db.execute(delete(PlaylistTrack).where(
+        PlaylistTrack.playlist_id == playlist_id,
+        PlaylistTrack.spotify_id == spotify_id,
+    ).returning(PlaylistTrack.added_by, PlaylistTrack.added_at)).first()
+    if removed is None:
+        return False
+    _bump_contributions(db, playlist_id, [tuple(removed)], by=-1)
+    _touch(db, playlist_id)
+    db.commit()
+    return True
+
+
+def week_start_of(moment: datetime | date) -> date:
+    """The Monday starting the week ``moment`` falls in."""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    return day - timedelta(days=day.weekday())
+
+
+def _bump_contributions(
+    db: Session, playlist_id: int, additions: Iterable[tuple[int | None, datetime]], by: int = 1,
+) -> None:
+    """Add ``by`` to the weekly contribution counter of each (added_by, added_at) given."""
+    counts = Counter(
+        (user_id, week_start_of(added_at)) for user_id, added_at in additions if user_id is not None
+    )
+    for (user_id, week_start), n in counts.items():
+        stmt = dialect_insert(db, PlaylistContribution).values(
+            playlist_id=playlist_id, user_id=user_id, week_start=week_start, count=by * n,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["playlist_id", "week_start", "user_id"],
+            set_={"count": PlaylistContribution.count + by * n},
+        )
+        db.execute(stmt)
+
+
+def rebuild_contributions(db: Session) -> int:
+    """Recompute every weekly contribution counter from playlist_tracks. Does not commit.
+
+    Returns how many counters were written.
+    """
+    counts: Counter[tuple[int, int, date]] = Counter()
+    rows = db.query(PlaylistTrack.playlist_id, PlaylistTrack.added_by, PlaylistTrack.added_at).filter(
+        PlaylistTrack.added_by.isnot(None), PlaylistTrack.added_at.isnot(None),
+    )
+    for playlist_id, user_id, added_at in rows:
+        counts[playlist_id, user_id, week_start_of(added_at)] += 1
+    db.execute(delete(PlaylistContribution))
+    if counts:
+        db.execute(insert(PlaylistContribution), [
+            {"playlist_id": playlist_id, "user_id": user_id, "week_start": week_start, "count": n}
+            for (playlist_id, user_id, week_start), n in counts.items()
+        ])
+    db.flush()
+    return len(counts)
+
+
+def _touch(db: Session, playlist_id: int) -> None:
+    db.execute(update(SharedPlaylist).where(SharedPlaylist.id == playlist_id).values(updated_at=datetime.utcnow()))
+
+
+def migrate_json_tracks(db: Session) -> int:
+    """Move tracks still stored in SharedPlaylist.tracks JSON into playlist_tracks. Does not commit.
+
+    Keeps each array's order and its added_by/added_at, skips entries without
+    a spotify_id and repeats of one already in the playlist, then empties the
+    JSON. Safe to run again. Returns how many tracks were moved.
+    """
+    moved = 0
+    for playlist in db.query(SharedPlaylist).filter(SharedPlaylist.tracks.isnot(None)):
+        if not playlist.tracks:
+            continue
+        seen = set(db.scalars(select(PlaylistTrack.spotify_id).where(PlaylistTrack.playlist_id == playlist.id)))
+        position = db.scalar(
+            select(func.coalesce(func.max(PlaylistTrack.position), -1) + 1)
+            .where(PlaylistTrack.playlist_id == playlist.id)
+        )
+        rows = []
+        for track in playlist.tracks:
+            spotify_id = track.get("spotify_id")
+            if not spotify_id or spotify_id in seen:
+                continue
+            seen.add(spotify_id)
+            rows.append(_track_values(
+                playlist.id, position + len(rows), track,
+                added_by=None, added_at=playlist.updated_at or playlist.created_at,
+            ))
+        if rows:
+            db.execute(insert(PlaylistTrack), rows)
+        playlist.tracks = []
+        moved += len(rows)
+    db.flush()
+    return moved
 
 
 def get_playlist_by_match(db: Session, match_id: int) -> SharedPlaylist | None:
@@ -109,51 +359,92 @@ def get_playlist_by_match(db: Session, match_id: int) -> SharedPlaylist | None:
     ).first()
 
 
-def generate_weekly_recap(db: Session, playlist_id: int) -> WeeklyRecap | None:
-    playlist = get_playlist(db, playlist_id)
-    if not playlist:
-        return None
+def generate_weekly_recaps(db: Session, week_start: date) -> int:
+    """Write the recap of the week starting ``week_start`` for every active playlist. Does not commit.
 
-    now = datetime.utcnow()
-    week_start = (now - timedelta(days=now.weekday())).date()
-
-    # Count tracks added this week
-    tracks = playlist.tracks or []
-    week_tracks = []
-    contributor_counts = {}
-    for t in tracks:
-        added_at = t.get("added_at")
-        if added_at:
-            try:
-                added_date = datetime.fromisoformat(added_at).date()
-                if added_date >= week_start:
-                    week_tracks.append(t)
-                    added_by = t.get("added_by", 0)
-                    contributor_counts[added_by] = contributor_counts.get(added_by, 0) + 1
-            except (ValueError, TypeError):
-                pass
-
-    top_contributor = max(contributor_counts, key=contributor_counts.get) if contributor_counts else None
-
-    recap_data = {
-        "tracks_added": len(week_tracks),
-        "top_contributor": top_contributor,
-        "total_tracks": len(tracks),
-        "week_tracks": [{"track_name": t["track_name"], "artist": t["artist"]} for t in week_tracks],
-    }
-
-    recap = WeeklyRecap(
-        playlist_id=playlist_id,
-        week_start=week_start,
-        recap_data=recap_data,
+    One batch pass: the week's tracks come from a single range scan on
+    playlist_tracks.added_at and the contributor counts from the
+    incrementally maintained playlist_contributions, so no playlist's tracks
+    are loaded in full. Playlists that already have a recap for the week are
+    skipped, including ones another process writes concurrently (the insert
+    does nothing on uq_weekly_recap conflicts). Returns how many recaps were written.
+
+    The insert names no conflict target, so it still works on databases
+    from before uq_weekly_recap, until add_weekly_recap_unique_index has run.
+    """
+    week_end = datetime.combine(week_start + timedelta(days=7), time.min)
+    done = select(WeeklyRecap.playlist_id).where(WeeklyRecap.week_start == week_start)
+    pending = select(SharedPlaylist.id).where(
+        SharedPlaylist.is_active == True,  # noqa: E712
+        SharedPlaylist.id.not_in(done),
     )
-    db.add(recap)
-    db.commit()
-    db.refresh(recap)
-    return recap
+    playlist_ids = list(db.scalars(pending))
+    if not playlist_ids:
+        return 0
+
+    week_tracks: dict[int, list[dict]] = {}
+    rows = db.query(PlaylistTrack.playlist_id, PlaylistTrack.track_name, PlaylistTrack.artist).filter(
+        PlaylistTrack.added_at >= datetime.combine(week_start, time.min),
+        PlaylistTrack.added_at < week_end,
+        PlaylistTrack.playlist_id.in_(pending),
+    ).order_by(PlaylistTrack.playlist_id, PlaylistTrack.position, PlaylistTrack.id)
+    for playlist_id, track_name, artist in rows:
+        week_tracks.setdefault(playlist_id, []).append({"track_name": track_name, "artist": artist})
+
+    contributors: dict[int, dict[int, int]] = {}
+    rows = db.query(PlaylistContribution.playlist_id, PlaylistContribution.user_id, PlaylistContribution.count).filter(
+        PlaylistContribution.week_start == week_start,
+        PlaylistContribution.count > 0,
+        PlaylistContribution.playlist_id.in_(pending),
+    )
+    for playlist_id, user_id, count in rows:
+        contributors.setdefault(playlist_id, {})[user_id] = count
+
+    # Playlist size as of the end of the week
+    totals = dict(db.query(PlaylistTrack.playlist_id, func.count(PlaylistTrack.id)).filter(
+        PlaylistTrack.added_at < week_end,
+        PlaylistTrack.playlist_id.in_(pending),
+    ).group_by(PlaylistTrack.playlist_id).all())
+
+    recaps = []
+    for playlist_id in playlist_ids:
+        counts = contributors.get(playlist_id, {})
+        tracks = week_tracks.get(playlist_id, [])
+        recaps.append({
+            "playlist_id": playlist_id,
+            "week_start": week_start,
+            "recap_data": {
+                "tracks_added": len(tracks),
+                "top_contributor": max(counts, key=counts.get) if counts else None,
+                "total_tracks": totals.get(playlist_id, 0),
+                "week_tracks": tracks,
+            },
+            "created_at": datetime.utcnow(),
+        })
+    stmt = dialect_insert(db, WeeklyRecap).on_conflict_do_nothing().returning(WeeklyRecap.playlist_id)
+    written = db.execute(stmt, recaps).all()
+    db.flush()
+    return len(written)
+
+
+def add_weekly_recap_unique_index(db: Session) -> int:
+    """Enforce uq_weekly_recap on a weekly_recaps table created before it existed. Does not commit.
+
+    Deletes all but the first recap (by id) of each playlist and week, then
+    creates the unique index if it is missing. Returns how many duplicates
+    were deleted.
+    """
+    deleted = db.execute(text(
+        "DELETE FROM weekly_recaps WHERE id NOT IN "
+        "(SELECT MIN(id) FROM weekly_recaps GROUP BY playlist_id, week_start)"
+    )).rowcount
+    db.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_weekly_recap ON weekly_recaps (playlist_id, week_start)"
+    ))
+    return deleted
 
 
 def get_latest_recap(db: Session, playlist_id: int) -> WeeklyRecap | None:
     return db.query(WeeklyRecap).filter(
         WeeklyRecap.playlist_id == playlist_id,
-    ).order_by(WeeklyRecap.created_at.desc()).first()
+    ).order_by(WeeklyRecap.week_start.desc(), WeeklyRecap.created_at.desc()).first()
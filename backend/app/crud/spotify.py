@@ -2,8 +2,14 @@ from datetime import datetime
 
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.crud.feed_snapshot import mark_feeds_dirty
 from app.models.spotify import SpotifyToken
 from app.models.music_profile import MusicProfile
+from app.models.user import User
+from app.services import lsh
+from app.services.compat_cache import invalidate_user as invalidate_compatibility
+from app.services.features import build_feature_blobs
 
 
 def get_spotify_tokens(db: Session, user_id: int) -> SpotifyToken | None:
@@ -52,31 +58,60 @@ def get_music_profile(db: Session, user_id: int) -> MusicProfile | None:
 
 
 def save_music_profile(db: Session, user_id: int, profile_data: dict) -> MusicProfile:
+    artist_ids, genre_ids = build_feature_blobs(db, profile_data["top_artists"], profile_data["top_genres"])
     existing = get_music_profile(db, user_id)
     if existing:
         existing.top_artists = profile_data["top_artists"]
         existing.top_genres = profile_data["top_genres"]
+        existing.artist_ids = artist_ids
+        existing.genre_ids = genre_ids
         existing.recent_tracks = profile_data["recent_tracks"]
         existing.listening_patterns = profile_data["listening_patterns"]
         existing.last_synced = datetime.utcnow()
+        existing.profile_version = (existing.profile_version or 0) + 1
+        _mark_affected_feeds(db, existing)
         db.commit()
         db.refresh(existing)
+        lsh.index_profile(existing)
         return existing
 
     profile = MusicProfile(
         user_id=user_id,
         top_artists=profile_data["top_artists"],
         top_genres=profile_data["top_genres"],
+        artist_ids=artist_ids,
+        genre_ids=genre_ids,
         recent_tracks=profile_data["recent_tracks"],
         listening_patterns=profile_data["listening_patterns"],
         last_synced=datetime.utcnow(),
+        # Versions never repeat for a user, so scores cached for a deleted
+        # profile (possibly in another process's LRU) can't match this one
+        profile_version=(db.query(User.last_profile_version).filter(User.id == user_id).scalar() or 0) + 1,
     )
     db.add(profile)
+    _mark_affected_feeds(db, profile)
     db.commit()
     db.refresh(profile)
+    lsh.index_profile(profile)
     return profile
 
 
+def _mark_affected_feeds(db: Session, profile: MusicProfile) -> None:
+    """Queue snapshot rebuilds for the profile's owner and the users it most resembles.
+
+    Similarity is symmetric, so the owner's LSH neighbours are the users whose
+    feeds the new profile is likely to enter near the top. Everyone else
+    picks it up on their own next rebuild.
+    """
+    neighbours = lsh.similar_users(db, profile, settings.MATCH_LSH_CANDIDATES)
+    mark_feeds_dirty(db, [profile.user_id, *neighbours])
+
+
 def delete_music_profile(db: Session, user_id: int) -> None:
+    version = db.query(MusicProfile.profile_version).filter(MusicProfile.user_id == user_id).scalar()
+    if version is not None:
+        db.query(User).filter(User.id == user_id).update({User.last_profile_version: version})
     db.query(MusicProfile).filter(MusicProfile.user_id == user_id).delete()
+    invalidate_compatibility(db, user_id)
     db.commit()
+    lsh.remove_profile(user_id)
@@ -2,6 +2,7 @@ import secrets
 
 from sqlalchemy.orm import Session
 
+from app.crud.feed_snapshot import mark_feed_dirty
 from app.models.user import User
 from app.services.auth import hash_password
 
@@ -41,6 +42,8 @@ def create_user(
         is_verified=True,
     )
     db.add(user)
+    db.flush()
+    mark_feed_dirty(db, user.id)
     db.commit()
     db.refresh(user)
     return user
@@ -57,6 +60,8 @@ def create_cas_user(db: Session, email: str, display_name: str) -> User:
         is_verified=True,
     )
     db.add(user)
+    db.flush()
+    mark_feed_dirty(db, user.id)
     db.commit()
     db.refresh(user)
     return user
@@ -1,11 +1,15 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
 
-from app.core.database import Base, engine
-from app.models import User, SpotifyToken, MusicProfile, Swipe, Match, Message, SharedPlaylist, PlaylistMember, WeeklyRecap, DailyTune, Reaction, CASTicket  # noqa: F401
+from app.api.pagination import NEXT_CURSOR_HEADER
+from app.core.database import Base, engine, upgrade_schema
+from app.models import User, SpotifyToken, MusicProfile, Swipe, Match, Message, UnreadCounter, SharedPlaylist, PlaylistTrack, PlaylistContribution, PlaylistMember, WeeklyRecap, DailyTune, Reaction, CASTicket, CompatibilityScore, FeatureTerm, FeedSnapshot, FeedDirtyUser  # noqa: F401
+from app.models.message import create_message_search
 from app.api.routes.auth import router as auth_router
 from app.api.routes.spotify import router as spotify_router
 from app.api.routes.match import router as match_router
@@ -13,11 +17,47 @@ from app.api.routes.chat import router as chat_router
 from app.api.routes.playlist import router as playlist_router
 from app.api.routes.posts import router as posts_router
 from app.api.routes.feed import router as feed_router
+from app.api.routes.metrics import router as metrics_router
+from app.api.routes.ws import router as ws_router
+from app.api.routes.events import router as events_router
+from app.core.config import settings
+from app.services import lsh
+from app.services.chat_broker import broker as chat_broker
+from app.services.feed_snapshots import FeedSnapshotWorker
+from app.services.message_writer import writer as message_writer
+from app.services.weekly_recaps import WeeklyRecapScheduler
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
+with engine.begin() as conn:
+    create_message_search(conn)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    worker = FeedSnapshotWorker() if settings.FEED_SNAPSHOT_WORKER else None
+    if worker:
+        worker.start()
+    chat_broker.start()
+    if settings.CHAT_WRITE_QUEUE:
+        message_writer.start()
+    recap_scheduler = WeeklyRecapScheduler() if settings.WEEKLY_RECAP_SCHEDULER else None
+    if recap_scheduler:
+        recap_scheduler.start()
+    yield
+    if recap_scheduler:
+        recap_scheduler.stop()
+    # Flush queued messages while the broker can still announce them
+    message_writer.stop()
+    chat_broker.stop()
+    if worker:
+        worker.stop()
+    # Persist the candidate index so the next start only re-hashes changed profiles
+    lsh.save()
+
 
-app = FastAPI(title="MusicMate API")
+app = FastAPI(title="MusicMate API", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -31,6 +71,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Register routers
@@ -41,6 +82,9 @@ app.include_router(chat_router)
 app.include_router(playlist_router)
 app.include_router(posts_router)
 app.include_router(feed_router)
+app.include_router(metrics_router)
+app.include_router(ws_router)
+app.include_router(events_router)
 
 # Static files for uploaded profile pictures
 os.makedirs("uploads", exist_ok=True)
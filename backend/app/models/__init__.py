@@ -2,9 +2,12 @@ from app.models.user import User
 from app.models.spotify import SpotifyToken
 from app.models.music_profile import MusicProfile
 from app.models.match import Swipe, Match
-from app.models.message import Message
-from app.models.playlist import SharedPlaylist, PlaylistMember, WeeklyRecap
+from app.models.message import Message, UnreadCounter
+from app.models.playlist import SharedPlaylist, PlaylistTrack, PlaylistContribution, PlaylistMember, WeeklyRecap
 from app.models.daily_tune import DailyTune, Reaction
 from app.models.cas_ticket import CASTicket
+from app.models.compatibility import CompatibilityScore
+from app.models.feature_term import FeatureTerm
+from app.models.feed_snapshot import FeedSnapshot, FeedDirtyUser
 
-__all__ = ["User", "SpotifyToken", "MusicProfile", "Swipe", "Match", "Message", "SharedPlaylist", "PlaylistMember", "WeeklyRecap", "DailyTune", "Reaction", "CASTicket"]
+__all__ = ["User", "SpotifyToken", "MusicProfile", "Swipe", "Match", "Message", "UnreadCounter", "SharedPlaylist", "PlaylistTrack", "PlaylistContribution", "PlaylistMember", "WeeklyRecap", "DailyTune", "Reaction", "CASTicket", "CompatibilityScore", "FeatureTerm", "FeedSnapshot", "FeedDirtyUser"]
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, JSON, UniqueConstraint
+
+from app.core.database import Base
+
+
+class CompatibilityScore(Base):
+    """Cached compatibility result for a pair of users.
+
+    The pair is stored with user_a_id < user_b_id, together with the profile
+    versions it was computed from; a row whose versions no longer match the
+    current profiles is stale and gets overwritten on the next computation.
+    """
+    __tablename__ = "compatibility_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_a_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_b_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    profile_version_a = Column(Integer, nullable=False)
+    profile_version_b = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    breakdown = Column(JSON, default=dict)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("user_a_id", "user_b_id", name="uq_compatibility_pair"),
+    )
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from app.core.database import Base
+
+
+class FeatureTerm(Base):
+    """Global dictionary mapping Spotify artist ids and genre names to small integers."""
+    __tablename__ = "feature_terms"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # "artist" or "genre"
+    key = Column(String, nullable=False)  # spotify_id for artists, the genre name for genres
+
+    __table_args__ = (
+        UniqueConstraint("kind", "key", name="uq_feature_term"),
+    )
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON
+
+from app.core.database import Base
+
+
+class FeedSnapshot(Base):
+    """A user's precomputed match feed: candidate ids and scores, best first.
+
+    Built by the feed snapshot worker from the unfiltered candidate pool;
+    swipes made after ``built_at`` are filtered out when the feed is served.
+    """
+    __tablename__ = "feed_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    candidate_ids = Column(JSON, default=list)
+    scores = Column(JSON, default=list)  # aligned with candidate_ids
+    profile_version = Column(Integer, nullable=False)
+    built_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class FeedDirtyUser(Base):
+    """Queue of users whose feed snapshot needs rebuilding, one row per user."""
+    __tablename__ = "feed_dirty_queue"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    queued_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, Integer, JSON, String, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, DateTime, Float, Index, Integer, JSON, String, ForeignKey, UniqueConstraint
 
 from app.core.database import Base
 
@@ -28,3 +28,10 @@ class Match(Base):
     compatibility_score = Column(Float, nullable=False)
     breakdown = Column(JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # One index per side of the pair, so "my matches, newest first" can be
+    # answered from either column without a table scan
+    __table_args__ = (
+        Index("ix_matches_user1_created", "user1_id", "created_at"),
+        Index("ix_matches_user2_created", "user2_id", "created_at"),
+    )
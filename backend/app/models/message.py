@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, Integer, JSON, String, ForeignKey
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, JSON, String, ForeignKey, UniqueConstraint, event, inspect, text
+from sqlalchemy.orm import Session
 
 from app.core.database import Base
 
@@ -14,5 +15,89 @@ class Message(Base):
     content = Column(String, nullable=False)
     message_type = Column(String, default="text")  # "text" or "song_share"
     song_data = Column(JSON, nullable=True)
-    is_read = Column(Boolean, default=False)
+    is_read = Column(Boolean, default=False)  # legacy; read state is UnreadCounter.last_read_message_id
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Covers keyset pages of one conversation in (created_at, id) order
+    __table_args__ = (
+        Index("ix_messages_match_created_id", "match_id", "created_at", "id"),
+    )
+
+
+# Full-text index over messages.content, kept in sync by triggers. SQLite
+# uses an external-content FTS5 table; Postgres a GIN index on the tsvector.
+_SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+_POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_content_tsv ON messages USING gin (to_tsvector('simple', content))",
+]
+
+
+def create_message_search(conn) -> None:
+    """Create the full-text index over messages if it is missing, indexing existing rows once."""
+    if conn.dialect.name == "postgresql":
+        for ddl in _POSTGRES_SEARCH_DDL:
+            conn.execute(text(ddl))
+        return
+    existed = inspect(conn).has_table("messages_fts")
+    for ddl in _SQLITE_SEARCH_DDL:
+        conn.execute(text(ddl))
+    if not existed:
+        conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+
+
+@event.listens_for(Message.__table__, "after_create")
+def _create_search(target, conn, **kw) -> None:
+    create_message_search(conn)
+
+
+@event.listens_for(Message.__table__, "after_drop")
+def _drop_search(target, conn, **kw) -> None:
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("DROP TABLE IF EXISTS messages_fts"))
+
+
+class UnreadCounter(Base):
+    """One participant's read state in a match.
+
+    ``last_read_message_id`` is the read watermark: every message from the
+    other participant with an id at or below it has been read. ``count`` is
+    the number of messages above it, maintained alongside the messages
+    themselves -- create_message increments the recipient's counter and
+    mark_messages_read moves the reader's watermark and zeroes it.
+    """
+    __tablename__ = "unread_counters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    match_id = Column(Integer, ForeignKey("matches.id"), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    last_read_message_id = Column(Integer, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "match_id", name="uq_unread_user_match"),
+    )
+
+
+@event.listens_for(UnreadCounter.__table__, "after_create")
+def _backfill_unread_counters(target, conn, **kw) -> None:
+    """Seed counters and watermarks for the existing conversations when create_all first adds the table."""
+    if not inspect(conn).has_table("messages"):
+        return
+    from app.crud.message import rebuild_unread_counters  # the crud module imports this one
+
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        rebuild_unread_counters(db)
+        db.commit()
+    finally:
+        db.close()
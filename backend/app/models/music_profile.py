@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, JSON, LargeBinary
 from sqlalchemy.orm import relationship
 
 from app.core.database import Base
@@ -16,5 +16,10 @@ class MusicProfile(Base):
     recent_tracks = Column(JSON, default=list)
     listening_patterns = Column(JSON, default=dict)
     last_synced = Column(DateTime, default=datetime.utcnow)
+    # Bumped on every save so cached pairwise scores can tell they are stale
+    profile_version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Distinct FeatureTerm ids of top_artists / top_genres as packed int32 arrays
+    artist_ids = Column(LargeBinary, nullable=True)
+    genre_ids = Column(LargeBinary, nullable=True)
 
     user = relationship("User", backref="music_profile")
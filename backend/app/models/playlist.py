@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Integer, JSON, String, UniqueConstraint
+from sqlalchemy import Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, JSON, String, UniqueConstraint, event, inspect
+from sqlalchemy.orm import Session
 
 from app.core.database import Base
 
@@ -15,12 +16,69 @@ class SharedPlaylist(Base):
     spotify_playlist_id = Column(String, nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     playlist_type = Column(String, default="match")  # "match" or "group"
-    tracks = Column(JSON, default=list)
+    tracks = Column(JSON, default=list)  # legacy; tracks now live in playlist_tracks
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+class PlaylistTrack(Base):
+    __tablename__ = "playlist_tracks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    playlist_id = Column(Integer, ForeignKey("shared_playlists.id"), nullable=False)
+    spotify_id = Column(String, nullable=False)
+    track_name = Column(String, nullable=False)
+    artist = Column(String, nullable=False)
+    album = Column(String, nullable=True)
+    image_url = Column(String, nullable=True)
+    spotify_url = Column(String, nullable=True)
+    # Playlist order; removals leave gaps, new tracks go after the current last
+    position = Column(Integer, nullable=False)
+    added_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    added_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("playlist_id", "spotify_id", name="uq_playlist_track"),
+        Index("ix_playlist_tracks_playlist_position", "playlist_id", "position"),
+        # Weekly recaps read a week's additions across all playlists by range
+        Index("ix_playlist_tracks_added_at", "added_at"),
+    )
+
+
+
+@event.listens_for(PlaylistTrack.__table__, "after_create")
+def _backfill_playlist_tracks(target, conn, **kw) -> None:
+    """Move the legacy JSON tracks in when create_all first adds the table, so no playlist reads as empty."""
+    if not inspect(conn).has_table("shared_playlists"):
+        return
+    from app.crud.playlist import migrate_json_tracks, rebuild_contributions  # the crud module imports this one
+
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    try:
+        migrate_json_tracks(db)
+        if inspect(conn).has_table("playlist_contributions"):
+            rebuild_contributions(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+class PlaylistContribution(Base):
+    """Tracks each member has added to a playlist per week, kept current as tracks come and go."""
+    __tablename__ = "playlist_contributions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    playlist_id = Column(Integer, ForeignKey("shared_playlists.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    week_start = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("playlist_id", "week_start", "user_id", name="uq_playlist_contribution"),
+    )
+
+
 class PlaylistMember(Base):
     __tablename__ = "playlist_members"
 
@@ -43,3 +101,8 @@ class WeeklyRecap(Base):
     week_start = Column(Date, nullable=False)
     recap_data = Column(JSON, default=dict)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # One recap per playlist per week, however many schedulers race to write it
+        UniqueConstraint("playlist_id", "week_start", name="uq_weekly_recap"),
+    )
@@ -30,3 +30,6 @@ class User(Base):
     profile_picture = Column(String, nullable=True)
     daily_tune_streak = Column(Integer, default=0)
     last_tune_date = Column(String, nullable=True)
+    # profile_version of the user's last deleted music profile, so a
+    # re-created profile continues the sequence instead of restarting at 1
+    last_profile_version = Column(Integer, nullable=False, default=0, server_default="0")
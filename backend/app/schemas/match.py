@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SwipeRequest(BaseModel):
@@ -14,6 +14,22 @@ class SwipeResponse(BaseModel):
     match_id: int | None = None
 
 
+class SwipeBatchRequest(BaseModel):
+    swipes: list[SwipeRequest] = Field(min_length=1, max_length=100)
+
+
+class SwipeBatchResult(BaseModel):
+    target_user_id: int
+    status_code: int  # what POST /swipe would have returned for this swipe
+    detail: str
+    is_match: bool = False
+    match_id: int | None = None
+
+
+class SwipeBatchResponse(BaseModel):
+    results: list[SwipeBatchResult]
+
+
 class CompatibilityBreakdown(BaseModel):
     shared_artists: list[str]
     shared_genres: list[str]
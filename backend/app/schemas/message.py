@@ -32,6 +32,21 @@ class MessageResponse(BaseModel):
         from_attributes = True
 
 
+class MessageSearchHit(BaseModel):
+    message: MessageResponse
+    snippet: str  # HTML-escaped, with matched terms wrapped in <mark></mark>
+
+
+class InboxEntryResponse(BaseModel):
+    id: int  # match id
+    other_user: dict
+    compatibility_score: float
+    created_at: datetime
+    last_message: MessageResponse | None
+    last_activity: datetime
+    unread_count: int
+
+
 class UnreadCountResponse(BaseModel):
     total: int
     by_match: dict[int, int]
@@ -1,6 +1,6 @@
 from datetime import date, datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PlaylistTrack(BaseModel):
@@ -11,7 +11,17 @@ class PlaylistTrack(BaseModel):
     spotify_url: str | None = None
     spotify_id: str
     added_by: int | None = None
-    added_at: str | None = None
+    added_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+
+class PlaylistTrackDelta(BaseModel):
+    """The result of adding or removing one track: the change and the new track count."""
+    added: PlaylistTrack | None = None
+    removed: str | None = None
+    track_count: int
 
 
 class AddTrackRequest(BaseModel):
@@ -23,6 +33,16 @@ class AddTrackRequest(BaseModel):
     spotify_id: str
 
 
+class AddTracksBatchRequest(BaseModel):
+    tracks: list[AddTrackRequest] = Field(min_length=1, max_length=500)
+
+
+class AddTracksBatchResponse(BaseModel):
+    added: list[PlaylistTrack]
+    skipped: list[str]  # spotify_ids already in the playlist or repeated in the request
+    track_count: int
+
+
 class CreatePlaylistRequest(BaseModel):
     name: str
     description: str | None = None
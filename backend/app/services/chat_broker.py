@@ -0,0 +1,177 @@
+"""Pub/sub for real-time chat delivery.
+
+Each WebSocket connection registers one Subscriber on the event loop that
+serves it and subscribes it to the matches it may see. Publishing is
+synchronous and safe to call from any thread -- sync route handlers run in
+a worker thread -- since events are handed to each subscriber's loop with
+call_soon_threadsafe.
+
+Events also go through the fan-out backend chosen by CHAT_FANOUT_BACKEND
+(see app.services.fanout), so sockets held by other worker processes
+receive them too. The module-level broker only builds that backend in
+start(), so importing this module opens no files or connections.
+"""
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from app.core import metrics
+from app.core.config import settings
+from app.schemas.message import MessageResponse
+from app.services.fanout import create_fanout
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before it is told to resync over REST
+SUBSCRIBER_QUEUE_SIZE = 256
+# Topics whose recent events are kept for replay, least recently used dropped first
+HISTORY_TOPICS = 10_000
+
+
+class Subscriber:
+    """One connection's event queue. Create it inside the loop that will read it."""
+
+    def __init__(self, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def deliver(self, event: dict) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # the connection's loop has already shut down
+
+    def _put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind has to refetch anyway; replace the
+            # backlog with a single resync marker instead of growing without bound
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+            metrics.incr("chat_ws.overflows")
+
+
+class ChatBroker:
+    """Topic-based pub/sub. Topics are match ids for chat and ``"user:<id>"`` for per-user events.
+
+    Events carrying an ``id`` are also kept in a short per-topic history, in
+    every process, so a reconnecting client can be replayed what it missed
+    (see history).
+    """
+
+    def __init__(self, fanout=None, history_size: int = 100):
+        self._subscribers: dict[int | str, set[Subscriber]] = {}
+        self._lock = threading.Lock()
+        # Built from settings in start() when not given; until then events stay in this process
+        self.fanout = fanout
+        self.history_size = history_size
+        self._history: OrderedDict[int | str, deque] = OrderedDict()
+
+    def start(self) -> None:
+        """Start receiving events published by other processes."""
+        if self.fanout is None:
+            self.fanout = create_fanout()
+        self.fanout.start(self._deliver_local)
+
+    def stop(self) -> None:
+        if self.fanout is not None:
+            self.fanout.stop()
+
+    def subscribe(self, match_id: int, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.setdefault(match_id, set()).add(subscriber)
+
+    def unsubscribe(self, match_id: int, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(match_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[match_id]
+
+    def unsubscribe_all(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            for match_id in [m for m, subs in self._subscribers.items() if subscriber in subs]:
+                self._subscribers[match_id].discard(subscriber)
+                if not self._subscribers[match_id]:
+                    del self._subscribers[match_id]
+
+    def publish(self, match_id: int, event: dict) -> int:
+        """Fan ``event`` out to every subscriber of ``match_id``, in every process.
+
+        Returns how many subscribers in this process were reached. A fan-out
+        failure is logged and counted, never raised: callers publish after
+        committing, and their response must not depend on the fan-out medium.
+        """
+        reached = self._deliver_local(match_id, event)
+        fanout = self.fanout
+        if fanout is not None:
+            try:
+                fanout.publish(match_id, event)
+            except Exception:
+                logger.exception("Fan-out publish failed for topic %r", match_id)
+                metrics.incr("chat_fanout.publish_errors")
+        metrics.incr("chat_ws.events_published")
+        return reached
+
+    def _deliver_local(self, match_id: int, event: dict) -> int:
+        with self._lock:
+            subscribers = list(self._subscribers.get(match_id, ()))
+            if "id" in event:
+                self._record(match_id, event)
+        for subscriber in subscribers:
+            subscriber.deliver(event)
+        return len(subscribers)
+
+    def _record(self, topic, event: dict) -> None:
+        events = self._history.get(topic)
+        if events is None:
+            events = self._history[topic] = deque(maxlen=self.history_size)
+            while len(self._history) > HISTORY_TOPICS:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(topic)
+        events.append(event)
+
+    def history(self, topic, after_id: int) -> list[dict] | None:
+        """Events on ``topic`` published after the one with id ``after_id``.
+
+        Returns None when that event is no longer (or was never) held here,
+        since the gap can then not be filled and the client has to resync.
+        """
+        with self._lock:
+            events = list(self._history.get(topic, ()))
+        for i, event in enumerate(events):
+            if event["id"] == after_id:
+                return events[i + 1:]
+        return None
+
+    def subscriber_count(self, match_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(match_id, ()))
+
+
+broker = ChatBroker(history_size=settings.EVENT_REPLAY_SIZE)
+
+
+def publish_message(message) -> None:
+    """Push a newly committed Message to everyone watching its match."""
+    broker.publish(message.match_id, {
+        "type": "message",
+        "match_id": message.match_id,
+        "message": MessageResponse.model_validate(message).model_dump(mode="json"),
+    })
+
+
+def publish_read(match_id: int, reader_id: int, count: int, last_read_message_id: int) -> None:
+    """Push a read receipt: ``reader_id`` has read the other user's messages up to ``last_read_message_id``."""
+    broker.publish(match_id, {
+        "type": "read",
+        "match_id": match_id,
+        "reader_id": reader_id,
+        "count": count,
+        "last_read_message_id": last_read_message_id,
+    })
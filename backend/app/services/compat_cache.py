@@ -0,0 +1,152 @@
+"""Read-through cache for pairwise compatibility scores.
+
+Lookups go to an in-process LRU first, then to the compatibility_cache table,
+and only pairs missing from both are scored (in one batch) and written back.
+Entries are keyed by (user_a, user_b, profile_version_a, profile_version_b)
+with user_a < user_b, so a profile re-sync makes its old entries unreachable.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.crud.compatibility import delete_user_scores, get_cached_scores, save_scores
+from app.models.music_profile import MusicProfile
+from app.services.compatibility import compute_compatibility_batch, profile_to_compat_input
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._data if user_id in (k[0], k[1])]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_lru = _LRU(settings.COMPAT_CACHE_SIZE)
+
+
+def _key(profile: MusicProfile, other: MusicProfile) -> tuple[int, int, int, int]:
+    if profile.user_id < other.user_id:
+        return (profile.user_id, other.user_id, profile.profile_version, other.profile_version)
+    return (other.user_id, profile.user_id, other.profile_version, profile.profile_version)
+
+
+def get_compatibility_many(db: Session, profile: MusicProfile, others: list[MusicProfile]) -> list[dict]:
+    """Compatibility breakdowns of ``profile`` against each of ``others``, in order.
+
+    Newly computed pairs are written to the session but not committed, so the
+    caller decides when its transaction ends.
+    """
+    results: list[dict | None] = [None] * len(others)
+
+    missing = []
+    for i, other in enumerate(others):
+        cached = _lru.get(_key(profile, other))
+        if cached is not None:
+            results[i] = cached
+        else:
+            missing.append(i)
+    lru_hits = len(others) - len(missing)
+
+    db_hits = 0
+    if missing:
+        stored = get_cached_scores(
+            db, profile.user_id, profile.profile_version,
+            {others[i].user_id: others[i].profile_version for i in missing},
+        )
+        unscored = []
+        for i in missing:
+            breakdown = stored.get(others[i].user_id)
+            if breakdown is not None:
+                results[i] = breakdown
+                _lru.put(_key(profile, others[i]), breakdown)
+            else:
+                unscored.append(i)
+        db_hits = len(missing) - len(unscored)
+        missing = unscored
+
+    if missing:
+        batch = compute_compatibility_batch(
+            profile_to_compat_input(profile),
+            [profile_to_compat_input(others[i]) for i in missing],
+        )
+        now = datetime.utcnow()
+        rows = []
+        for i, compat in zip(missing, batch):
+            key = _key(profile, others[i])
+            results[i] = compat
+            _lru.put(key, compat)
+            rows.append({
+                "user_a_id": key[0],
+                "user_b_id": key[1],
+                "profile_version_a": key[2],
+                "profile_version_b": key[3],
+                "score": compat["score"],
+                "breakdown": compat,
+                "computed_at": now,
+            })
+        save_scores(db, rows)
+
+    metrics.incr("compat_cache.lru_hits", lru_hits)
+    metrics.incr("compat_cache.db_hits", db_hits)
+    metrics.incr("compat_cache.misses", len(missing))
+    metrics.set_gauge("compat_cache.lru_size", len(_lru))
+    return results
+
+
+def get_compatibility(db: Session, profile: MusicProfile, other: MusicProfile) -> dict:
+    return get_compatibility_many(db, profile, [other])[0]
+
+
+def invalidate_user(db: Session, user_id: int) -> None:
+    """Drop every cached pair involving ``user_id``, e.g. when their profile is deleted.
+
+    Only this process's LRU can be cleared. Other processes' entries are
+    unreachable anyway: a re-created profile continues its version sequence
+    from User.last_profile_version rather than restarting at 1.
+    """
+    delete_user_scores(db, user_id)
+    _lru.discard_user(user_id)
+
+
+def cache_stats() -> dict:
+    hits = metrics.get_counter("compat_cache.lru_hits") + metrics.get_counter("compat_cache.db_hits")
+    misses = metrics.get_counter("compat_cache.misses")
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+    }
+
+
+def clear() -> None:
+    _lru.clear()
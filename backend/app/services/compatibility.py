@@ -1,3 +1,8 @@
+import numpy as np
+
+from app.services.features import unpack_ids
+
+
 def compute_compatibility(profile1: dict, profile2: dict) -> dict:
     """Compute compatibility score between two music profiles.
 
@@ -57,3 +62,180 @@ def compute_compatibility(profile1: dict, profile2: dict) -> dict:
         "genre_overlap_pct": round(genre_overlap_pct, 3),
         "artist_overlap_pct": round(artist_overlap_pct, 3),
     }
+
+
+def profile_to_compat_input(profile) -> dict:
+    """Project a MusicProfile row onto the fields the compatibility scorers read."""
+    return {
+        "top_artists": profile.top_artists or [],
+        "top_genres": profile.top_genres or [],
+        "listening_patterns": profile.listening_patterns or {},
+        "artist_ids": unpack_ids(profile.artist_ids),
+        "genre_ids": unpack_ids(profile.genre_ids),
+    }
+
+
+def _incidence(my_keys: list, rows: list[list]) -> tuple[np.ndarray, np.ndarray]:
+    """Encode each candidate's keys as a sparse CSR incidence matrix (indptr, indices).
+
+    Keys are interned to integer columns in one pass over the batch, first come
+    first served, starting with ``my_keys`` -- so a column below
+    ``len(my_keys)`` is a key the user has, and it is that key's position in
+    ``my_keys``. Duplicate keys within a row collapse to a single column,
+    matching the set semantics of compute_compatibility, and each row's columns
+    come out sorted.
+    """
+    lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+    flat = [k for r in rows for k in r]
+    vocab = {k: i for i, k in enumerate(dict.fromkeys(my_keys + flat))}
+    size = max(len(vocab), 1)
+    columns = np.fromiter(map(vocab.__getitem__, flat), dtype=np.int64, count=len(flat))
+
+    row_ids = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+    cells = np.sort(row_ids * size + columns)
+    cells = cells[np.diff(cells, prepend=-1) != 0]
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells // size, minlength=len(rows)), out=indptr[1:])
+    return indptr, cells % size
+
+
+class _Overlap:
+    """Intersection of one user's key set with every row of a candidate incidence matrix.
+
+    ``shared_rows`` / ``shared_cols`` list every (candidate, user key position)
+    hit, sorted by candidate and then by position.
+    """
+
+    def __init__(self, keys: list, sizes: np.ndarray, shared_rows: np.ndarray, shared_cols: np.ndarray):
+        n = len(sizes)
+        self.keys = keys
+        self.mine = len(keys)
+        self.sizes = sizes
+        self.shared = np.bincount(shared_rows, minlength=n)
+        self._shared_cols = shared_cols
+        self._starts = np.searchsorted(shared_rows, np.arange(n + 1))
+
+    @classmethod
+    def from_keys(cls, my_keys: list, rows: list[list]) -> "_Overlap":
+        keys = list(dict.fromkeys(my_keys))
+        indptr, indices = _incidence(keys, rows)
+        row_ids = np.repeat(np.arange(len(rows), dtype=np.int64), np.diff(indptr))
+        hits = indices < len(keys)
+        return cls(keys, np.diff(indptr), row_ids[hits], indices[hits])
+
+    @classmethod
+    def from_ids(cls, my_keys: list, my_ids: np.ndarray, rows: list[np.ndarray]) -> "_Overlap":
+        """Same as from_keys, but over pre-interned term ids (see app.services.features).
+
+        ``my_ids`` is aligned with the distinct ``my_keys``; each row is already
+        duplicate-free, so no interning or dedup pass is needed.
+        """
+        keys = list(dict.fromkeys(my_keys))
+        lengths = np.fromiter(map(len, rows), dtype=np.int64, count=len(rows))
+        flat = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        row_ids = np.repeat(np.arange(len(rows), dtype=np.int64), lengths)
+
+        order = np.argsort(my_ids, kind="stable")
+        sorted_ids = my_ids[order]
+        pos = np.minimum(np.searchsorted(sorted_ids, flat), max(len(sorted_ids) - 1, 0))
+        hits = sorted_ids[pos] == flat if len(sorted_ids) else np.zeros(len(flat), dtype=bool)
+        shared_rows, shared_cols = row_ids[hits], order[pos[hits]].astype(np.int64)
+        by_row = np.lexsort((shared_cols, shared_rows))
+        return cls(keys, lengths, shared_rows[by_row], shared_cols[by_row])
+
+    def shared_keys(self, i: int) -> list:
+        """Keys candidate ``i`` shares with the user, in the user's order."""
+        return [self.keys[col] for col in self._shared_cols[self._starts[i]:self._starts[i + 1]].tolist()]
+
+
+def _overlap(profile: dict, candidates: list[dict], field: str, ids_field: str, key: str) -> _Overlap:
+    """Build the overlap for one feature, using the packed term ids when every profile has them."""
+    my_keys = [item[key] for item in profile.get(field, [])]
+    my_ids = profile.get(ids_field)
+    if (
+        my_ids is not None
+        and len(my_ids) == len(dict.fromkeys(my_keys))
+        and all(c.get(ids_field) is not None for c in candidates)
+    ):
+        return _Overlap.from_ids(my_keys, my_ids, [c[ids_field] for c in candidates])
+    return _Overlap.from_keys(my_keys, [[item[key] for item in c.get(field, [])] for c in candidates])
+
+
+def _similarity(mine: float, theirs: np.ndarray) -> np.ndarray:
+    return 1 - np.abs(mine - theirs) / np.maximum(np.maximum(mine, theirs), 1)
+
+
+class CompatibilityBatch:
+    """Scores for one profile against N candidates, as returned by compute_compatibility_batch.
+
+    ``scores`` holds every candidate's 0-100 score as an integer array. Indexing
+    or iterating yields the same breakdown dicts compute_compatibility returns;
+    they are built on access, so callers that only rank by score never pay for
+    the shared-artist and shared-genre lists.
+    """
+
+    def __init__(self, profile: dict, candidates: list[dict]):
+        self._profile = profile
+        self._candidates = candidates
+
+        self._artists = _overlap(profile, candidates, "top_artists", "artist_ids", "spotify_id")
+        self._artist_names: dict = {a["spotify_id"]: a["name"] for a in profile.get("top_artists", [])}
+        self._genres = _overlap(profile, candidates, "top_genres", "genre_ids", "genre")
+
+        artists, genres = self._artists, self._genres
+        self.artist_overlap = artists.shared / np.maximum(np.maximum(artists.mine, artists.sizes), 1)
+        genre_union = genres.mine + genres.sizes - genres.shared
+        self.genre_overlap = genres.shared / np.maximum(genre_union, 1)
+
+        my_lp = profile.get("listening_patterns", {})
+        lps = [c.get("listening_patterns", {}) for c in candidates]
+        artist_count_sim = _similarity(
+            my_lp.get("total_artists", 0),
+            np.array([lp.get("total_artists", 0) for lp in lps], dtype=np.float64),
+        )
+        genre_count_sim = _similarity(
+            my_lp.get("total_genres", 0),
+            np.array([lp.get("total_genres", 0) for lp in lps], dtype=np.float64),
+        )
+        pattern_sim = (artist_count_sim + genre_count_sim) / 2
+
+        raw = (self.artist_overlap * 40) + (self.genre_overlap * 40) + (pattern_sim * 20)
+        # np.rint rounds half to even, exactly like the builtin round().
+        self.scores = np.rint(np.clip(raw, 0, 100)).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self._candidates)
+
+    def __getitem__(self, i: int) -> dict:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        shared_artists = []
+        for aid in self._artists.shared_keys(i):
+            shared_artists.append(
+                self._artist_names.get(aid) or _candidate_artist_name(self._candidates[i], aid)
+            )
+        return {
+            "score": int(self.scores[i]),
+            "shared_artists": shared_artists,
+            "shared_genres": self._genres.shared_keys(i),
+            "genre_overlap_pct": round(float(self.genre_overlap[i]), 3),
+            "artist_overlap_pct": round(float(self.artist_overlap[i]), 3),
+        }
+
+
+def compute_compatibility_batch(profile: dict, candidates: list[dict]) -> CompatibilityBatch:
+    """Score one music profile against many candidate profiles at once.
+
+    Artists and genres are encoded as sparse incidence matrices so the overlap
+    terms for every candidate come out of a handful of NumPy operations instead
+    of a Python set intersection per pair. Scores and overlap percentages are
+    identical to calling compute_compatibility on each pair; shared artists and
+    genres are listed in the order they appear in ``profile``.
+    """
+    return CompatibilityBatch(profile, candidates)
+
+
+def _candidate_artist_name(candidate: dict, spotify_id: str) -> str | None:
+    names = {a["spotify_id"]: a["name"] for a in candidate.get("top_artists", [])}
+    return names.get(spotify_id)
@@ -23,7 +23,7 @@ from app.crud.playlist import create_playlist, get_playlist_by_match
 from app.crud.playlist import add_member as add_playlist_member
 from app.services.auth import hash_password
 from app.services.spotify import generate_mock_profile, search_tracks, refresh_access_token
-from app.services.compatibility import compute_compatibility
+from app.services.compat_cache import get_compatibility
 
 
 def _get_valid_spotify_token(db: Session, user_id: int) -> str | None:
@@ -399,18 +399,7 @@ def seed_demo_users(db: Session, real_user_id: int) -> None:
             "artist_overlap_pct": 0.0,
         }
         if real_profile and demo_profile:
-            compat = compute_compatibility(
-                {
-                    "top_artists": real_profile.top_artists or [],
-                    "top_genres": real_profile.top_genres or [],
-                    "listening_patterns": real_profile.listening_patterns or {},
-                },
-                {
-                    "top_artists": demo_profile.top_artists or [],
-                    "top_genres": demo_profile.top_genres or [],
-                    "listening_patterns": demo_profile.listening_patterns or {},
-                },
-            )
+            compat = get_compatibility(db, real_profile, demo_profile)
             score = max(compat["score"], 55.0)  # floor at 55% for demo appeal
             breakdown = compat
 
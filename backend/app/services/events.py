@@ -0,0 +1,114 @@
+"""Per-user notification events, streamed to clients as server-sent events.
+
+Lightweight clients that only show badges listen on /api/events/stream
+instead of holding a chat socket. Events travel through the chat broker on
+a ``"user:<id>"`` topic, so they reach streams held by other worker
+processes too, and each one gets an increasing ``id`` that the broker keeps
+in its replay history for clients reconnecting with Last-Event-ID.
+
+Event types:
+
+- ``unread``: the user's unread count in ``match_id`` is now ``count``
+- ``match``: a new match ``match_id`` with ``user_id``
+- ``reaction``: ``user_id`` reacted with ``reaction_type`` to daily tune ``daily_tune_id``
+- ``resync``: events were missed; refetch over REST
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import AsyncIterator
+
+from app.core import metrics
+from app.core.config import settings
+from app.services.chat_broker import Subscriber, broker
+
+# Reconnect delay suggested to EventSource clients
+RETRY_MS = 3000
+
+_id_lock = threading.Lock()
+_last_id = 0
+
+
+def user_topic(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def _next_id() -> int:
+    """Event ids are increasing microsecond timestamps, so they also order across processes."""
+    global _last_id
+    with _id_lock:
+        _last_id = max(_last_id + 1, time.time_ns() // 1000)
+        return _last_id
+
+
+def publish_user_event(user_id: int, event: dict) -> int:
+    """Publish ``event`` to ``user_id``'s stream and return the id it was given."""
+    event_id = _next_id()
+    broker.publish(user_topic(user_id), {"id": event_id, **event})
+    return event_id
+
+
+def publish_unread(user_id: int, match_id: int, count: int) -> None:
+    publish_user_event(user_id, {"type": "unread", "match_id": match_id, "count": count})
+
+
+def publish_match(match_id: int, user_id: int, other_id: int) -> None:
+    """Tell both sides of a newly committed match."""
+    publish_user_event(user_id, {"type": "match", "match_id": match_id, "user_id": other_id})
+    publish_user_event(other_id, {"type": "match", "match_id": match_id, "user_id": user_id})
+
+
+def publish_reaction(owner_id: int, daily_tune_id: int, user_id: int, reaction_type: str) -> None:
+    publish_user_event(owner_id, {
+        "type": "reaction",
+        "daily_tune_id": daily_tune_id,
+        "user_id": user_id,
+        "reaction_type": reaction_type,
+    })
+
+
+def format_event(event: dict) -> str:
+    """Encode one event in the text/event-stream wire format."""
+    lines = [f"id: {event['id']}"] if "id" in event else []
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(user_id: int, last_event_id: str | None = None, heartbeat: float | None = None) -> AsyncIterator[str]:
+    """Yield ``user_id``'s events as SSE frames until the consumer stops iterating.
+
+    With ``last_event_id`` the events published since are replayed first, or
+    a ``resync`` event is sent if they are no longer held. A comment line is
+    sent whenever the stream has been idle for ``heartbeat`` seconds, so
+    proxies keep the connection open.
+    """
+    heartbeat = settings.EVENT_STREAM_HEARTBEAT_SECONDS if heartbeat is None else heartbeat
+    topic = user_topic(user_id)
+    # Subscribe before reading history so nothing published in between is lost
+    subscriber = Subscriber()
+    broker.subscribe(topic, subscriber)
+    metrics.incr("events.connections")
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent = 0
+        if last_event_id is not None:
+            missed = broker.history(topic, int(last_event_id)) if last_event_id.isdigit() else None
+            if missed is None:
+                yield format_event({"type": "resync"})
+            for event in missed or ():
+                sent = event["id"]
+                yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event.get("id", sent + 1) <= sent:
+                continue  # already replayed from history
+            sent = event.get("id", sent)
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(topic, subscriber)
@@ -0,0 +1,210 @@
+"""Fan-out backends that carry broker events between server processes.
+
+With several uvicorn workers, a WebSocket may be held by a different
+process than the one handling the request that produced an event. The
+broker delivers every event to its own subscribers and hands it to one of
+these backends, which forwards it to every other process; there the
+backend's listener thread passes it to that process's broker.
+
+- ``memory``: single process, nothing is forwarded.
+- ``sqlite``: processes on one host share an append-only events table in a
+  small SQLite file (WAL mode) and poll it for rows from other processes.
+- ``redis``: Redis pub/sub on one channel. Any client with the redis-py
+  ``publish`` / ``pubsub`` API works, including tests' in-memory fake.
+
+A listener that hits an error (a locked database, a dropped Redis
+connection, an event the broker fails on) logs it and backs off instead of
+dying, so the process keeps receiving once the medium recovers.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[object, dict], None]
+
+# Listener back-off after an error, doubling up to the maximum while errors persist
+LISTENER_MIN_BACKOFF = 0.1
+LISTENER_MAX_BACKOFF = 5.0
+
+
+class MemoryFanout:
+    """Single process: there is nobody to forward to."""
+
+    def start(self, deliver: Deliver) -> None:
+        pass
+
+    def publish(self, topic, event: dict) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class _ForwardingFanout(ABC):
+    """Shared plumbing: forward on publish, and a listener thread delivering other processes' events."""
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._deliver: Deliver | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _encode(self, topic, event: dict) -> str:
+        return json.dumps({"origin": self.origin, "topic": topic, "event": event}, separators=(",", ":"))
+
+    def _receive(self, raw) -> None:
+        data = json.loads(raw)
+        if data["origin"] != self.origin and self._deliver is not None:
+            self._deliver(data["topic"], data["event"])
+
+    def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name=f"{type(self).__name__}-listener", daemon=True)
+        self._thread.start()
+
+    def publish(self, topic, event: dict) -> None:
+        self._forward(self._encode(topic, event))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._deliver = None
+
+    def _backoff(self, delay: float) -> float:
+        """Log the error being handled, wait ``delay`` (or until stopped) and return the next delay."""
+        logger.exception("%s listener failed, retrying in %.1fs", type(self).__name__, delay)
+        metrics.incr("chat_fanout.listener_errors")
+        self._stop.wait(delay)
+        return min(delay * 2, LISTENER_MAX_BACKOFF)
+
+    @abstractmethod
+    def _forward(self, payload: str) -> None:
+        """Send an encoded event to the other processes."""
+
+    @abstractmethod
+    def _listen(self) -> None:
+        """Listener thread body: pass other processes' events to _receive until _stop is set."""
+
+
+class SQLiteFanout(_ForwardingFanout):
+    """Cross-process fan-out on one host through a shared SQLite file."""
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention_seconds: float = 60.0):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute(
+            "CREATE TABLE IF NOT EXISTS fanout_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+            "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _forward(self, payload: str) -> None:
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT INTO fanout_events (origin, payload, created_at) VALUES (?, ?, ?)",
+                (self.origin, payload, time.time()),
+            )
+
+    def _listen(self) -> None:
+        reader = self._connect()
+        # Only events published after this process started listening are delivered
+        last_id = reader.execute("SELECT COALESCE(MAX(id), 0) FROM fanout_events").fetchone()[0]
+        last_prune = time.monotonic()
+        backoff = LISTENER_MIN_BACKOFF
+        try:
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    rows = reader.execute(
+                        "SELECT id, payload FROM fanout_events WHERE id > ? AND origin != ? ORDER BY id",
+                        (last_id, self.origin),
+                    ).fetchall()
+                    for row_id, payload in rows:
+                        # Advanced first, so an event that fails to deliver isn't retried forever
+                        last_id = row_id
+                        self._receive(payload)
+                    if time.monotonic() - last_prune > self.retention_seconds:
+                        last_prune = time.monotonic()
+                        with self._write_lock:
+                            self._writer.execute(
+                                "DELETE FROM fanout_events WHERE created_at < ?",
+                                (time.time() - self.retention_seconds,),
+                            )
+                except Exception:
+                    backoff = self._backoff(backoff)
+                else:
+                    backoff = LISTENER_MIN_BACKOFF
+        finally:
+            reader.close()
+
+
+class RedisFanout(_ForwardingFanout):
+    """Cross-host fan-out through Redis pub/sub on a single channel."""
+
+    def __init__(self, client, channel: str = "musicmate:events"):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+
+    def start(self, deliver: Deliver) -> None:
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        super().start(deliver)
+
+    def stop(self) -> None:
+        super().stop()
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def _forward(self, payload: str) -> None:
+        self.client.publish(self.channel, payload)
+
+    def _listen(self) -> None:
+        backoff = LISTENER_MIN_BACKOFF
+        while not self._stop.is_set():
+            try:
+                # redis-py reconnects and resubscribes on the next call after a dropped connection
+                message = self._pubsub.get_message(timeout=0.2)
+                if message is not None and message["type"] == "message":
+                    self._receive(message["data"])
+            except Exception:
+                backoff = self._backoff(backoff)
+            else:
+                backoff = LISTENER_MIN_BACKOFF
+
+
+def create_fanout():
+    """Build the backend selected by ``settings.CHAT_FANOUT_BACKEND``."""
+    kind = settings.CHAT_FANOUT_BACKEND
+    if kind == "memory":
+        return MemoryFanout()
+    if kind == "sqlite":
+        return SQLiteFanout(settings.CHAT_FANOUT_SQLITE_PATH)
+    if kind == "redis":
+        import redis  # optional dependency, only needed for this backend
+
+        return RedisFanout(redis.Redis.from_url(settings.CHAT_FANOUT_REDIS_URL))
+    raise ValueError(f"Unknown CHAT_FANOUT_BACKEND {kind!r}")
@@ -0,0 +1,33 @@
+"""Compact integer feature arrays stored on MusicProfile.
+
+Each profile keeps its distinct artist and genre term ids (see FeatureTerm)
+as little-endian int32 blobs, in the order the artists and genres first
+appear in its JSON lists. Scoring reads these instead of re-parsing and
+re-hashing the JSON strings.
+"""
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.crud.features import intern_terms
+
+_DTYPE = np.dtype("<i4")
+
+
+def pack_ids(ids: list[int]) -> bytes:
+    return np.asarray(ids, dtype=_DTYPE).tobytes()
+
+
+def unpack_ids(blob: bytes | None) -> np.ndarray | None:
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=_DTYPE)
+
+
+def build_feature_blobs(db: Session, top_artists: list[dict], top_genres: list[dict]) -> tuple[bytes, bytes]:
+    """Intern a profile's artists and genres and return the packed (artist_ids, genre_ids) blobs."""
+    artist_keys = list(dict.fromkeys(a["spotify_id"] for a in top_artists or []))
+    genre_keys = list(dict.fromkeys(g["genre"] for g in top_genres or []))
+    return (
+        pack_ids(intern_terms(db, "artist", artist_keys)),
+        pack_ids(intern_terms(db, "genre", genre_keys)),
+    )
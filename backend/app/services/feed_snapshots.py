@@ -0,0 +1,148 @@
+"""Precomputed match feeds.
+
+Each user's unfiltered feed is materialised into feed_snapshots by a
+background worker, so opening the swipe feed is a lookup rather than a
+scoring pass. The worker rebuilds the users in feed_dirty_queue, which
+save_music_profile fills with the synced user and their LSH neighbours
+(the users the new profile is likely to rank highly for), and signup with
+the new user. Dirty rows are claimed atomically, so every worker process
+can run the worker without rebuilding the same user twice.
+
+match_feed serves from the snapshot, dropping users swiped since it was
+built. It scores live when the user has no snapshot yet, and when the
+user has swiped through a full snapshot, queueing a rebuild.
+"""
+import heapq
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.feed_snapshot import (
+    claim_dirty,
+    delete_snapshot,
+    mark_feeds_dirty,
+    save_snapshot,
+)
+from app.crud.match import get_candidates, get_scoring_pool
+from app.crud.spotify import get_music_profile
+from app.models.feed_snapshot import FeedSnapshot
+from app.models.music_profile import MusicProfile
+from app.services.compat_cache import get_compatibility_many
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_snapshot(db: Session, user_id: int) -> bool:
+    """Rank ``user_id``'s candidate pool into their snapshot. Does not commit.
+
+    Returns False, dropping any old snapshot, if the user has no music profile.
+    """
+    profile = get_music_profile(db, user_id)
+    if profile is None:
+        delete_snapshot(db, user_id)
+        return False
+    candidates = get_scoring_pool(db, profile)
+    scores = get_compatibility_many(db, profile, [their_profile for _, their_profile in candidates])
+    ranked = heapq.nsmallest(
+        settings.FEED_SNAPSHOT_SIZE,
+        ((-compat["score"], user.id) for (user, _), compat in zip(candidates, scores)),
+    )
+    save_snapshot(
+        db, user_id, profile.profile_version,
+        [candidate_id for _, candidate_id in ranked],
+        [-neg_score for neg_score, _ in ranked],
+    )
+    metrics.incr("feed_snapshots.rebuilt")
+    return True
+
+
+def run_once(db: Session, batch_size: int | None = None) -> int:
+    """Rebuild up to ``batch_size`` queued snapshots. Returns how many were processed.
+
+    If a rebuild fails, it and the rest of the claimed batch are queued again.
+    """
+    batch_size = batch_size or settings.FEED_SNAPSHOT_BATCH
+    user_ids = claim_dirty(db, batch_size)
+    db.commit()
+    for done, user_id in enumerate(user_ids):
+        try:
+            rebuild_snapshot(db, user_id)
+            db.commit()
+        except Exception:
+            db.rollback()
+            mark_feeds_dirty(db, user_ids[done:])
+            db.commit()
+            raise
+    return len(user_ids)
+
+
+def snapshot_page(
+    db: Session,
+    profile: MusicProfile,
+    snapshot: FeedSnapshot,
+    after: tuple | None,
+    size: int,
+) -> list[tuple]:
+    """Up to ``size`` (key, user, profile, compat) entries from a snapshot, in snapshot order.
+
+    Entries are keyed by (-score, user_id) like the live feed, so cursors work
+    across both. Users swiped or removed since the snapshot was built are
+    skipped; candidates are loaded a window at a time until the page fills.
+    """
+    entries = [
+        key for key in zip((-s for s in snapshot.scores), snapshot.candidate_ids)
+        if after is None or key > after
+    ]
+    window = 2 * size
+    page = []
+    for start in range(0, len(entries), window):
+        chunk = entries[start:start + window]
+        rows = {
+            user.id: (user, their_profile)
+            for user, their_profile in get_candidates(db, profile.user_id, user_ids=[uid for _, uid in chunk])
+        }
+        page.extend((key, *rows[key[1]]) for key in chunk if key[1] in rows)
+        if len(page) >= size:
+            break
+    page = page[:size]
+    scores = get_compatibility_many(db, profile, [their_profile for _, _, their_profile in page])
+    return [(key, user, their_profile, compat) for (key, user, their_profile), compat in zip(page, scores)]
+
+
+class FeedSnapshotWorker:
+    """Daemon thread that drains the dirty queue and refreshes stale snapshots."""
+
+    def __init__(self, session_factory=SessionLocal, interval: float | None = None):
+        self._session_factory = session_factory
+        self._interval = interval if interval is not None else settings.FEED_SNAPSHOT_INTERVAL_SECONDS
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="feed-snapshot-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            db = self._session_factory()
+            try:
+                # Keep going while there is a full batch of work, then wait
+                while run_once(db) >= settings.FEED_SNAPSHOT_BATCH and not self._stop.is_set():
+                    pass
+            except Exception:
+                db.rollback()
+                metrics.incr("feed_snapshots.errors")
+                logger.exception("Feed snapshot rebuild failed")
+            finally:
+                db.close()
+            self._stop.wait(self._interval)
+
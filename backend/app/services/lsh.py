@@ -0,0 +1,249 @@
+"""MinHash LSH index over each profile's artist and genre term ids.
+
+Used by the match feed to narrow a large user base down to a few hundred
+likely-compatible candidates before exact scoring. Signatures are MinHashes
+of the union of a profile's packed artist_ids and genre_ids (both are
+FeatureTerm ids, so they never collide); the banded buckets are rebuilt from
+the signatures whenever the index is loaded.
+
+The index lives in memory, is updated by save_music_profile, and is written
+to ``settings.LSH_INDEX_PATH`` on shutdown. On first use it is loaded from
+that file and reconciled against music_profiles by profile_version, so a
+stale or missing file only costs re-hashing the profiles that changed.
+"""
+import os
+import threading
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.music_profile import MusicProfile
+from app.services.features import unpack_ids
+
+_PRIME = (1 << 31) - 1
+_EMPTY = np.uint32(_PRIME)
+
+
+class MinHashLSH:
+    def __init__(self, num_perm: int = 128, bands: int = 32, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+        self._signatures: dict[int, np.ndarray] = {}
+        self._versions: dict[int, int] = {}
+        self._buckets: list[dict[bytes, set[int]]] = [{} for _ in range(bands)]
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._signatures
+
+    def signature(self, ids: np.ndarray) -> np.ndarray:
+        """MinHash signature of a set of non-negative term ids."""
+        if len(ids) == 0:
+            return np.full(self.num_perm, _EMPTY, dtype=np.uint32)
+        x = np.asarray(ids, dtype=np.uint64)
+        hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, user_id: int, ids: np.ndarray, version: int = 0) -> None:
+        self.add_signature(user_id, self.signature(ids), version)
+
+    def add_signature(self, user_id: int, signature: np.ndarray, version: int = 0) -> None:
+        with self._lock:
+            self.remove(user_id)
+            self._signatures[user_id] = signature
+            self._versions[user_id] = version
+            # An empty profile shares nothing, so it is stored but never bucketed
+            if signature[0] != _EMPTY:
+                for band, key in zip(self._buckets, self._band_keys(signature)):
+                    band.setdefault(key, set()).add(user_id)
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            signature = self._signatures.pop(user_id, None)
+            self._versions.pop(user_id, None)
+            if signature is None or signature[0] == _EMPTY:
+                return
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                members = band.get(key)
+                if members is not None:
+                    members.discard(user_id)
+                    if not members:
+                        del band[key]
+
+    def query(self, ids: np.ndarray, limit: int, exclude: int | None = None) -> list[int]:
+        """Up to ``limit`` user ids sharing a band with ``ids``, most similar first.
+
+        Candidates are ranked by the fraction of agreeing MinHash values, an
+        estimate of the Jaccard similarity of the two term sets.
+        """
+        signature = self.signature(ids)
+        if signature[0] == _EMPTY:
+            return []
+        with self._lock:
+            found: set[int] = set()
+            for band, key in zip(self._buckets, self._band_keys(signature)):
+                found.update(band.get(key, ()))
+            found.discard(exclude)
+            if not found:
+                return []
+            user_ids = np.fromiter(found, dtype=np.int64, count=len(found))
+            matrix = np.stack([self._signatures[uid] for uid in user_ids.tolist()])
+        similarity = (matrix == signature).sum(axis=1)
+        if len(user_ids) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            user_ids, similarity = user_ids[top], similarity[top]
+        order = np.lexsort((user_ids, -similarity))
+        return user_ids[order].tolist()
+
+    def versions(self) -> dict[int, int]:
+        with self._lock:
+            return dict(self._versions)
+
+    def save(self, path: str) -> None:
+        """Write signatures and versions to ``path`` atomically (.npz).
+
+        Each process writes its own temp file, so workers saving on shutdown
+        at the same time never interleave writes; whichever replaces ``path``
+        last wins, and load() reconciles whatever it finds.
+        """
+        with self._lock:
+            user_ids = np.fromiter(self._signatures, dtype=np.int64, count=len(self._signatures))
+            versions = np.array([self._versions[uid] for uid in user_ids.tolist()], dtype=np.int64)
+            signatures = (
+                np.stack(list(self._signatures.values())) if len(self._signatures)
+                else np.empty((0, self.num_perm), dtype=np.uint32)
+            )
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, user_ids=user_ids, versions=versions, signatures=signatures,
+                params=np.array([self.num_perm, self.bands]),
+                a=self._a, b=self._b,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MinHashLSH":
+        with np.load(path) as data:
+            num_perm, bands = (int(v) for v in data["params"])
+            index = cls(num_perm=num_perm, bands=bands)
+            index._a, index._b = data["a"], data["b"]
+            for uid, version, signature in zip(
+                data["user_ids"].tolist(), data["versions"].tolist(), data["signatures"],
+            ):
+                index.add_signature(uid, signature, version)
+        return index
+
+
+def profile_term_ids(profile) -> np.ndarray | None:
+    """Union of a profile's artist and genre term ids, or None if not yet encoded."""
+    artists, genres = unpack_ids(profile.artist_ids), unpack_ids(profile.genre_ids)
+    if artists is None or genres is None:
+        return None
+    return np.concatenate([artists, genres])
+
+
+_index: MinHashLSH | None = None
+_index_lock = threading.Lock()
+
+
+def _reconcile(db: Session, index: MinHashLSH) -> None:
+    """Bring ``index`` in line with music_profiles, re-hashing only changed profiles."""
+    current = dict(db.query(MusicProfile.user_id, MusicProfile.profile_version).all())
+    indexed = index.versions()
+    for user_id in indexed.keys() - current.keys():
+        index.remove(user_id)
+    stale = [uid for uid, version in current.items() if indexed.get(uid) != version]
+    for start in range(0, len(stale), 1000):
+        rows = (
+            db.query(MusicProfile.user_id, MusicProfile.profile_version,
+                     MusicProfile.artist_ids, MusicProfile.genre_ids)
+            .filter(MusicProfile.user_id.in_(stale[start:start + 1000]))
+            .all()
+        )
+        for row in rows:
+            ids = profile_term_ids(row)
+            if ids is not None:
+                index.add(row.user_id, ids, row.profile_version)
+
+
+def get_index(db: Session) -> MinHashLSH:
+    """The process-wide index, loaded and reconciled on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            path = settings.LSH_INDEX_PATH
+            index = MinHashLSH.load(path) if path and os.path.exists(path) else MinHashLSH()
+            _reconcile(db, index)
+            _index = index
+            metrics.set_gauge("lsh.profiles", len(index))
+        return _index
+
+
+def index_profile(profile: MusicProfile) -> None:
+    """Re-hash one profile after it is saved. A no-op until the index is first used."""
+    index = _index
+    if index is None:
+        return
+    ids = profile_term_ids(profile)
+    if ids is None:
+        index.remove(profile.user_id)
+    else:
+        index.add(profile.user_id, ids, profile.profile_version)
+    metrics.set_gauge("lsh.profiles", len(index))
+
+
+def remove_profile(user_id: int) -> None:
+    if _index is not None:
+        _index.remove(user_id)
+
+
+def save() -> None:
+    if _index is not None and settings.LSH_INDEX_PATH:
+        _index.save(settings.LSH_INDEX_PATH)
+
+
+def reset() -> None:
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def similar_users(db: Session, profile, limit: int) -> list[int]:
+    """Up to ``limit`` indexed users sharing a band with ``profile``, most similar first."""
+    ids = profile_term_ids(profile)
+    if ids is None:
+        return []
+    return get_index(db).query(ids, limit, exclude=profile.user_id)
+
+
+def retrieve_candidates(db: Session, profile: MusicProfile, limit: int | None = None) -> list[int] | None:
+    """LSH shortlist of up to ``limit`` user ids for ``profile``'s match feed, most similar first.
+
+    Returns None when the feed should score every candidate instead: below
+    ``MATCH_LSH_MIN_PROFILES`` profiles, for profiles without encoded term
+    ids, or when no bucket matched.
+    """
+    ids = profile_term_ids(profile)
+    if ids is None:
+        return None
+    index = get_index(db)
+    if len(index) < settings.MATCH_LSH_MIN_PROFILES:
+        return None
+    user_ids = index.query(ids, limit or settings.MATCH_LSH_CANDIDATES, exclude=profile.user_id)
+    metrics.incr("lsh.queries")
+    return user_ids or None
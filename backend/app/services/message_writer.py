@@ -0,0 +1,166 @@
+"""Group commit for chat message inserts.
+
+With SQLite every commit takes the database write lock and pays an fsync,
+so a burst of messages committed one request at a time queues up behind
+the lock. When ``CHAT_WRITE_QUEUE`` is on, send_message hands its message to
+this queue instead: a single writer thread collects whatever arrives within
+``CHAT_WRITE_QUEUE_MAX_WAIT_MS`` of the first message (up to
+``CHAT_WRITE_QUEUE_MAX_BATCH``) and inserts the batch in one transaction.
+Each caller waits on a Future that resolves to its Message, with the id and
+timestamp assigned, once the batch is committed. Once stop() has begun, or
+if the writer thread has died, submit raises RuntimeError (send_message
+then inserts directly); stop() writes everything already queued and fails
+any future it could not write. A caller that gives up waiting can cancel
+its future, and the message is then skipped rather than written twice.
+
+Errors after a batch is committed (announcing it through the chat broker)
+are logged and counted; they never fail the callers or stop the thread.
+
+Metrics: ``message_writer.queue_depth`` and ``message_writer.batch_size``
+gauges, and ``message_writer.batches`` / ``message_writer.messages`` /
+``message_writer.errors`` / ``message_writer.publish_errors`` counters.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.message import add_messages, publish_new_messages
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    def __init__(self, session_factory=SessionLocal, max_batch: int | None = None, max_wait: float | None = None):
+        self._session_factory = session_factory
+        self.max_batch = max_batch or settings.CHAT_WRITE_QUEUE_MAX_BATCH
+        self.max_wait = max_wait if max_wait is not None else settings.CHAT_WRITE_QUEUE_MAX_WAIT_MS / 1000
+        self._queue: queue.Queue[tuple[Message, Future]] = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        # Held while checking _stop and enqueueing, so nothing is queued once stop() begins
+        self._submit_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Write everything already queued, then stop the writer thread."""
+        with self._submit_lock:
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Only left over if the writer thread died; their callers must not wait forever
+        while True:
+            try:
+                _, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("MessageWriter stopped before the message was written"))
+            metrics.incr("message_writer.errors")
+        metrics.set_gauge("message_writer.queue_depth", 0)
+
+    def submit(
+        self,
+        match_id: int,
+        sender_id: int,
+        content: str,
+        message_type: str = "text",
+        song_data: dict | None = None,
+    ) -> Future:
+        """Queue a message; the returned Future resolves to the committed Message.
+
+        Raises RuntimeError if the writer is not running or is stopping.
+        """
+        future: Future = Future()
+        message = Message(
+            match_id=match_id,
+            sender_id=sender_id,
+            content=content,
+            message_type=message_type,
+            song_data=song_data,
+        )
+        with self._submit_lock:
+            if self._thread is None or not self._thread.is_alive() or self._stop.is_set():
+                raise RuntimeError("MessageWriter is not running")
+            self._queue.put((message, future))
+        metrics.set_gauge("message_writer.queue_depth", self._queue.qsize())
+        return future
+
+    def _run(self) -> None:
+        while True:
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            metrics.set_gauge("message_writer.queue_depth", self._queue.qsize())
+            # Callers that timed out and cancelled have inserted their message themselves
+            batch = [(message, future) for message, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as exc:
+                metrics.incr("message_writer.errors")
+                logger.exception("Message writer batch failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _write(self, batch: list[tuple[Message, Future]]) -> None:
+        messages = [message for message, _ in batch]
+        db = self._session_factory()
+        # The messages are handed back to other threads after the session closes
+        db.expire_on_commit = False
+        try:
+            unread = add_messages(db, messages)
+            db.commit()
+        except Exception as exc:
+            db.rollback()
+            db.close()
+            if len(batch) > 1:
+                # Retry one by one so a single bad message only fails its own caller
+                for item in batch:
+                    self._write([item])
+                return
+            metrics.incr("message_writer.errors")
+            logger.exception("Message write failed")
+            batch[0][1].set_exception(exc)
+            return
+        db.close()
+
+        metrics.incr("message_writer.batches")
+        metrics.incr("message_writer.messages", len(batch))
+        metrics.set_gauge("message_writer.batch_size", len(batch))
+        for message, future in batch:
+            future.set_result(message)
+        try:
+            publish_new_messages(messages, unread)
+        except Exception:
+            # The messages are committed; a fan-out outage must not take the writer down
+            metrics.incr("message_writer.publish_errors")
+            logger.exception("Announcing written messages failed")
+
+
+writer = MessageWriter()
@@ -0,0 +1,104 @@
+"""Shared cache for Spotify track searches.
+
+Song pickers search on every keystroke, and many users type the same
+queries, so results are cached per normalized query for
+``SEARCH_CACHE_TTL_SECONDS`` in a size-bounded LRU. Concurrent misses for
+the same query are coalesced: the first caller fetches from Spotify and the
+rest wait for its result instead of making their own upstream call.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+from app.core import metrics
+from app.core.config import settings
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+class SearchCache:
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, key, fetch: Callable[[], list]) -> list:
+        """The cached value for ``key``, or the result of ``fetch()``, which is then cached.
+
+        A failed fetch is raised to every caller waiting on it and is not cached.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._data.move_to_end(key)
+                metrics.incr("search_cache.hits")
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            metrics.incr("search_cache.coalesced")
+            return pending.result()
+
+        metrics.incr("search_cache.misses")
+        try:
+            value = fetch()
+        except Exception as exc:
+            with self._lock:
+                del self._inflight[key]
+            pending.set_exception(exc)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._data[key] = (self._clock() + self.ttl, value)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            metrics.set_gauge("search_cache.size", len(self._data))
+        pending.set_result(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_cache = SearchCache(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_SECONDS)
+
+
+def cached_search(query: str, limit: int, fetch: Callable[[str, int], list]) -> list:
+    """Search results for ``query``, calling ``fetch(normalized_query, limit)`` only on a miss."""
+    normalized = normalize_query(query)
+    return _cache.get_or_fetch((normalized, limit), lambda: fetch(normalized, limit))
+
+
+def cache_stats() -> dict:
+    hits = metrics.get_counter("search_cache.hits")
+    coalesced = metrics.get_counter("search_cache.coalesced")
+    misses = metrics.get_counter("search_cache.misses")
+    lookups = hits + coalesced + misses
+    return {
+        "hits": hits,
+        "coalesced": coalesced,
+        "misses": misses,
+        "hit_ratio": round((hits + coalesced) / lookups, 3) if lookups else 0.0,
+        "upstream_calls_saved": hits + coalesced,
+    }
+
+
+def clear() -> None:
+    _cache.clear()
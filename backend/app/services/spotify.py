@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import httpx
 
 from app.core.config import settings
+from app.services.search_cache import cached_search
 
 
 def is_mock_mode() -> bool:
@@ -272,6 +273,11 @@ def search_tracks(access_token: str, query: str, limit: int = 10) -> list[dict]:
     ]
 
 
+def search_tracks_cached(access_token: str, query: str, limit: int = 10) -> list[dict]:
+    """search_tracks through the shared search cache; identical queries share one upstream call."""
+    return cached_search(query, limit, lambda q, n: search_tracks(access_token, q, n))
+
+
 def save_track_to_library(access_token: str, track_id: str) -> bool:
     """Save a track to the user's Spotify Liked Songs."""
     response = httpx.put(
@@ -0,0 +1,85 @@
+"""Scheduled weekly playlist recaps.
+
+Once a week has ended (weeks start on Monday, UTC), a background thread
+writes the recap of that week for every active playlist in one batch pass
+(see generate_weekly_recaps). GET /api/playlist/{id}/recap only reads the
+latest recap. The same pass can be run by hand with
+``python -m app.commands.generate_weekly_recaps``.
+"""
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud.playlist import generate_weekly_recaps, week_start_of
+
+logger = logging.getLogger(__name__)
+
+
+def last_completed_week(now: datetime) -> date:
+    """The Monday starting the most recent week that has fully ended by ``now``."""
+    return week_start_of(now) - timedelta(days=7)
+
+
+def run_recaps(db: Session, week_start: date) -> int:
+    """Write and commit the recaps for ``week_start``. Returns how many were written."""
+    written = generate_weekly_recaps(db, week_start)
+    db.commit()
+    metrics.incr("weekly_recaps.generated", written)
+    return written
+
+
+class WeeklyRecapScheduler:
+    """Daemon thread that generates last week's recaps once the week boundary has passed."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        interval: float | None = None,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self._session_factory = session_factory
+        self._interval = interval if interval is not None else settings.WEEKLY_RECAP_INTERVAL_SECONDS
+        self._clock = clock
+        self._done_week: date | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="weekly-recap-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_due(self) -> int:
+        """Generate the last completed week's recaps unless this scheduler already has."""
+        week = last_completed_week(self._clock())
+        if week == self._done_week:
+            return 0
+        db = self._session_factory()
+        try:
+            written = run_recaps(db, week)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self._done_week = week
+        return written
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_due()
+            except Exception:
+                metrics.incr("weekly_recaps.errors")
+                logger.exception("Weekly recap generation failed")
+            self._stop.wait(self._interval)
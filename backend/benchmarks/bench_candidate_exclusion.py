@@ -0,0 +1,79 @@
+"""Compare swiped-user exclusion strategies for the match feed candidate query.
+
+The old query materialised every swipe target into a Python set and bound it
+back as a NOT IN list; get_candidates now uses a correlated NOT EXISTS. Runs
+against a throwaway in-memory SQLite database:
+
+    python -m benchmarks.bench_candidate_exclusion
+"""
+import statistics
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.crud.match import get_candidates, get_swiped_user_ids
+from app.models import MusicProfile, Swipe, User
+
+POOL_SIZE = 12000
+SWIPE_COUNTS = (100, 1000, 10000)
+REPEATS = 5
+
+
+def _not_in_candidates(db, user_id: int) -> list:
+    exclude_ids = get_swiped_user_ids(db, user_id) | {user_id}
+    return (
+        db.query(User, MusicProfile)
+        .join(MusicProfile, MusicProfile.user_id == User.id)
+        .filter(User.id.notin_(exclude_ids))
+        .all()
+    )
+
+
+def _seed(db) -> None:
+    db.execute(insert(User), [
+        {"id": i, "email": f"bench{i}@student.manchester.ac.uk", "hashed_password": "x", "display_name": f"Bench {i}"}
+        for i in range(1, POOL_SIZE + 1)
+    ])
+    db.execute(insert(MusicProfile), [
+        {"user_id": i, "top_artists": [], "top_genres": [], "recent_tracks": [], "listening_patterns": {}}
+        for i in range(1, POOL_SIZE + 1)
+    ])
+    db.commit()
+
+
+def _time(fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+
+    print(f"{'swipes':>8} {'NOT IN (ms)':>12} {'NOT EXISTS (ms)':>16} {'candidates':>11}")
+    for user_id, swipes in enumerate(SWIPE_COUNTS, start=1):
+        db.execute(insert(Swipe), [
+            {"user_id": user_id, "target_user_id": target, "action": "pass"}
+            for target in range(POOL_SIZE - swipes + 1, POOL_SIZE + 1)
+        ])
+        db.commit()
+
+        expected = len(_not_in_candidates(db, user_id))
+        assert len(get_candidates(db, user_id)) == expected
+        db.expunge_all()
+
+        not_in_ms = _time(lambda: (_not_in_candidates(db, user_id), db.expunge_all()))
+        not_exists_ms = _time(lambda: (get_candidates(db, user_id), db.expunge_all()))
+        print(f"{swipes:>8} {not_in_ms:>12.1f} {not_exists_ms:>16.1f} {expected:>11}")
+
+
+if __name__ == "__main__":
+    main()
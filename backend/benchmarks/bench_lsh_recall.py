@@ -0,0 +1,74 @@
+"""Recall and latency of the MinHash LSH shortlist against brute-force scoring.
+
+Builds synthetic profiles with generate_mock_profile, interns their artists and
+genres the way feature_terms does, and for a sample of users compares the
+exact top-K from scoring everyone with the top-K after re-scoring only the
+LSH shortlist with compute_compatibility. Recall counts a shortlisted result
+as a hit when it scores at least the K-th best brute-force score, so ties do
+not penalise either side. No database is needed:
+
+    python -m benchmarks.bench_lsh_recall
+"""
+import statistics
+import time
+
+import numpy as np
+
+from app.services.compatibility import compute_compatibility, compute_compatibility_batch
+from app.services.lsh import MinHashLSH
+from app.services.spotify import generate_mock_profile
+
+POOL_SIZES = (5000, 20000)
+SHORTLISTS = (100, 300, 1000)
+QUERIES = 30
+TOP_K = 20
+
+
+def _encode(profiles: list[dict]) -> list[np.ndarray]:
+    terms: dict[tuple[str, str], int] = {}
+    encoded = []
+    for p in profiles:
+        keys = [("artist", a["spotify_id"]) for a in p["top_artists"]]
+        keys += [("genre", g["genre"]) for g in p["top_genres"]]
+        ids = [terms.setdefault(k, len(terms)) for k in dict.fromkeys(keys)]
+        encoded.append(np.array(ids, dtype=np.int32))
+    return encoded
+
+
+def main() -> None:
+    print(f"{'pool':>7} {'shortlist':>10} {'recall@' + str(TOP_K):>10} {'brute (ms)':>11} {'lsh (ms)':>9}")
+    for pool in POOL_SIZES:
+        profiles = [generate_mock_profile(uid) for uid in range(pool)]
+        term_ids = _encode(profiles)
+        index = MinHashLSH()
+        for uid, ids in enumerate(term_ids):
+            index.add(uid, ids)
+
+        queries = range(0, pool, pool // QUERIES)[:QUERIES]
+        brute_ms, kth_best = [], {}
+        for uid in queries:
+            start = time.perf_counter()
+            others = [p for i, p in enumerate(profiles) if i != uid]
+            scores = np.sort(compute_compatibility_batch(profiles[uid], others).scores)[::-1]
+            brute_ms.append((time.perf_counter() - start) * 1000)
+            kth_best[uid] = scores[TOP_K - 1]
+
+        for shortlist in SHORTLISTS:
+            lsh_ms, recalls = [], []
+            for uid in queries:
+                start = time.perf_counter()
+                ids = index.query(term_ids[uid], shortlist, exclude=uid)
+                scored = sorted(
+                    (compute_compatibility(profiles[uid], profiles[i])["score"] for i in ids),
+                    reverse=True,
+                )[:TOP_K]
+                lsh_ms.append((time.perf_counter() - start) * 1000)
+                recalls.append(sum(s >= kth_best[uid] for s in scored) / TOP_K)
+            print(
+                f"{pool:>7} {shortlist:>10} {statistics.mean(recalls):>10.3f} "
+                f"{statistics.median(brute_ms):>11.1f} {statistics.median(lsh_ms):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
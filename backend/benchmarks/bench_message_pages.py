@@ -0,0 +1,91 @@
+"""Compare offset and keyset pagination over one long conversation.
+
+Seeds a throwaway in-memory SQLite database with a 100k-message
+conversation (plus noise in other matches) and times fetching a 50-message
+page at increasing depths (messages newer than the page), via the legacy
+offset and via before_id, and the default "latest 50" page:
+
+    python -m benchmarks.bench_message_pages
+"""
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.crud.message import get_message, get_messages
+from app.models import Match, Message, User
+
+CONVERSATION = 100_000
+NOISE_MATCHES = 20
+NOISE_PER_MATCH = 2_000
+PAGE = 50
+DEPTHS = (0, 1_000, 10_000, 50_000, 99_000)
+REPEATS = 7
+
+
+def _seed(db) -> None:
+    db.execute(insert(User), [
+        {"id": i, "email": f"bench{i}@student.manchester.ac.uk", "hashed_password": "x", "display_name": f"Bench {i}"}
+        for i in (1, 2)
+    ])
+    db.execute(insert(Match), [
+        {"id": m, "user1_id": 1, "user2_id": 2, "compatibility_score": 50, "breakdown": {}}
+        for m in range(1, NOISE_MATCHES + 2)
+    ])
+    start = datetime(2030, 1, 1)
+    rows = [
+        {"match_id": 1, "sender_id": 1 + i % 2, "content": f"message {i}", "created_at": start + timedelta(seconds=i)}
+        for i in range(CONVERSATION)
+    ]
+    rows += [
+        {"match_id": m, "sender_id": 1, "content": "noise", "created_at": start + timedelta(seconds=i)}
+        for m in range(2, NOISE_MATCHES + 2) for i in range(NOISE_PER_MATCH)
+    ]
+    db.execute(insert(Message), rows)
+    db.commit()
+
+
+def _time(fn) -> float:
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main() -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+
+    ids = [m for (m,) in db.query(Message.id).filter(Message.match_id == 1).order_by(Message.created_at, Message.id)]
+
+    latest_ms = _time(lambda: (get_messages(db, 1, limit=PAGE), db.expunge_all()))
+    print(f"latest {PAGE}: {latest_ms:.2f} ms\n")
+    print(f"{'depth':>8} {'offset (ms)':>12} {'before_id (ms)':>15}")
+    for depth in DEPTHS:
+        offset = CONVERSATION - depth - PAGE
+        anchor_id = ids[offset + PAGE] if depth else None
+
+        def by_offset():
+            page = get_messages(db, 1, limit=PAGE, offset=offset)
+            db.expunge_all()
+            return [m.id for m in page]
+
+        def by_keyset():
+            anchor = get_message(db, 1, anchor_id) if anchor_id else None
+            page = get_messages(db, 1, limit=PAGE, before=anchor)
+            db.expunge_all()
+            return [m.id for m in page]
+
+        assert by_offset() == by_keyset()
+        print(f"{depth:>8} {_time(by_offset):>12.2f} {_time(by_keyset):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare per-message commits with the group-commit MessageWriter.
+
+Seeds a throwaway SQLite file (on disk, so every commit pays its fsync) with
+users and matches, then has SENDERS threads each send MESSAGES messages as
+fast as they can -- first through create_message with a session and commit
+per message, as send_message does by default, then through MessageWriter:
+
+    python -m benchmarks.bench_message_writes
+"""
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core import metrics
+from app.core.database import Base
+from app.crud.message import create_message
+from app.models import Match, Message, User
+from app.services.message_writer import MessageWriter
+
+SENDERS = 32
+MESSAGES = 100
+MATCHES = 16
+
+
+def _engine(path: str):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+
+    @event.listens_for(engine, "connect")
+    def _wal(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=FULL")
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "email": f"bench{i}@student.manchester.ac.uk", "hashed_password": "x", "display_name": f"Bench {i}"}
+            for i in range(1, MATCHES * 2 + 1)
+        ])
+        conn.execute(insert(Match), [
+            {"id": m, "user1_id": 2 * m - 1, "user2_id": 2 * m, "compatibility_score": 50, "breakdown": {}}
+            for m in range(1, MATCHES + 1)
+        ])
+    return engine
+
+
+def _run(send) -> float:
+    """Messages per second with SENDERS threads each calling ``send(sender_index, i)``."""
+    threads = [
+        threading.Thread(target=lambda s=s: [send(s, i) for i in range(MESSAGES)])
+        for s in range(SENDERS)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return SENDERS * MESSAGES / (time.perf_counter() - start)
+
+
+def _args(sender: int, i: int) -> tuple[int, int, str]:
+    match_id = sender % MATCHES + 1
+    return match_id, 2 * match_id - 1 + i % 2, f"message {i} from sender {sender}"
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _engine(os.path.join(tmp, "per_message.db"))
+        session_factory = sessionmaker(bind=engine)
+
+        def per_message(sender: int, i: int) -> None:
+            db = session_factory()
+            try:
+                create_message(db, *_args(sender, i))
+            finally:
+                db.close()
+
+        per_message_rate = _run(per_message)
+        with session_factory() as db:
+            assert db.query(Message).count() == SENDERS * MESSAGES
+        engine.dispose()
+
+        engine = _engine(os.path.join(tmp, "grouped.db"))
+        writer = MessageWriter(sessionmaker(bind=engine))
+        writer.start()
+        grouped_rate = _run(lambda sender, i: writer.submit(*_args(sender, i)).result())
+        writer.stop()
+        with sessionmaker(bind=engine)() as db:
+            assert db.query(Message).count() == SENDERS * MESSAGES
+        engine.dispose()
+
+    batches = metrics.get_counter("message_writer.batches")
+    print(f"{SENDERS} senders x {MESSAGES} messages")
+    print(f"{'per-message commit':>20}: {per_message_rate:8.0f} msg/s")
+    print(f"{'group commit':>20}: {grouped_rate:8.0f} msg/s  "
+          f"({batches:.0f} batches, {SENDERS * MESSAGES / batches:.1f} messages per batch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.core.config import settings
 from app.core.database import Base
-from app.api.deps import get_db
+from app.api.deps import get_db, get_session_factory
 from app.main import app
+from app.services import compat_cache, lsh
 
 # Use an in-memory SQLite database for each test session
 TEST_DB_URL = "sqlite:///./tests/test.db"
@@ -14,6 +16,13 @@ TEST_DB_URL = "sqlite:///./tests/test.db"
 engine = create_engine(TEST_DB_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Keep the LSH index in memory so test runs never write next to the app database
+settings.LSH_INDEX_PATH = ""
+# Snapshots are rebuilt explicitly in tests; the worker would use the app database
+settings.FEED_SNAPSHOT_WORKER = False
+# Recaps are generated explicitly in tests
+settings.WEEKLY_RECAP_SCHEDULER = False
+
 
 def override_get_db():
     db = TestingSessionLocal()
@@ -39,6 +48,13 @@ def db_rollback():
     session = TestingSessionLocal(bind=connection)
 
     app.dependency_overrides[get_db] = lambda: session
+    # Short-lived sessions (WebSockets) share the test transaction through savepoints
+    app.dependency_overrides[get_session_factory] = lambda: (
+        lambda: TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    )
+    # Ids are reused once a test's rows are rolled back, so in-process caches must not leak
+    compat_cache.clear()
+    lsh.reset()
 
     yield session
 
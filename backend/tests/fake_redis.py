@@ -0,0 +1,54 @@
+"""In-memory stand-in for the parts of the redis-py client used by RedisFanout."""
+import queue
+import threading
+
+
+class FakeRedis:
+    """A "server" that any number of FakePubSub connections can share, like separate processes would."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: dict[str, list["FakePubSub"]] = {}
+
+    def publish(self, channel: str, message) -> int:
+        data = message.encode() if isinstance(message, str) else message
+        with self._lock:
+            receivers = list(self._subscriptions.get(channel, ()))
+        for pubsub in receivers:
+            pubsub._queue.put({"type": "message", "pattern": None, "channel": channel.encode(), "data": data})
+        return len(receivers)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "FakePubSub":
+        return FakePubSub(self, ignore_subscribe_messages)
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedis, ignore_subscribe_messages: bool):
+        self._server = server
+        self._ignore_subscribe_messages = ignore_subscribe_messages
+        self._queue: queue.Queue = queue.Queue()
+        self._channels: set[str] = set()
+
+    def subscribe(self, *channels: str) -> None:
+        with self._server._lock:
+            for channel in channels:
+                self._server._subscriptions.setdefault(channel, []).append(self)
+                self._channels.add(channel)
+        if not self._ignore_subscribe_messages:
+            for channel in channels:
+                self._queue.put({"type": "subscribe", "pattern": None, "channel": channel.encode(), "data": 1})
+
+    def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0):
+        try:
+            message = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        if message["type"] != "message" and (ignore_subscribe_messages or self._ignore_subscribe_messages):
+            return None
+        return message
+
+    def close(self) -> None:
+        with self._server._lock:
+            for channel in self._channels:
+                self._server._subscriptions[channel].remove(self)
+        self._channels.clear()
@@ -1,6 +1,32 @@
 """Tests for /api/chat endpoints."""
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
 import pytest
-from tests.conftest import auth_headers, register_user
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.deps import get_session_factory
+from app.core import metrics
+from app.core.config import settings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.crud.message import create_message, get_unread_count, mark_messages_read, rebuild_unread_counters
+from app.models.match import Match
+from app.models.message import Message, UnreadCounter
+from app.models.user import User
+from app.services import chat_broker
+from app.services.chat_broker import ChatBroker, Subscriber
+from app.services.fanout import MemoryFanout, RedisFanout, SQLiteFanout
+from app.main import app
+from app.services.message_writer import MessageWriter
+from tests.fake_redis import FakeRedis
+
+from tests.conftest import TestingSessionLocal, auth_headers, register_user
+from tests.test_match import count_queries
 
 
 def create_match(client):
@@ -113,6 +139,268 @@ class TestSendMessage:
         assert r.status_code in (401, 403)
 
 
+class TestMessageWriter:
+    @pytest.fixture
+    def writer(self, db_rollback):
+        # Savepoints keep the writer's commits and rollbacks inside the test transaction
+        connection = db_rollback.connection()
+        writer = MessageWriter(
+            lambda: TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint"),
+            max_wait=0.2,
+        )
+        writer.start()
+        yield writer
+        writer.stop()
+
+    def test_burst_lands_in_one_batch(self, client, db_rollback, writer):
+        token_a, token_b, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+        batches = metrics.get_counter("message_writer.batches")
+
+        futures = [writer.submit(match_id, a_id, f"burst {i}") for i in range(20)]
+        messages = [f.result(timeout=5) for f in futures]
+        assert metrics.get_counter("message_writer.batches") == batches + 1
+        ids = [m.id for m in messages]
+        assert ids == sorted(ids) and all(m.created_at is not None for m in messages)
+        assert get_unread_count(db_rollback, b_id)[match_id] == 20
+
+    def test_bad_message_fails_alone(self, client, db_rollback, writer):
+        token_a, _, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        good = writer.submit(match_id, a_id, "fine")
+        bad = writer.submit(match_id, a_id, None)
+        assert good.result(timeout=5).id is not None
+        with pytest.raises(Exception):
+            bad.result(timeout=5)
+        assert db_rollback.query(Message).filter(Message.match_id == match_id, Message.content == "fine").count() == 1
+
+    def test_send_goes_through_running_writer(self, client, writer, monkeypatch):
+        token_a, token_b, match_id = create_match(client)
+        monkeypatch.setattr("app.api.routes.chat.message_writer", writer)
+        messages = metrics.get_counter("message_writer.messages")
+        r = client.post(f"/api/chat/{match_id}", json={"content": "queued"}, headers=auth_headers(token_a))
+        assert r.status_code == 200, r.text
+        assert r.json()["content"] == "queued" and r.json()["is_read"] is False
+        assert metrics.get_counter("message_writer.messages") == messages + 1
+        page = client.get(f"/api/chat/{match_id}", headers=auth_headers(token_b)).json()
+        assert page[-1]["id"] == r.json()["id"]
+
+    def test_submit_after_stop_raises(self, client, writer):
+        token_a, _, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        queued = writer.submit(match_id, a_id, "before stop")
+        writer.stop()
+        assert queued.result(timeout=0).id is not None
+        with pytest.raises(RuntimeError):
+            writer.submit(match_id, a_id, "after stop")
+
+    def test_stop_fails_futures_left_in_queue(self, db_rollback, monkeypatch):
+        writer = MessageWriter(lambda: None)
+        # A writer thread that exits on stop without draining the queue
+        monkeypatch.setattr(writer, "_run", lambda: writer._stop.wait())
+        writer.start()
+        stranded = writer.submit(1, 1, "never written")
+        writer.stop()
+        with pytest.raises(RuntimeError):
+            stranded.result(timeout=0)
+
+    def test_writer_survives_a_failed_announcement(self, client, writer, monkeypatch):
+        token_a, _, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+
+        def fanout_down(messages, unread):
+            raise ConnectionError("fan-out unavailable")
+
+        monkeypatch.setattr("app.services.message_writer.publish_new_messages", fanout_down)
+        errors = metrics.get_counter("message_writer.publish_errors")
+        assert writer.submit(match_id, a_id, "first").result(timeout=5).id is not None
+        assert writer.submit(match_id, a_id, "second").result(timeout=5).id is not None
+        assert writer.running
+        assert metrics.get_counter("message_writer.publish_errors") == errors + 2
+
+    def test_dead_writer_is_not_running(self, monkeypatch):
+        writer = MessageWriter(lambda: None)
+        monkeypatch.setattr(writer, "_run", lambda: None)
+        writer.start()
+        writer._thread.join()
+        assert not writer.running
+        with pytest.raises(RuntimeError):
+            writer.submit(1, 1, "nobody is writing")
+
+    def test_send_falls_back_when_writer_is_stuck(self, client, db_rollback, monkeypatch):
+        token_a, _, match_id = create_match(client)
+        release = threading.Event()
+        writer = MessageWriter(lambda: None)
+        monkeypatch.setattr(writer, "_run", release.wait)  # alive, but never takes anything
+        writer.start()
+        monkeypatch.setattr("app.api.routes.chat.message_writer", writer)
+        monkeypatch.setattr(settings, "CHAT_WRITE_QUEUE_TIMEOUT", 0.1)
+        try:
+            r = client.post(f"/api/chat/{match_id}", json={"content": "stuck"}, headers=auth_headers(token_a))
+            assert r.status_code == 200, r.text
+            assert db_rollback.query(Message).filter(Message.match_id == match_id, Message.content == "stuck").count() == 1
+            # The withdrawn submission is not written a second time
+            _, future = writer._queue.get_nowait()
+            assert future.cancelled()
+        finally:
+            release.set()
+            writer.stop()
+
+    def test_send_falls_back_when_writer_stops_mid_request(self, client, writer, monkeypatch):
+        token_a, _, match_id = create_match(client)
+        writer.stop()
+        # Still looks running to the route, as if stop() began right after its check
+        monkeypatch.setattr(MessageWriter, "running", property(lambda self: True))
+        monkeypatch.setattr("app.api.routes.chat.message_writer", writer)
+        r = client.post(f"/api/chat/{match_id}", json={"content": "direct"}, headers=auth_headers(token_a))
+        assert r.status_code == 200, r.text
+        assert r.json()["content"] == "direct"
+
+
+class TestConversationPaging:
+    def _seed(self, client, db, count=12):
+        token_a, token_b, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        start = datetime(2030, 1, 1)
+        for i in range(count):
+            # Pairs of messages share a timestamp, so ids break the ties
+            db.add(Message(match_id=match_id, sender_id=a_id, content=f"m{i}",
+                           created_at=start + timedelta(seconds=i // 2)))
+        db.commit()
+        return token_a, match_id
+
+    def _get(self, client, token, match_id, **params):
+        r = client.get(f"/api/chat/{match_id}", params=params, headers=auth_headers(token))
+        assert r.status_code == 200, r.text
+        return r.json()
+
+    def test_default_is_latest_page(self, client, db_rollback):
+        token, match_id = self._seed(client, db_rollback)
+        page = self._get(client, token, match_id, limit=5)
+        assert [m["content"] for m in page] == [f"m{i}" for i in range(7, 12)]
+
+    def test_before_id_walks_back_through_history(self, client, db_rollback):
+        token, match_id = self._seed(client, db_rollback)
+        history = self._get(client, token, match_id, limit=100)
+        pages = [self._get(client, token, match_id, limit=5)]
+        while True:
+            older = self._get(client, token, match_id, limit=5, before_id=pages[0][0]["id"])
+            if not older:
+                break
+            pages.insert(0, older)
+        assert [m["id"] for p in pages for m in p] == [m["id"] for m in history]
+        assert [len(p) for p in pages] == [2, 5, 5]
+
+    def test_after_id_returns_newer_messages(self, client, db_rollback):
+        token, match_id = self._seed(client, db_rollback)
+        history = self._get(client, token, match_id, limit=100)
+        newer = self._get(client, token, match_id, limit=3, after_id=history[4]["id"])
+        assert [m["id"] for m in newer] == [m["id"] for m in history[5:8]]
+        assert self._get(client, token, match_id, after_id=history[-1]["id"]) == []
+
+    def test_offset_still_counts_from_oldest(self, client, db_rollback):
+        token, match_id = self._seed(client, db_rollback)
+        page = self._get(client, token, match_id, limit=3, offset=2)
+        assert [m["content"] for m in page] == ["m2", "m3", "m4"]
+
+    def test_bad_cursors_rejected(self, client, db_rollback):
+        token, match_id = self._seed(client, db_rollback)
+        first = self._get(client, token, match_id, limit=1)[0]["id"]
+        for params in ({"before_id": 10**9}, {"before_id": first, "after_id": first}, {"after_id": first, "offset": 0}):
+            r = client.get(f"/api/chat/{match_id}", params=params, headers=auth_headers(token))
+            assert r.status_code == 400
+
+
+class TestConversationSearch:
+    def _seed(self, client, db, contents):
+        token_a, token_b, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        for content in contents:
+            db.add(Message(match_id=match_id, sender_id=a_id, content=content))
+        db.commit()
+        return token_a, token_b, match_id
+
+    def _search(self, client, token, match_id, **params):
+        r = client.get(f"/api/chat/{match_id}/search", params=params, headers=auth_headers(token))
+        assert r.status_code == 200, r.text
+        return r
+
+    def test_newest_hits_first_with_snippets(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, [
+            "I love the guitar solo in that song",
+            "Guitar guitar guitar, all day long",
+            "Drums are underrated",
+        ])
+        hits = self._search(client, token, match_id, q="guitar").json()
+        assert [h["message"]["content"] for h in hits] == [
+            "Guitar guitar guitar, all day long", "I love the guitar solo in that song",
+        ]
+        assert "<mark>guitar</mark>" in hits[1]["snippet"]
+        assert hits[0]["message"]["match_id"] == match_id
+
+    def test_snippet_is_html_escaped(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, [
+            '<img src=x onerror="alert(1)"> great gig [tonight] & <b>bold</b>',
+        ])
+        snippet = self._search(client, token, match_id, q="gig").json()[0]["snippet"]
+        assert "<img" not in snippet and "<b>" not in snippet
+        assert "&lt;img" in snippet and "&amp;" in snippet
+        assert "<mark>gig</mark>" in snippet
+        assert "<mark>tonight</mark>" not in snippet
+
+    def test_all_terms_prefix_and_edits(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, ["see you at the concert", "concerts are loud"])
+        assert len(self._search(client, token, match_id, q="loud concert").json()) == 1
+        assert len(self._search(client, token, match_id, q="conc").json()) == 2
+
+        message = db_rollback.query(Message).filter_by(match_id=match_id, content="concerts are loud").one()
+        message.content = "festivals are loud"
+        db_rollback.commit()
+        assert [h["message"]["id"] for h in self._search(client, token, match_id, q="festival").json()] == [message.id]
+        db_rollback.delete(message)
+        db_rollback.commit()
+        assert self._search(client, token, match_id, q="festival").json() == []
+
+    def test_scoped_to_match_and_participants(self, client, db_rollback):
+        token_a, token_b, match_id = self._seed(client, db_rollback, ["secret setlist"])
+        outsider = register_user(client, suffix="searchout")
+        r = client.get(f"/api/chat/{match_id}/search", params={"q": "setlist"}, headers=auth_headers(outsider))
+        assert r.status_code == 403
+        assert len(self._search(client, token_b, match_id, q="setlist").json()) == 1
+
+    def test_query_syntax_is_not_interpreted(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, ['he said "NEAR" AND left'])
+        for q in ['"', "NEAR(", "AND", "*", "said OR"]:
+            self._search(client, token, match_id, q=q)
+        assert len(self._search(client, token, match_id, q='"near" and').json()) == 1
+
+    def test_cursor_pages(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, [f"vinyl record {i}" for i in range(7)])
+        everything = [h["message"]["id"] for h in self._search(client, token, match_id, q="vinyl", limit=100).json()]
+        paged, cursor = [], None
+        while True:
+            r = self._search(client, token, match_id, q="vinyl", limit=3, **({"cursor": cursor} if cursor else {}))
+            paged += [h["message"]["id"] for h in r.json()]
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert len(everything) == 7 and paged == everything
+
+    def test_cursor_survives_new_messages(self, client, db_rollback):
+        token, _, match_id = self._seed(client, db_rollback, [f"vinyl record {i}" for i in range(6)])
+        a_id = client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+        first = self._search(client, token, match_id, q="vinyl", limit=3)
+        # New matching messages, including much better matches, land between page requests
+        for _ in range(3):
+            db_rollback.add(Message(match_id=match_id, sender_id=a_id, content="vinyl vinyl vinyl"))
+        db_rollback.commit()
+        second = self._search(client, token, match_id, q="vinyl", limit=3, cursor=first.headers["X-Next-Cursor"])
+        ids = [h["message"]["id"] for h in first.json() + second.json()]
+        assert len(set(ids)) == 6
+        assert "X-Next-Cursor" not in second.headers
+
+
 class TestMarkRead:
     def test_mark_messages_read(self, client):
         token_a, token_b, match_id = create_match(client)
@@ -126,6 +414,54 @@ class TestMarkRead:
         assert r.status_code == 200
         assert r.json()["marked_read"] == 2
 
+    def test_is_read_follows_watermark(self, client, db_rollback):
+        token_a, token_b, match_id = create_match(client)
+        first = client.post(f"/api/chat/{match_id}", json={"content": "old"}, headers=auth_headers(token_a)).json()
+        client.put(f"/api/chat/{match_id}/read", headers=auth_headers(token_b))
+        client.post(f"/api/chat/{match_id}", json={"content": "new"}, headers=auth_headers(token_a))
+        reply = client.post(f"/api/chat/{match_id}", json={"content": "reply"}, headers=auth_headers(token_b)).json()
+
+        page = client.get(f"/api/chat/{match_id}", headers=auth_headers(token_b)).json()
+        assert {m["content"]: m["is_read"] for m in page if m["id"] >= first["id"]} == {
+            "old": True, "new": False, "reply": False,
+        }
+        # Only the reader's watermark moved; the message rows were not rewritten
+        assert db_rollback.query(Message).filter(Message.match_id == match_id, Message.is_read == True).count() == 0  # noqa: E712
+        assert client.put(f"/api/chat/{match_id}/read", headers=auth_headers(token_a)).json()["marked_read"] >= 1
+        page = client.get(f"/api/chat/{match_id}", headers=auth_headers(token_a)).json()
+        assert {m["content"]: m["is_read"] for m in page if m["id"] >= first["id"]} == {
+            "old": True, "new": False, "reply": True,
+        }
+
+    def test_message_sent_during_mark_read_stays_unread(self, client, db_rollback, monkeypatch):
+        token_a, token_b, match_id = create_match(client)
+        a_id = client.get("/api/auth/me", headers=auth_headers(token_a)).json()["id"]
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+        for txt in ["one", "two"]:
+            client.post(f"/api/chat/{match_id}", json={"content": txt}, headers=auth_headers(token_a))
+
+        real_query = db_rollback.query
+
+        class NewestThenSend:
+            """The newest-id lookup, with another message landing right after it."""
+
+            def __init__(self, query):
+                self.query = query
+
+            def filter(self, *criteria):
+                self.query = self.query.filter(*criteria)
+                return self
+
+            def scalar(self):
+                newest = self.query.scalar()
+                monkeypatch.setattr(db_rollback, "query", real_query)
+                create_message(db_rollback, match_id, a_id, "three")
+                return newest
+
+        monkeypatch.setattr(db_rollback, "query", lambda *entities: NewestThenSend(real_query(*entities)))
+        assert mark_messages_read(db_rollback, match_id, b_id) == 2
+        assert get_unread_count(db_rollback, b_id)[match_id] == 1
+
 
 class TestUnreadCount:
     def test_unread_count_increases(self, client):
@@ -145,6 +481,144 @@ class TestUnreadCount:
         assert r.status_code == 200
         assert r.json()["total"] == 0
 
+    def test_counter_follows_sends_and_reads(self, client):
+        token_a, token_b, match_id = create_match(client)
+        for txt in ["one", "two", "three"]:
+            client.post(f"/api/chat/{match_id}", json={"content": txt, "message_type": "text"},
+                        headers=auth_headers(token_a))
+        by_match = client.get("/api/chat/unread/count", headers=auth_headers(token_b)).json()["by_match"]
+        assert by_match[str(match_id)] == 3
+        # The sender has nothing unread in this match
+        by_match = client.get("/api/chat/unread/count", headers=auth_headers(token_a)).json()["by_match"]
+        assert str(match_id) not in by_match
+
+        client.put(f"/api/chat/{match_id}/read", headers=auth_headers(token_b))
+        by_match = client.get("/api/chat/unread/count", headers=auth_headers(token_b)).json()["by_match"]
+        assert str(match_id) not in by_match
+
+    def test_rebuild_matches_incremental_counts(self, client, db_rollback):
+        token_a, token_b, match_id = create_match(client)
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+        for txt in ["x", "y"]:
+            client.post(f"/api/chat/{match_id}", json={"content": txt, "message_type": "text"},
+                        headers=auth_headers(token_a))
+        expected = get_unread_count(db_rollback, b_id)
+
+        db_rollback.query(UnreadCounter).delete()
+        assert get_unread_count(db_rollback, b_id) == {}
+        rebuild_unread_counters(db_rollback)
+        assert get_unread_count(db_rollback, b_id) == expected
+        assert expected[match_id] == 2
+
+    def test_rebuild_seeds_watermark_from_legacy_flags(self, client, db_rollback):
+        token_a, token_b, match_id = create_match(client)
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+        sent = [
+            client.post(f"/api/chat/{match_id}", json={"content": txt}, headers=auth_headers(token_a)).json()["id"]
+            for txt in ["a", "b", "c"]
+        ]
+        db_rollback.query(UnreadCounter).delete()
+        db_rollback.query(Message).filter(Message.id.in_(sent[:2])).update({"is_read": True})
+
+        rebuild_unread_counters(db_rollback)
+        assert get_unread_count(db_rollback, b_id)[match_id] == 1
+        state = db_rollback.query(UnreadCounter).filter_by(user_id=b_id, match_id=match_id).one()
+        assert state.last_read_message_id == sent[1]
+
+    def test_backfilled_when_table_is_first_created(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'pre_counters.db'}")
+        tables = [t for t in Base.metadata.sorted_tables if t.name != "unread_counters"]
+        Base.metadata.create_all(engine, tables=tables)
+        with Session(engine) as db:
+            a = User(email="a@student.manchester.ac.uk", hashed_password="x", display_name="A")
+            b = User(email="b@student.manchester.ac.uk", hashed_password="x", display_name="B")
+            db.add_all([a, b])
+            db.flush()
+            match = Match(user1_id=a.id, user2_id=b.id, compatibility_score=50.0)
+            db.add(match)
+            db.flush()
+            db.add_all([
+                Message(match_id=match.id, sender_id=a.id, content="read", is_read=True),
+                Message(match_id=match.id, sender_id=a.id, content="unread"),
+            ])
+            db.commit()
+            b_id, match_id = b.id, match.id
+
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as db:
+            assert get_unread_count(db, b_id) == {match_id: 1}
+        engine.dispose()
+
+
+class TestInbox:
+    def _setup(self, client, count=3, token=None, start=0):
+        if token is None:
+            token = register_user(client, suffix="inbox")
+            client.post("/api/spotify/sync", headers=auth_headers(token))
+        others, match_ids = [], []
+        for i in range(start, start + count):
+            other = register_user(client, suffix=f"inbox{i}")
+            client.post("/api/spotify/sync", headers=auth_headers(other))
+            other_id = client.get("/api/auth/me", headers=auth_headers(other)).json()["id"]
+            r = client.post("/api/match/swipe", json={"target_user_id": other_id, "action": "like"},
+                            headers=auth_headers(token))
+            others.append(other)
+            match_ids.append(r.json()["match_id"])
+        return token, others, match_ids
+
+    def _inbox(self, client, token, **params):
+        r = client.get("/api/chat/inbox", params=params, headers=auth_headers(token))
+        assert r.status_code == 200, r.text
+        return r
+
+    def test_entries_ordered_by_last_activity(self, client):
+        token, others, match_ids = self._setup(client)
+        client.post(f"/api/chat/{match_ids[0]}", json={"content": "first"}, headers=auth_headers(others[0]))
+        client.post(f"/api/chat/{match_ids[0]}", json={"content": "second"}, headers=auth_headers(others[0]))
+        client.post(f"/api/chat/{match_ids[1]}", json={"content": "mine"}, headers=auth_headers(token))
+
+        entries = [e for e in self._inbox(client, token).json() if e["id"] in match_ids]
+        assert [e["id"] for e in entries] == [match_ids[1], match_ids[0], match_ids[2]]
+        latest, older, silent = entries
+        assert latest["last_message"]["content"] == "mine" and latest["unread_count"] == 0
+        assert older["last_message"]["content"] == "second" and older["unread_count"] == 2
+        assert silent["last_message"] is None and silent["last_activity"] == silent["created_at"]
+        assert older["other_user"]["display_name"]
+
+    def test_last_message_read_state(self, client):
+        token, others, match_ids = self._setup(client, count=1)
+        client.post(f"/api/chat/{match_ids[0]}", json={"content": "seen?"}, headers=auth_headers(token))
+        entry = next(e for e in self._inbox(client, token).json() if e["id"] == match_ids[0])
+        assert entry["last_message"]["is_read"] is False
+        client.put(f"/api/chat/{match_ids[0]}/read", headers=auth_headers(others[0]))
+        entry = next(e for e in self._inbox(client, token).json() if e["id"] == match_ids[0])
+        assert entry["last_message"]["is_read"] is True
+
+    def test_cursor_pages_cover_inbox(self, client):
+        token, _, _ = self._setup(client)
+        everything = [e["id"] for e in self._inbox(client, token, limit=100).json()]
+        paged, cursor = [], None
+        while True:
+            r = self._inbox(client, token, limit=2, **({"cursor": cursor} if cursor else {}))
+            paged += [e["id"] for e in r.json()]
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert paged == everything
+        assert client.get("/api/chat/inbox", params={"cursor": "junk"}, headers=auth_headers(token)).status_code == 400
+
+    def test_constant_queries(self, client):
+        token, others, match_ids = self._setup(client, count=1)
+        with count_queries() as few:
+            self._inbox(client, token)
+        _, more_others, more_ids = self._setup(client, count=4, token=token, start=1)
+        for other, match_id in zip(more_others, more_ids):
+            client.post(f"/api/chat/{match_id}", json={"content": "hey"}, headers=auth_headers(other))
+        with count_queries() as many:
+            self._inbox(client, token)
+        assert many["n"] == few["n"]
+
 
 class TestChatUtilities:
     def test_prompts_list(self, client):
@@ -173,3 +647,219 @@ class TestChatUtilities:
     def test_song_search_requires_auth(self, client):
         r = client.get("/api/chat/search-song/results?q=love")
         assert r.status_code in (401, 403)
+
+
+class TestChatSocket:
+    def _connect(self, client, token):
+        return client.websocket_connect(f"/ws/chat?token={token}")
+
+    def test_invalid_token_rejected(self, client):
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with self._connect(client, "not-a-token") as ws:
+                ws.receive_json()
+        assert exc.value.code == 1008
+
+    def test_new_message_pushed_to_both_sides(self, client):
+        token_a, token_b, match_id = create_match(client)
+        with self._connect(client, token_a) as ws_a, self._connect(client, token_b) as ws_b:
+            assert match_id in ws_a.receive_json()["match_ids"]
+            assert match_id in ws_b.receive_json()["match_ids"]
+
+            r = client.post(f"/api/chat/{match_id}", json={"content": "Live!"}, headers=auth_headers(token_a))
+            for ws in (ws_a, ws_b):
+                event = ws.receive_json()
+                assert event["type"] == "message"
+                assert event["match_id"] == match_id
+                assert event["message"]["id"] == r.json()["id"]
+                assert event["message"]["content"] == "Live!"
+
+    def test_read_receipt_pushed(self, client):
+        token_a, token_b, match_id = create_match(client)
+        r = client.post(f"/api/chat/{match_id}", json={"content": "Read me"}, headers=auth_headers(token_a))
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+        with self._connect(client, token_a) as ws:
+            ws.receive_json()
+            client.put(f"/api/chat/{match_id}/read", headers=auth_headers(token_b))
+            assert ws.receive_json() == {
+                "type": "read", "match_id": match_id, "reader_id": b_id, "count": 1,
+                "last_read_message_id": r.json()["id"],
+            }
+
+    def test_subscribe_checks_membership(self, client):
+        token_a, token_b, match_id = create_match(client)
+        token_c = register_user(client, suffix="chwsc")
+        with self._connect(client, token_c) as ws:
+            assert match_id not in ws.receive_json()["match_ids"]
+            ws.send_json({"action": "subscribe", "match_id": match_id})
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json({"action": "dance"})
+            assert ws.receive_json()["type"] == "error"
+
+        with self._connect(client, token_a) as ws:
+            ws.receive_json()
+            ws.send_json({"action": "unsubscribe", "match_id": match_id})
+            assert ws.receive_json() == {"type": "unsubscribed", "match_id": match_id}
+            ws.send_json({"action": "subscribe", "match_id": match_id})
+            assert ws.receive_json() == {"type": "subscribed", "match_id": match_id}
+
+    def test_socket_holds_no_session_while_open(self, client, db_rollback):
+        token_a, _, match_id = create_match(client)
+        connection = db_rollback.connection()
+        open_sessions = []
+
+        def factory():
+            db = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+            open_sessions.append(db)
+            return db
+
+        app.dependency_overrides[get_session_factory] = lambda: factory
+        with self._connect(client, token_a) as ws:
+            ws.receive_json()
+            ws.send_json({"action": "subscribe", "match_id": match_id})
+            assert ws.receive_json()["type"] == "subscribed"
+            assert len(open_sessions) == 2
+            assert all(db.get_transaction() is None for db in open_sessions)
+
+    def test_slow_subscriber_told_to_resync(self):
+        async def overflow():
+            subscriber = Subscriber(maxsize=2)
+            for i in range(3):
+                subscriber.deliver({"n": i})
+            await asyncio.sleep(0)
+            return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+        assert asyncio.run(overflow()) == [{"type": "resync"}]
+
+
+class TestFanout:
+    """Two brokers sharing a fan-out medium stand in for two worker processes."""
+
+    def _cross_process_delivery(self, make_fanout):
+        async def run():
+            worker_a, worker_b = ChatBroker(make_fanout()), ChatBroker(make_fanout())
+            worker_a.start()
+            worker_b.start()
+            try:
+                local, remote = Subscriber(), Subscriber()
+                worker_a.subscribe(7, local)
+                worker_b.subscribe(7, remote)
+                worker_b.subscribe(8, remote)
+
+                worker_a.publish(7, {"type": "message", "n": 1})
+                worker_a.publish(9, {"type": "message", "n": 2})
+                received_local = await asyncio.wait_for(local.queue.get(), timeout=5)
+                received_remote = await asyncio.wait_for(remote.queue.get(), timeout=5)
+                # Nothing else arrives: not the unsubscribed topic, and no echo back to worker A
+                await asyncio.sleep(0.3)
+                return received_local, received_remote, local.queue.qsize(), remote.queue.qsize()
+            finally:
+                worker_a.stop()
+                worker_b.stop()
+
+        event = {"type": "message", "n": 1}
+        assert asyncio.run(run()) == (event, event, 0, 0)
+
+    def test_sqlite_backend(self, tmp_path):
+        path = str(tmp_path / "fanout.db")
+        self._cross_process_delivery(lambda: SQLiteFanout(path, poll_interval=0.01))
+
+    def test_redis_backend(self):
+        server = FakeRedis()
+        self._cross_process_delivery(lambda: RedisFanout(server))
+
+    def test_sqlite_listener_survives_a_failed_event(self, tmp_path):
+        path = str(tmp_path / "fanout.db")
+        sender, receiver = SQLiteFanout(path, poll_interval=0.01), SQLiteFanout(path, poll_interval=0.01)
+        received = []
+
+        def deliver(topic, event):
+            if event["n"] == 1:
+                raise RuntimeError("broker failed")
+            received.append(event)
+
+        receiver.start(deliver)
+        try:
+            sender.publish(7, {"n": 1})
+            sender.publish(7, {"n": 2})
+            deadline = time.monotonic() + 5
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert received == [{"n": 2}]
+            assert receiver._thread.is_alive()
+        finally:
+            receiver.stop()
+
+    def test_redis_listener_survives_a_dropped_connection(self):
+        server = FakeRedis()
+        sender, receiver = RedisFanout(server), RedisFanout(server)
+        received = []
+        receiver.start(lambda topic, event: received.append(event))
+        try:
+            pubsub = receiver._pubsub
+            get_message = pubsub.get_message
+            failures = [ConnectionError("connection lost")]
+
+            def flaky(**kwargs):
+                if failures:
+                    raise failures.pop()
+                return get_message(**kwargs)
+
+            pubsub.get_message = flaky
+            sender.publish(7, {"n": 1})
+            deadline = time.monotonic() + 5
+            while not received and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert received == [{"n": 1}]
+            assert not failures
+        finally:
+            receiver.stop()
+
+    def test_failed_fanout_publish_still_delivers_locally(self):
+        class Down(MemoryFanout):
+            def publish(self, topic, event):
+                raise ConnectionError("fan-out unavailable")
+
+        async def run():
+            broker = ChatBroker(Down())
+            local = Subscriber()
+            broker.subscribe(7, local)
+            errors = metrics.get_counter("chat_fanout.publish_errors")
+            assert broker.publish(7, {"n": 1}) == 1
+            assert metrics.get_counter("chat_fanout.publish_errors") == errors + 1
+            return await asyncio.wait_for(local.queue.get(), timeout=5)
+
+        assert asyncio.run(run()) == {"n": 1}
+
+    def test_send_succeeds_while_fanout_is_down(self, client, db_rollback, monkeypatch):
+        class Down(MemoryFanout):
+            def publish(self, topic, event):
+                raise ConnectionError("fan-out unavailable")
+
+        token_a, _, match_id = create_match(client)
+        monkeypatch.setattr(chat_broker.broker, "fanout", Down())
+        r = client.post(f"/api/chat/{match_id}", json={"content": "saved once"}, headers=auth_headers(token_a))
+        assert r.status_code == 200, r.text
+        assert db_rollback.query(Message).filter(Message.match_id == match_id).count() == 1
+
+    def test_broker_builds_its_fanout_on_start(self, monkeypatch):
+        built = []
+        monkeypatch.setattr(chat_broker, "create_fanout", lambda: built.append(MemoryFanout()) or built[-1])
+        broker = ChatBroker()
+        assert broker.fanout is None and not built
+        broker.start()
+        try:
+            assert broker.fanout is built[0]
+        finally:
+            broker.stop()
+
+    def test_memory_backend_stays_local(self):
+        async def run():
+            worker_a, worker_b = ChatBroker(MemoryFanout()), ChatBroker(MemoryFanout())
+            local, remote = Subscriber(), Subscriber()
+            worker_a.subscribe(7, local)
+            worker_b.subscribe(7, remote)
+            assert worker_a.publish(7, {"n": 1}) == 1
+            await asyncio.sleep(0)
+            return local.queue.qsize(), remote.queue.qsize()
+
+        assert asyncio.run(run()) == (1, 0)
@@ -0,0 +1,149 @@
+"""Tests for the compatibility scoring service."""
+import pytest
+
+from app.commands.backfill_profile_features import backfill
+from app.core import metrics
+from app.crud.features import intern_terms
+from app.crud.spotify import delete_music_profile, save_music_profile
+from app.models.music_profile import MusicProfile
+from app.models.user import User
+from app.services import compat_cache
+from app.services.compat_cache import get_compatibility, get_compatibility_many
+from app.services.compatibility import compute_compatibility, compute_compatibility_batch, profile_to_compat_input
+from app.services.features import unpack_ids
+from app.services.spotify import generate_mock_profile
+
+
+def _same(batch_result: dict, pair_result: dict):
+    assert batch_result["score"] == pair_result["score"]
+    assert batch_result["genre_overlap_pct"] == pair_result["genre_overlap_pct"]
+    assert batch_result["artist_overlap_pct"] == pair_result["artist_overlap_pct"]
+    assert sorted(batch_result["shared_artists"]) == sorted(pair_result["shared_artists"])
+    assert sorted(batch_result["shared_genres"]) == sorted(pair_result["shared_genres"])
+
+
+class TestBatchCompatibility:
+    def test_matches_pairwise_scores(self):
+        me = generate_mock_profile(1)
+        candidates = [generate_mock_profile(uid) for uid in range(2, 300)]
+        batch = compute_compatibility_batch(me, candidates)
+        assert len(batch) == len(candidates)
+        for i, candidate in enumerate(candidates):
+            _same(batch[i], compute_compatibility(me, candidate))
+            assert batch.scores[i] == batch[i]["score"]
+
+    def test_empty_profiles(self):
+        empty = {"top_artists": [], "top_genres": [], "listening_patterns": {}}
+        me = generate_mock_profile(7)
+        for profile, candidates in ((empty, [me, empty]), (me, [empty]), ({}, [{}])):
+            batch = compute_compatibility_batch(profile, candidates)
+            for result, candidate in zip(batch, candidates):
+                _same(result, compute_compatibility(profile, candidate))
+
+    def test_duplicate_entries_count_once(self):
+        me = generate_mock_profile(3)
+        dup = generate_mock_profile(4)
+        dup["top_artists"] = dup["top_artists"] * 2
+        dup["top_genres"] = dup["top_genres"] * 2
+        _same(compute_compatibility_batch(me, [dup])[0], compute_compatibility(me, dup))
+
+    def test_shared_lists_follow_user_order(self):
+        me = generate_mock_profile(11)
+        result = compute_compatibility_batch(me, [me])[0]
+        assert result["shared_artists"] == [a["name"] for a in me["top_artists"]]
+        assert result["shared_genres"] == [g["genre"] for g in me["top_genres"]]
+
+    def test_no_candidates(self):
+        batch = compute_compatibility_batch(generate_mock_profile(1), [])
+        assert len(batch) == 0
+        assert list(batch) == []
+        with pytest.raises(IndexError):
+            batch[0]
+
+
+class TestCompatibilityCache:
+    def _profiles(self, db, user_ids):
+        return [save_music_profile(db, uid, generate_mock_profile(uid)) for uid in user_ids]
+
+    def test_repeat_lookups_hit_cache(self, db_rollback):
+        me, *others = self._profiles(db_rollback, range(90001, 90011))
+        first = get_compatibility_many(db_rollback, me, others)
+
+        misses = metrics.get_counter("compat_cache.misses")
+        lru_hits = metrics.get_counter("compat_cache.lru_hits")
+        second = get_compatibility_many(db_rollback, me, others)
+        assert second == first
+        assert metrics.get_counter("compat_cache.misses") == misses
+        assert metrics.get_counter("compat_cache.lru_hits") == lru_hits + len(others)
+
+    def test_persisted_entries_survive_lru_loss(self, db_rollback):
+        me, other = self._profiles(db_rollback, (90021, 90022))
+        expected = get_compatibility(db_rollback, me, other)
+        compat_cache.clear()
+
+        db_hits = metrics.get_counter("compat_cache.db_hits")
+        # Lookup from the other side of the pair resolves to the same entry
+        assert get_compatibility(db_rollback, other, me)["score"] == expected["score"]
+        assert metrics.get_counter("compat_cache.db_hits") == db_hits + 1
+
+    def test_profile_resync_invalidates(self, db_rollback):
+        me, other = self._profiles(db_rollback, (90031, 90032))
+        get_compatibility(db_rollback, me, other)
+        version = me.profile_version
+
+        me = save_music_profile(db_rollback, 90031, generate_mock_profile(90033))
+        assert me.profile_version == version + 1
+
+        misses = metrics.get_counter("compat_cache.misses")
+        result = get_compatibility(db_rollback, me, other)
+        assert metrics.get_counter("compat_cache.misses") == misses + 1
+        assert result == compute_compatibility_batch(
+            generate_mock_profile(90033), [generate_mock_profile(90032)],
+        )[0]
+
+    def test_recreated_profile_never_reuses_a_version(self, db_rollback):
+        user = User(email="cv0@student.manchester.ac.uk", hashed_password="x", display_name="Again")
+        db_rollback.add(user)
+        db_rollback.flush()
+        save_music_profile(db_rollback, user.id, generate_mock_profile(90034))
+        version = save_music_profile(db_rollback, user.id, generate_mock_profile(90035)).profile_version
+
+        delete_music_profile(db_rollback, user.id)
+        recreated = save_music_profile(db_rollback, user.id, generate_mock_profile(90034))
+        # Another worker may still hold (user, version) keys in its LRU
+        assert recreated.profile_version > version
+
+
+class TestFeatureIds:
+    def test_saved_profiles_share_term_ids(self, db_rollback):
+        a = save_music_profile(db_rollback, 90041, generate_mock_profile(90041))
+        b = save_music_profile(db_rollback, 90042, generate_mock_profile(90042))
+        artist_ids = intern_terms(db_rollback, "artist", [x["spotify_id"] for x in a.top_artists])
+        assert unpack_ids(a.artist_ids).tolist() == list(dict.fromkeys(artist_ids))
+        shared = {x["spotify_id"] for x in a.top_artists} & {x["spotify_id"] for x in b.top_artists}
+        shared_ids = set(unpack_ids(a.artist_ids).tolist()) & set(unpack_ids(b.artist_ids).tolist())
+        assert len(shared_ids) == len(shared)
+
+    def test_id_path_matches_key_path(self, db_rollback):
+        me, *others = [
+            save_music_profile(db_rollback, uid, generate_mock_profile(uid)) for uid in range(90051, 90151)
+        ]
+        with_ids = compute_compatibility_batch(
+            profile_to_compat_input(me), [profile_to_compat_input(o) for o in others],
+        )
+        for i, other in enumerate(others):
+            _same(with_ids[i], compute_compatibility(profile_to_compat_input(me), profile_to_compat_input(other)))
+            assert with_ids[i]["shared_artists"] == compute_compatibility_batch(
+                {"top_artists": me.top_artists}, [{"top_artists": other.top_artists}],
+            )[0]["shared_artists"]
+
+    def test_backfill_fills_missing_blobs(self, db_rollback):
+        profile = save_music_profile(db_rollback, 90201, generate_mock_profile(90201))
+        expected = (profile.artist_ids, profile.genre_ids)
+        profile.artist_ids = profile.genre_ids = None
+        db_rollback.commit()
+
+        assert backfill(db_rollback) >= 1
+        db_rollback.refresh(profile)
+        assert (profile.artist_ids, profile.genre_ids) == expected
+        assert db_rollback.query(MusicProfile).filter(MusicProfile.artist_ids.is_(None)).count() == 0
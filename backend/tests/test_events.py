@@ -0,0 +1,133 @@
+"""Tests for the server-sent event stream."""
+import asyncio
+import json
+
+from app.api.deps import get_session_factory
+from app.api.routes import events as events_routes
+from app.main import app
+from app.services import events
+from app.services.chat_broker import broker
+
+from tests.conftest import TestingSessionLocal, auth_headers, register_user
+from tests.test_chat import create_match
+
+
+def _parse(frame: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+    return json.loads(fields["data"])
+
+
+async def _collect(gen, count: int, publish=None) -> list[str]:
+    """Read ``count`` frames after the opening retry line, calling ``publish`` once subscribed."""
+    assert (await gen.__anext__()).startswith("retry:")
+    if publish is not None:
+        publish()
+    frames = [await asyncio.wait_for(gen.__anext__(), 2) for _ in range(count)]
+    await gen.aclose()
+    return frames
+
+
+def _user_id(client, token) -> int:
+    return client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+
+
+def _events_since(user_id: int, marker: int) -> list[dict]:
+    return broker.history(events.user_topic(user_id), marker)
+
+
+class TestStream:
+    def test_live_events_and_heartbeat(self):
+        def publish():
+            events.publish_unread(70001, 5, 2)
+
+        frames = asyncio.run(_collect(events.stream(70001, heartbeat=0.05), 2, publish))
+        assert frames[0].startswith("id: ")
+        assert "event: unread" in frames[0]
+        assert _parse(frames[0])["count"] == 2
+        assert frames[1] == ": heartbeat\n\n"
+        assert broker.subscriber_count(events.user_topic(70001)) == 0
+
+    def test_resume_replays_missed_events(self):
+        first = events.publish_user_event(70002, {"type": "match", "match_id": 1, "user_id": 9})
+        events.publish_unread(70002, 1, 1)
+        events.publish_unread(70002, 1, 2)
+        frames = asyncio.run(_collect(events.stream(70002, str(first), heartbeat=5), 2))
+        assert [_parse(f)["count"] for f in frames] == [1, 2]
+
+    def test_unknown_last_event_id_asks_for_resync(self):
+        events.publish_unread(70003, 1, 1)
+        for last_event_id in ("1", "garbage"):
+            frames = asyncio.run(_collect(events.stream(70003, last_event_id, heartbeat=5), 1))
+            assert frames == ["event: resync\ndata: {\"type\":\"resync\"}\n\n"]
+
+
+class TestPublishers:
+    def test_message_and_read_publish_unread_counts(self, client):
+        token_a, token_b, match_id = create_match(client)
+        b_id = _user_id(client, token_b)
+        marker = events.publish_user_event(b_id, {"type": "marker"})
+
+        client.post(f"/api/chat/{match_id}", json={"content": "one"}, headers=auth_headers(token_a))
+        client.post(f"/api/chat/{match_id}", json={"content": "two"}, headers=auth_headers(token_a))
+        client.put(f"/api/chat/{match_id}/read", headers=auth_headers(token_b))
+        unread = [(e["match_id"], e["count"]) for e in _events_since(b_id, marker) if e["type"] == "unread"]
+        assert unread == [(match_id, 1), (match_id, 2), (match_id, 0)]
+
+    def test_match_published_to_both_users(self, client):
+        token_a = register_user(client, suffix="eva")
+        token_b = register_user(client, suffix="evb")
+        client.post("/api/spotify/sync", headers=auth_headers(token_a))
+        client.post("/api/spotify/sync", headers=auth_headers(token_b))
+        a_id, b_id = _user_id(client, token_a), _user_id(client, token_b)
+        markers = {uid: events.publish_user_event(uid, {"type": "marker"}) for uid in (a_id, b_id)}
+
+        r = client.post("/api/match/swipe", json={"target_user_id": b_id, "action": "like"},
+                        headers=auth_headers(token_a))
+        match_id = r.json()["match_id"]
+        for me, other in ((a_id, b_id), (b_id, a_id)):
+            event = _events_since(me, markers[me])[-1]
+            assert (event["type"], event["match_id"], event["user_id"]) == ("match", match_id, other)
+
+    def test_reaction_published_to_tune_owner(self, client):
+        owner = register_user(client, suffix="evowner")
+        fan = register_user(client, suffix="evfan")
+        owner_id = _user_id(client, owner)
+        tune_id = client.post("/api/posts", json={"song_name": "Song", "artist": "Artist"},
+                              headers=auth_headers(owner)).json()["id"]
+        marker = events.publish_user_event(owner_id, {"type": "marker"})
+
+        client.post(f"/api/posts/{tune_id}/react", json={"reaction_type": "like"}, headers=auth_headers(fan))
+        # Toggling the same reaction off is not announced
+        client.post(f"/api/posts/{tune_id}/react", json={"reaction_type": "like"}, headers=auth_headers(fan))
+        reactions = [e for e in _events_since(owner_id, marker) if e["type"] == "reaction"]
+        assert [(e["daily_tune_id"], e["user_id"], e["reaction_type"]) for e in reactions] == [
+            (tune_id, _user_id(client, fan), "like"),
+        ]
+
+
+class TestStreamRoute:
+    def test_invalid_token_rejected(self, client):
+        r = client.get("/api/events/stream", params={"token": "nope"})
+        assert r.status_code == 401
+
+    def test_open_stream_holds_no_session(self, client, db_rollback, monkeypatch):
+        token = register_user(client, suffix="ssesess")
+        user_id = _user_id(client, token)
+        connection = db_rollback.connection()
+        opened, seen = [], []
+
+        def factory():
+            db = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+            opened.append(db)
+            return db
+
+        async def fake_stream(stream_user_id, last_event_id=None):
+            # Runs while the response is streaming, after the route has returned
+            seen.append((stream_user_id, [db.get_transaction() is None for db in opened]))
+            yield "retry: 1000\n\n"
+
+        app.dependency_overrides[get_session_factory] = lambda: factory
+        monkeypatch.setattr(events_routes.events, "stream", fake_stream)
+        r = client.get("/api/events/stream", params={"token": token})
+        assert r.status_code == 200
+        assert seen == [(user_id, [True])]
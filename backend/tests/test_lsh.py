@@ -0,0 +1,159 @@
+"""Tests for the MinHash LSH candidate index."""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.config import settings
+from app.crud.spotify import delete_music_profile, get_spotify_tokens, save_music_profile, save_spotify_tokens
+from app.services import lsh
+from app.services.lsh import MinHashLSH
+from app.services.spotify import generate_mock_profile
+from tests.conftest import auth_headers, register_user
+from tests.test_match import add_candidates
+
+
+def _ids(*values):
+    return np.array(values, dtype=np.int32)
+
+
+class TestMinHashLSH:
+    def test_similar_sets_are_found_first(self):
+        index = MinHashLSH()
+        index.add(1, _ids(*range(0, 20)))
+        index.add(2, _ids(*range(2, 22)))
+        index.add(3, _ids(*range(500, 520)))
+        assert index.query(_ids(*range(1, 21)), limit=10)[:2] in ([1, 2], [2, 1])
+        assert 3 not in index.query(_ids(*range(1, 21)), limit=10)
+
+    def test_limit_and_exclude(self):
+        index = MinHashLSH()
+        for uid in range(1, 6):
+            index.add(uid, _ids(*range(0, 20)))
+        assert len(index.query(_ids(*range(0, 20)), limit=3)) == 3
+        assert 1 not in index.query(_ids(*range(0, 20)), limit=10, exclude=1)
+
+    def test_remove_and_replace(self):
+        index = MinHashLSH()
+        index.add(1, _ids(*range(0, 20)))
+        index.add(1, _ids(*range(100, 120)))
+        assert index.query(_ids(*range(0, 20)), limit=10) == []
+        assert index.query(_ids(*range(100, 120)), limit=10) == [1]
+        index.remove(1)
+        assert len(index) == 0
+        assert index.query(_ids(*range(100, 120)), limit=10) == []
+
+    def test_empty_sets_never_match(self):
+        index = MinHashLSH()
+        index.add(1, _ids())
+        index.add(2, _ids(1, 2, 3))
+        assert index.query(_ids(), limit=10) == []
+        assert index.query(_ids(1, 2, 3), limit=10) == [2]
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        index = MinHashLSH()
+        for uid in range(1, 30):
+            index.add(uid, _ids(*range(uid, uid + 15)), version=uid)
+        path = str(tmp_path / "index.npz")
+        index.save(path)
+
+        loaded = MinHashLSH.load(path)
+        assert loaded.versions() == index.versions()
+        probe = _ids(*range(10, 25))
+        assert loaded.query(probe, limit=5) == index.query(probe, limit=5)
+
+    def test_save_uses_a_per_process_temp_file(self, tmp_path):
+        path = str(tmp_path / "index.npz")
+        # A half-written temp file left by another worker is neither read nor clobbered
+        other = tmp_path / "index.npz.tmp"
+        other.write_bytes(b"partial")
+        index = MinHashLSH()
+        index.add(1, _ids(1, 2, 3), version=1)
+        index.save(path)
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["index.npz", "index.npz.tmp"]
+        assert other.read_bytes() == b"partial"
+        assert MinHashLSH.load(path).versions() == {1: 1}
+
+
+class TestProfileIndex:
+    def test_index_follows_profile_saves(self, db_rollback):
+        save_music_profile(db_rollback, 90301, generate_mock_profile(90301))
+        index = lsh.get_index(db_rollback)
+        assert 90301 in index
+
+        # Changes after the first load are applied incrementally
+        profile = save_music_profile(db_rollback, 90302, generate_mock_profile(90302))
+        assert index.versions()[90302] == profile.profile_version
+        profile = save_music_profile(db_rollback, 90302, generate_mock_profile(90303))
+        assert index.versions()[90302] == profile.profile_version
+
+        delete_music_profile(db_rollback, 90302)
+        assert 90302 not in index
+
+    def test_token_refresh_after_index_loaded(self, db_rollback):
+        profile = save_music_profile(db_rollback, 90321, generate_mock_profile(90321))
+        index = lsh.get_index(db_rollback)
+        expires = datetime.utcnow() + timedelta(hours=1)
+        save_spotify_tokens(db_rollback, 90321, "access-1", "refresh-1", expires)
+
+        token = save_spotify_tokens(db_rollback, 90321, "access-2", "refresh-2", expires)
+        assert token.access_token == "access-2"
+        assert get_spotify_tokens(db_rollback, 90321).refresh_token == "refresh-2"
+        assert index.versions()[90321] == profile.profile_version
+
+    def test_load_reconciles_stale_file(self, db_rollback, tmp_path, monkeypatch):
+        save_music_profile(db_rollback, 90311, generate_mock_profile(90311))
+        path = str(tmp_path / "index.npz")
+        stale = MinHashLSH()
+        stale.add(99999999, _ids(1, 2, 3), version=1)
+        stale.save(path)
+        monkeypatch.setattr(settings, "LSH_INDEX_PATH", path)
+
+        index = lsh.get_index(db_rollback)
+        assert 90311 in index
+        assert 99999999 not in index
+
+
+class TestFeedShortlist:
+    def test_feed_scores_only_the_shortlist(self, client, db_rollback, monkeypatch):
+        monkeypatch.setattr(settings, "MATCH_LSH_MIN_PROFILES", 1)
+        monkeypatch.setattr(settings, "MATCH_LSH_CANDIDATES", 5)
+        token = register_user(client, suffix="lsha")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        add_candidates(db_rollback, 20, "lsha")
+
+        r = client.get("/api/match/feed", headers=auth_headers(token))
+        assert r.status_code == 200
+        feed = r.json()
+        assert 0 < len(feed) <= 5
+        scores = [c["compatibility_score"] for c in feed]
+        assert scores == sorted(scores, reverse=True)
+
+    def test_swiped_shortlist_falls_back_to_full_pool(self, client, db_rollback, monkeypatch):
+        monkeypatch.setattr(settings, "MATCH_LSH_MIN_PROFILES", 1)
+        monkeypatch.setattr(settings, "MATCH_LSH_CANDIDATES", 5)
+        monkeypatch.setattr(settings, "MATCH_LSH_OVERFETCH", 1)
+        token = register_user(client, suffix="lshb")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        add_candidates(db_rollback, 20, "lshb")
+
+        first = client.get("/api/match/feed", headers=auth_headers(token)).json()
+        for candidate in first:
+            client.post("/api/match/swipe", json={"target_user_id": candidate["user_id"], "action": "pass"},
+                        headers=auth_headers(token))
+
+        feed = client.get("/api/match/feed", headers=auth_headers(token)).json()
+        assert feed
+        assert not {c["user_id"] for c in feed} & {c["user_id"] for c in first}
+
+    def test_filter_applies_before_the_shortlist_is_cut(self, client, db_rollback, monkeypatch):
+        monkeypatch.setattr(settings, "MATCH_LSH_MIN_PROFILES", 1)
+        monkeypatch.setattr(settings, "MATCH_LSH_CANDIDATES", 5)
+        token = register_user(client, suffix="lshc")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        add_candidates(db_rollback, 20, "lshc")
+        add_candidates(db_rollback, 3, "lshc-music", course="Music")
+
+        r = client.get("/api/match/feed?course=Music", headers=auth_headers(token))
+        assert r.status_code == 200
+        assert len(r.json()) >= 3
@@ -1,6 +1,67 @@
 """Tests for /api/match endpoints."""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
 import pytest
-from tests.conftest import auth_headers, register_user
+from sqlalchemy import event
+
+from app.core import metrics
+from app.core.config import settings
+from app.crud.feed_snapshot import claim_dirty, get_snapshot, mark_feeds_dirty
+from app.crud.match import create_match, get_candidates
+from app.crud.spotify import save_music_profile
+from app.models.feed_snapshot import FeedDirtyUser
+from app.models.match import Swipe
+from app.models.playlist import PlaylistMember, SharedPlaylist
+from app.models.user import User
+from app.services import compat_cache, lsh
+from app.services.feed_snapshots import rebuild_snapshot, run_once
+from app.services.spotify import generate_mock_profile
+from tests.conftest import auth_headers, engine, register_user
+
+
+@contextmanager
+def count_queries():
+    """Count SQL statements executed against the test engine inside the block."""
+    counter = {"n": 0}
+
+    def before_cursor_execute(*args):
+        counter["n"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def count_commits(session):
+    """Count commits issued on ``session`` inside the block."""
+    counter = {"n": 0}
+
+    def after_commit(_):
+        counter["n"] += 1
+
+    event.listen(session, "after_commit", after_commit)
+    try:
+        yield counter
+    finally:
+        event.remove(session, "after_commit", after_commit)
+
+
+def add_candidates(db, count, prefix, course=None):
+    """Insert users with synced mock profiles directly, skipping the signup flow."""
+    for i in range(count):
+        user = User(
+            email=f"{prefix}{i}@student.manchester.ac.uk",
+            hashed_password="x",
+            display_name=f"Candidate {prefix}{i}",
+            course=course,
+        )
+        db.add(user)
+        db.flush()
+        save_music_profile(db, user.id, generate_mock_profile(user.id))
 
 
 def setup_matched_users(client):
@@ -77,6 +138,200 @@ class TestMatchFeed:
         ids = [c["user_id"] for c in r.json()]
         assert me_id not in ids
 
+    def test_capped_pool_is_not_the_earliest_signups(self, db_rollback):
+        add_candidates(db_rollback, 12, "cap")
+        ids = sorted(
+            user.id for user in db_rollback.query(User).filter(User.email.like("cap%")).all()
+        )
+        viewers = ids[:4]
+
+        pools = []
+        for viewer in viewers:
+            pool = [user.id for user, _ in get_candidates(db_rollback, viewer, limit=3, user_ids=ids)]
+            assert len(pool) == 3
+            # The same viewer always gets the same pool, so paging stays consistent
+            assert pool == [user.id for user, _ in get_candidates(db_rollback, viewer, limit=3, user_ids=ids)]
+            pools.append(set(pool))
+
+        # Ordered by id, every one of these pools would sit inside ids[:4]
+        assert set().union(*pools) - set(viewers)
+
+
+class TestFeedPagination:
+    def _pages(self, client, token, **params):
+        pages, cursor = [], None
+        while True:
+            query = dict(params, **({"cursor": cursor} if cursor else {}))
+            r = client.get("/api/match/feed", params=query, headers=auth_headers(token))
+            assert r.status_code == 200
+            pages.append(r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                return pages
+
+    def test_pages_cover_feed_in_score_order(self, client, db_rollback):
+        token = register_user(client, suffix="pagea")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        add_candidates(db_rollback, 12, "pga")
+
+        full = client.get("/api/match/feed", headers=auth_headers(token)).json()
+        pages = self._pages(client, token, limit=4)
+        assert all(len(p) <= 4 for p in pages)
+
+        paged = [c for p in pages for c in p]
+        assert [c["user_id"] for c in paged] == [c["user_id"] for c in full]
+        keys = [(-c["compatibility_score"], c["user_id"]) for c in paged]
+        assert keys == sorted(keys)
+
+    def test_filters_apply_across_pages(self, client, db_rollback):
+        token = register_user(client, suffix="pageb")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        add_candidates(db_rollback, 5, "pgb", course="Underwater Basket Weaving")
+
+        pages = self._pages(client, token, limit=2, course="Underwater Basket Weaving")
+        assert [len(p) for p in pages] == [2, 2, 1]
+
+    def test_invalid_cursor_rejected(self, client):
+        token = register_user(client, suffix="pagec")
+        r = client.get("/api/match/feed", params={"cursor": "not-a-cursor"}, headers=auth_headers(token))
+        assert r.status_code == 400
+
+
+class TestFeedQueryCount:
+    def _feed_queries(self, client, token):
+        # Start from cold in-process state so every candidate goes through the
+        # persistent cache lookup and the pairs it misses get scored and stored
+        compat_cache.clear()
+        lsh.reset()
+        with count_queries() as counter:
+            r = client.get("/api/match/feed", headers=auth_headers(token))
+        assert r.status_code == 200
+        return counter["n"], len(r.json())
+
+    def test_constant_queries_regardless_of_candidate_count(self, client, db_rollback):
+        token = register_user(client, suffix="qcount")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+
+        add_candidates(db_rollback, 3, "qca")
+        few_queries, few = self._feed_queries(client, token)
+
+        add_candidates(db_rollback, 25, "qcb")
+        many_queries, many = self._feed_queries(client, token)
+
+        assert many == few + 25
+        assert many_queries == few_queries
+
+
+class TestFeedSnapshots:
+    def _me(self, client, suffix):
+        token = register_user(client, suffix=suffix)
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        return token, client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+
+    def _feed_ids(self, client, token):
+        r = client.get("/api/match/feed", headers=auth_headers(token))
+        assert r.status_code == 200
+        return [c["user_id"] for c in r.json()]
+
+    def test_profile_sync_queues_rebuild(self, client, db_rollback):
+        _, me = self._me(client, "snapa")
+        assert db_rollback.query(FeedDirtyUser).filter(FeedDirtyUser.user_id == me).count() == 1
+        assert get_snapshot(db_rollback, me) is None
+
+        run_once(db_rollback, batch_size=1000)
+        assert db_rollback.query(FeedDirtyUser).count() == 0
+        assert get_snapshot(db_rollback, me) is not None
+
+    def test_feed_served_from_snapshot(self, client, db_rollback):
+        token, me = self._me(client, "snapb")
+        add_candidates(db_rollback, 8, "snb")
+        live = self._feed_ids(client, token)
+
+        rebuild_snapshot(db_rollback, me)
+        db_rollback.commit()
+        served = metrics.get_counter("feed_snapshots.served")
+        assert self._feed_ids(client, token) == live
+        assert metrics.get_counter("feed_snapshots.served") == served + 1
+
+    def test_resynced_profile_bypasses_snapshot(self, client, db_rollback):
+        token, me = self._me(client, "snapg")
+        add_candidates(db_rollback, 8, "sng")
+        rebuild_snapshot(db_rollback, me)
+        save_music_profile(db_rollback, me, generate_mock_profile(me + 1))
+        db_rollback.commit()
+
+        served = metrics.get_counter("feed_snapshots.served")
+        stale = metrics.get_counter("feed_snapshots.stale")
+        r = client.get("/api/match/feed", headers=auth_headers(token))
+        assert r.status_code == 200
+        assert metrics.get_counter("feed_snapshots.served") == served
+        assert metrics.get_counter("feed_snapshots.stale") == stale + 1
+        scores = [c["compatibility_score"] for c in r.json()]
+        assert scores == sorted(scores, reverse=True)
+        assert db_rollback.query(FeedDirtyUser).filter(FeedDirtyUser.user_id == me).count() == 1
+
+    def test_swiped_users_dropped_from_snapshot(self, client, db_rollback):
+        token, me = self._me(client, "snapc")
+        add_candidates(db_rollback, 6, "snc")
+        rebuild_snapshot(db_rollback, me)
+        db_rollback.commit()
+
+        first, *rest = self._feed_ids(client, token)
+        r = client.post("/api/match/swipe", json={"target_user_id": first, "action": "pass"},
+                        headers=auth_headers(token))
+        assert r.status_code == 200
+        assert self._feed_ids(client, token) == rest
+
+    def test_similar_newcomer_queues_rebuild(self, client, db_rollback):
+        token, me = self._me(client, "snapd")
+        run_once(db_rollback, batch_size=1000)
+        # A newcomer with the same taste is one of my LSH neighbours
+        newcomer = User(email="snd0@student.manchester.ac.uk", hashed_password="x", display_name="Twin")
+        db_rollback.add(newcomer)
+        db_rollback.flush()
+        save_music_profile(db_rollback, newcomer.id, generate_mock_profile(me))
+        assert newcomer.id not in get_snapshot(db_rollback, me).candidate_ids
+        assert db_rollback.query(FeedDirtyUser).filter(FeedDirtyUser.user_id == me).count() == 1
+
+        run_once(db_rollback, batch_size=1000)
+        db_rollback.expire_all()
+        assert newcomer.id in get_snapshot(db_rollback, me).candidate_ids
+
+    def test_unrelated_sync_does_not_queue_everyone(self, client, db_rollback):
+        token, me = self._me(client, "snapf")
+        run_once(db_rollback, batch_size=1000)
+        loner = User(email="snf0@student.manchester.ac.uk", hashed_password="x", display_name="Loner")
+        db_rollback.add(loner)
+        db_rollback.flush()
+        save_music_profile(db_rollback, loner.id, {
+            **generate_mock_profile(loner.id), "top_artists": [], "top_genres": [],
+        })
+        assert [d.user_id for d in db_rollback.query(FeedDirtyUser)] == [loner.id]
+
+    def test_claimed_users_are_not_claimed_twice(self, client, db_rollback):
+        mark_feeds_dirty(db_rollback, [me for me in range(95001, 95006)])
+        first = claim_dirty(db_rollback, 3)
+        second = claim_dirty(db_rollback, 3)
+        assert len(first) == 3
+        assert sorted(first + second) == list(range(95001, 95006))
+
+    def test_swiped_through_full_snapshot_falls_back_to_live(self, client, db_rollback, monkeypatch):
+        monkeypatch.setattr(settings, "FEED_SNAPSHOT_SIZE", 3)
+        token, me = self._me(client, "snape")
+        add_candidates(db_rollback, 6, "sne")
+        rebuild_snapshot(db_rollback, me)
+        run_once(db_rollback, batch_size=1000)
+        db_rollback.commit()
+        snapshot_ids = list(get_snapshot(db_rollback, me).candidate_ids)
+        for target in snapshot_ids:
+            client.post("/api/match/swipe", json={"target_user_id": target, "action": "pass"},
+                        headers=auth_headers(token))
+
+        remaining = self._feed_ids(client, token)
+        assert remaining
+        assert not set(remaining) & set(snapshot_ids)
+        assert db_rollback.query(FeedDirtyUser).filter(FeedDirtyUser.user_id == me).count() == 1
+
 
 class TestSwipe:
     def test_like_creates_match_in_mock_mode(self, client):
@@ -134,6 +389,57 @@ class TestSwipe:
         # (already validated by match_id being not None)
         assert match_id is not None
 
+    def test_match_flow_commits_once(self, client, db_rollback):
+        token_a = register_user(client, suffix="onecommita")
+        token_b = register_user(client, suffix="onecommitb")
+        client.post("/api/spotify/sync", headers=auth_headers(token_a))
+        client.post("/api/spotify/sync", headers=auth_headers(token_b))
+        b_id = client.get("/api/auth/me", headers=auth_headers(token_b)).json()["id"]
+
+        with count_commits(db_rollback) as counter:
+            r = client.post("/api/match/swipe",
+                            json={"target_user_id": b_id, "action": "like"},
+                            headers=auth_headers(token_a))
+        assert r.json()["is_match"] is True
+        assert counter["n"] == 1
+
+        playlist = db_rollback.query(SharedPlaylist).filter(SharedPlaylist.match_id == r.json()["match_id"]).one()
+        members = db_rollback.query(PlaylistMember).filter(PlaylistMember.playlist_id == playlist.id).all()
+        assert {m.user_id for m in members} == {b_id, playlist.created_by}
+
+
+class TestSwipeBatch:
+    def test_applies_each_swipe_in_one_commit(self, client, db_rollback):
+        token = register_user(client, suffix="batcha")
+        client.post("/api/spotify/sync", headers=auth_headers(token))
+        me = client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+        add_candidates(db_rollback, 3, "bta")
+        ids = [u.id for u in db_rollback.query(User).filter(User.email.like("bta%")).order_by(User.id)]
+
+        swipes = [
+            {"target_user_id": ids[0], "action": "like"},
+            {"target_user_id": ids[1], "action": "pass"},
+            {"target_user_id": ids[1], "action": "like"},
+            {"target_user_id": me, "action": "like"},
+            {"target_user_id": ids[2], "action": "maybe"},
+        ]
+        with count_commits(db_rollback) as counter:
+            r = client.post("/api/match/swipes", json={"swipes": swipes}, headers=auth_headers(token))
+        assert r.status_code == 200
+        assert counter["n"] == 1
+
+        results = r.json()["results"]
+        assert [res["status_code"] for res in results] == [200, 200, 409, 400, 400]
+        assert results[0]["is_match"] is True and results[0]["match_id"] is not None
+        assert results[1]["is_match"] is False
+        assert db_rollback.query(Swipe).filter(Swipe.user_id == me, Swipe.target_user_id.in_(ids)).count() == 2
+
+    def test_batch_size_limits(self, client):
+        token = register_user(client, suffix="batchb")
+        assert client.post("/api/match/swipes", json={"swipes": []}, headers=auth_headers(token)).status_code == 422
+        too_many = [{"target_user_id": i, "action": "pass"} for i in range(101)]
+        assert client.post("/api/match/swipes", json={"swipes": too_many}, headers=auth_headers(token)).status_code == 422
+
 
 class TestListMatches:
     def test_returns_match_list(self, client):
@@ -171,6 +477,60 @@ class TestListMatches:
         assert r.status_code in (401, 403)
 
 
+class TestMatchesPagination:
+    def _setup(self, client, db, suffix, count):
+        token = register_user(client, suffix=suffix)
+        me = client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+        add_candidates(db, count, suffix)
+        others = db.query(User).filter(User.email.like(f"{suffix}%@%")).order_by(User.id).all()
+        tied = datetime(2030, 1, 1)
+        for i, other in enumerate(others):
+            # Alternate sides of the pair, and give several matches the same timestamp
+            pair = (me, other.id) if i % 2 else (other.id, me)
+            match = create_match(db, *pair, 50, {}, commit=False)
+            match.created_at = tied if i < 4 else tied + timedelta(minutes=i)
+        db.commit()
+        return token
+
+    def _all_pages(self, client, token, limit):
+        pages, cursor = [], None
+        while True:
+            params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+            r = client.get("/api/match/matches", params=params, headers=auth_headers(token))
+            assert r.status_code == 200
+            pages.append(r.json())
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                return pages
+
+    def test_pages_cover_all_matches_newest_first(self, client, db_rollback):
+        token = self._setup(client, db_rollback, "mpa", 7)
+        full = client.get("/api/match/matches", params={"limit": 100}, headers=auth_headers(token)).json()
+        pages = self._all_pages(client, token, limit=3)
+        assert all(len(p) <= 3 for p in pages)
+
+        paged = [m for p in pages for m in p]
+        assert [m["id"] for m in paged] == [m["id"] for m in full]
+        keys = [(m["created_at"], m["id"]) for m in paged]
+        assert keys == sorted(keys, reverse=True)
+        assert len({m["other_user"]["id"] for m in paged}) == len(paged)
+
+    def test_constant_queries_per_page(self, client, db_rollback):
+        token = self._setup(client, db_rollback, "mpb", 12)
+        query_counts = []
+        for limit in (2, 10):
+            with count_queries() as counter:
+                r = client.get("/api/match/matches", params={"limit": limit}, headers=auth_headers(token))
+            assert len(r.json()) == limit
+            query_counts.append(counter["n"])
+        assert query_counts[0] == query_counts[1]
+
+    def test_invalid_cursor_rejected(self, client):
+        token = register_user(client, suffix="mpc")
+        r = client.get("/api/match/matches", params={"cursor": "bogus"}, headers=auth_headers(token))
+        assert r.status_code == 400
+
+
 class TestMatchDetail:
     def test_get_match_detail(self, client):
         token_a, token_b, b_id, match_id = setup_matched_users(client)
@@ -0,0 +1,467 @@
+"""Tests for shared playlist endpoints and track storage."""
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.api.routes import playlist as playlist_routes
+from app.core.database import Base, upgrade_schema
+from app.crud.playlist import (
+    add_weekly_recap_unique_index,
+    generate_weekly_recaps,
+    get_playlist_counts,
+    get_tracks,
+    load_members,
+    migrate_json_tracks,
+    rebuild_contributions,
+    week_start_of,
+)
+from app.models.playlist import PlaylistContribution, PlaylistMember, PlaylistTrack, SharedPlaylist, WeeklyRecap
+from app.models.user import User
+from app.services.weekly_recaps import WeeklyRecapScheduler, last_completed_week
+
+from tests.conftest import TestingSessionLocal
+
+from tests.conftest import auth_headers, register_user
+
+
+def _track(spotify_id: str, name: str = "Song") -> dict:
+    return {"track_name": name, "artist": "Artist", "spotify_id": spotify_id}
+
+
+@contextmanager
+def count_queries(session):
+    """Count SQL statements run on ``session``'s connection inside the block.
+
+    Listens on the test connection itself: engine-level listeners added
+    after it was opened would not see its statements.
+    """
+    counter = {"n": 0}
+    connection = session.connection()
+
+    def before_cursor_execute(*args):
+        counter["n"] += 1
+
+    event.listen(connection, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(connection, "before_cursor_execute", before_cursor_execute)
+
+
+def create_playlist(client, token, name="Group Mix") -> int:
+    r = client.post("/api/playlist", json={"name": name}, headers=auth_headers(token))
+    assert r.status_code == 200
+    return r.json()["id"]
+
+
+class TestPlaylistTracks:
+    def test_add_tracks_in_order(self, client):
+        token = register_user(client, suffix="pltrk1")
+        playlist_id = create_playlist(client, token)
+        for sid in ("t1", "t2", "t3"):
+            r = client.post(f"/api/playlist/{playlist_id}/tracks", json=_track(sid), headers=auth_headers(token))
+            assert r.status_code == 200
+        data = client.get(f"/api/playlist/{playlist_id}", headers=auth_headers(token)).json()
+        assert [t["spotify_id"] for t in data["tracks"]] == ["t1", "t2", "t3"]
+        assert data["track_count"] == 3
+        me = client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+        assert all(t["added_by"] == me and t["added_at"] for t in data["tracks"])
+
+    def test_duplicate_rejected(self, client, db_rollback):
+        token = register_user(client, suffix="pltrk2")
+        playlist_id = create_playlist(client, token)
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("dup"), headers=auth_headers(token))
+        r = client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("dup"), headers=auth_headers(token))
+        assert r.status_code == 409
+        assert db_rollback.query(PlaylistTrack).filter(PlaylistTrack.playlist_id == playlist_id).count() == 1
+
+    def test_remove_track(self, client):
+        token = register_user(client, suffix="pltrk3")
+        playlist_id = create_playlist(client, token)
+        for sid in ("a", "b", "c"):
+            client.post(f"/api/playlist/{playlist_id}/tracks", json=_track(sid), headers=auth_headers(token))
+        r = client.delete(f"/api/playlist/{playlist_id}/tracks/b", headers=auth_headers(token))
+        assert r.status_code == 200
+        tracks = client.get(f"/api/playlist/{playlist_id}", headers=auth_headers(token)).json()["tracks"]
+        assert [t["spotify_id"] for t in tracks] == ["a", "c"]
+
+        # Re-adding a removed track appends it
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("b"), headers=auth_headers(token))
+        tracks = client.get(f"/api/playlist/{playlist_id}", headers=auth_headers(token)).json()["tracks"]
+        assert [t["spotify_id"] for t in tracks] == ["a", "c", "b"]
+
+    def test_list_reports_track_counts(self, client):
+        token = register_user(client, suffix="pltrk4")
+        full = create_playlist(client, token, "Full")
+        empty = create_playlist(client, token, "Empty")
+        client.post(f"/api/playlist/{full}/tracks", json=_track("x"), headers=auth_headers(token))
+        counts = {p["id"]: p["track_count"] for p in client.get("/api/playlist", headers=auth_headers(token)).json()}
+        assert counts[full] == 1
+        assert counts[empty] == 0
+
+
+class TestTrackPagination:
+    def test_cursor_walks_every_track(self, client):
+        token = register_user(client, suffix="plpage")
+        playlist_id = create_playlist(client, token)
+        for i in range(5):
+            client.post(f"/api/playlist/{playlist_id}/tracks", json=_track(f"p{i}"), headers=auth_headers(token))
+
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            r = client.get(f"/api/playlist/{playlist_id}", params=params, headers=auth_headers(token))
+            assert r.json()["track_count"] == 5
+            seen += [t["spotify_id"] for t in r.json()["tracks"]]
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        assert seen == [f"p{i}" for i in range(5)]
+
+    def test_invalid_cursor_rejected(self, client):
+        token = register_user(client, suffix="plbadcur")
+        playlist_id = create_playlist(client, token)
+        r = client.get(f"/api/playlist/{playlist_id}", params={"cursor": "nope"}, headers=auth_headers(token))
+        assert r.status_code == 400
+
+
+class TestTrackDeltas:
+    def test_add_and_remove_return_deltas(self, client):
+        token = register_user(client, suffix="pldelta")
+        playlist_id = create_playlist(client, token)
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("d1"), headers=auth_headers(token))
+        r = client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("d2", "Second"), headers=auth_headers(token))
+        delta = r.json()
+        assert delta["added"]["spotify_id"] == "d2"
+        assert delta["added"]["track_name"] == "Second"
+        assert delta["removed"] is None
+        assert delta["track_count"] == 2
+        assert "tracks" not in delta
+
+        r = client.delete(f"/api/playlist/{playlist_id}/tracks/d1", headers=auth_headers(token))
+        assert r.json() == {"added": None, "removed": "d1", "track_count": 1}
+        r = client.delete(f"/api/playlist/{playlist_id}/tracks/missing", headers=auth_headers(token))
+        assert r.json() == {"added": None, "removed": None, "track_count": 1}
+
+    def test_member_changes_return_members(self, client):
+        owner = register_user(client, suffix="plmemown")
+        friend = register_user(client, suffix="plmemfr")
+        friend_id = client.get("/api/auth/me", headers=auth_headers(friend)).json()["id"]
+        playlist_id = create_playlist(client, owner)
+
+        r = client.post(f"/api/playlist/{playlist_id}/members", json={"user_id": friend_id},
+                        headers=auth_headers(owner))
+        assert friend_id in {m["user_id"] for m in r.json()}
+        r = client.delete(f"/api/playlist/{playlist_id}/members/{friend_id}", headers=auth_headers(owner))
+        assert friend_id not in {m["user_id"] for m in r.json()}
+
+
+class TestBatchAddTracks:
+    def test_adds_in_order_and_reports_skipped(self, client):
+        token = register_user(client, suffix="plbatch")
+        playlist_id = create_playlist(client, token)
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("old"), headers=auth_headers(token))
+
+        batch = [_track("b1"), _track("old"), _track("b2"), _track("b1")]
+        r = client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": batch},
+                        headers=auth_headers(token))
+        assert r.status_code == 200
+        data = r.json()
+        assert [t["spotify_id"] for t in data["added"]] == ["b1", "b2"]
+        assert data["skipped"] == ["old", "b1"]
+        assert data["track_count"] == 3
+
+        tracks = client.get(f"/api/playlist/{playlist_id}", headers=auth_headers(token)).json()["tracks"]
+        assert [t["spotify_id"] for t in tracks] == ["old", "b1", "b2"]
+
+    def test_all_duplicates_adds_nothing(self, client):
+        token = register_user(client, suffix="plbatchdup")
+        playlist_id = create_playlist(client, token)
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("x"), headers=auth_headers(token))
+        r = client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": [_track("x")]},
+                        headers=auth_headers(token))
+        assert r.json() == {"added": [], "skipped": ["x"], "track_count": 1}
+
+    def test_batch_size_limited(self, client):
+        token = register_user(client, suffix="plbatchbig")
+        playlist_id = create_playlist(client, token)
+        for tracks in ([], [_track(f"s{i}") for i in range(501)]):
+            r = client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": tracks},
+                            headers=auth_headers(token))
+            assert r.status_code == 422
+
+    def test_requires_membership(self, client):
+        owner = register_user(client, suffix="plbatchown")
+        stranger = register_user(client, suffix="plbatchstr")
+        playlist_id = create_playlist(client, owner)
+        r = client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": [_track("z")]},
+                        headers=auth_headers(stranger))
+        assert r.status_code == 403
+
+
+class TestTrackExport:
+    def test_streams_ndjson_in_batches(self, client, monkeypatch):
+        monkeypatch.setattr(playlist_routes, "EXPORT_BATCH_SIZE", 2)
+        token = register_user(client, suffix="plexport")
+        playlist_id = create_playlist(client, token)
+        for i in range(5):
+            client.post(f"/api/playlist/{playlist_id}/tracks", json=_track(f"e{i}"), headers=auth_headers(token))
+
+        r = client.get(f"/api/playlist/{playlist_id}/tracks/export", headers=auth_headers(token))
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in r.text.splitlines()]
+        assert [row["spotify_id"] for row in rows] == [f"e{i}" for i in range(5)]
+
+    def test_requires_membership(self, client):
+        owner = register_user(client, suffix="plexpown")
+        stranger = register_user(client, suffix="plexpstr")
+        playlist_id = create_playlist(client, owner)
+        r = client.get(f"/api/playlist/{playlist_id}/tracks/export", headers=auth_headers(stranger))
+        assert r.status_code == 403
+
+
+class TestPlaylistQueryCount:
+    def _queries(self, client, db, token, path) -> int:
+        """Statements run by ``path``, less the ones spent authenticating the request."""
+        with count_queries(db) as auth:
+            client.get("/api/auth/me", headers=auth_headers(token))
+        with count_queries(db) as counter:
+            r = client.get(path, headers=auth_headers(token))
+        assert r.status_code == 200
+        return counter["n"] - auth["n"]
+
+    def test_list_runs_two_queries(self, client, db_rollback):
+        token = register_user(client, suffix="plqlist")
+        ids = [create_playlist(client, token, "First")]
+        assert self._queries(client, db_rollback, token, "/api/playlist") == 2
+
+        friends = [register_user(client, suffix=f"plqfr{i}") for i in range(3)]
+        friend_ids = [client.get("/api/auth/me", headers=auth_headers(f)).json()["id"] for f in friends]
+        created = list(ids)
+        for i in range(4):
+            playlist_id = create_playlist(client, token, f"More {i}")
+            created.append(playlist_id)
+            client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": [_track("q1"), _track("q2")]},
+                        headers=auth_headers(token))
+            for friend_id in friend_ids:
+                client.post(f"/api/playlist/{playlist_id}/members", json={"user_id": friend_id},
+                            headers=auth_headers(token))
+        assert self._queries(client, db_rollback, token, "/api/playlist") == 2
+        listed = client.get("/api/playlist", headers=auth_headers(token)).json()
+        # Demo users may have matched the new accounts, so only look at these playlists
+        assert sorted((p["member_count"], p["track_count"]) for p in listed if p["id"] in created) == (
+            [(1, 0)] + [(4, 2)] * 4
+        )
+
+    def test_detail_constant_in_members(self, client, db_rollback):
+        token = register_user(client, suffix="plqdet")
+        playlist_id = create_playlist(client, token)
+        few = self._queries(client, db_rollback, token, f"/api/playlist/{playlist_id}")
+        for i in range(4):
+            friend = register_user(client, suffix=f"plqdetfr{i}")
+            friend_id = client.get("/api/auth/me", headers=auth_headers(friend)).json()["id"]
+            client.post(f"/api/playlist/{playlist_id}/members", json={"user_id": friend_id},
+                        headers=auth_headers(token))
+        assert self._queries(client, db_rollback, token, f"/api/playlist/{playlist_id}") == few
+
+    def test_loaders_cover_many_playlists(self, client, db_rollback):
+        token = register_user(client, suffix="plqload")
+        ids = [create_playlist(client, token, f"P{i}") for i in range(3)]
+        client.post(f"/api/playlist/{ids[0]}/tracks", json=_track("l1"), headers=auth_headers(token))
+        with count_queries(db_rollback) as counter:
+            members = load_members(db_rollback, ids)
+            counts = get_playlist_counts(db_rollback, ids)
+        assert counter["n"] == 2
+        assert all(len(members[i]) == 1 and members[i][0][1].display_name for i in ids)
+        assert counts == {ids[0]: (1, 1), ids[1]: (1, 0), ids[2]: (1, 0)}
+
+
+class TestWeeklyRecaps:
+    def _contributions(self, db, playlist_id) -> dict[int, int]:
+        rows = db.query(PlaylistContribution).filter(PlaylistContribution.playlist_id == playlist_id)
+        return {row.user_id: row.count for row in rows if row.week_start == week_start_of(datetime.utcnow())}
+
+    def _setup(self, client, suffix):
+        owner = register_user(client, suffix=f"{suffix}own")
+        friend = register_user(client, suffix=f"{suffix}fr")
+        ids = [client.get("/api/auth/me", headers=auth_headers(t)).json()["id"] for t in (owner, friend)]
+        playlist_id = create_playlist(client, owner)
+        client.post(f"/api/playlist/{playlist_id}/members", json={"user_id": ids[1]}, headers=auth_headers(owner))
+        return owner, friend, ids, playlist_id
+
+    def test_contributions_maintained_incrementally(self, client, db_rollback):
+        owner, friend, (owner_id, friend_id), playlist_id = self._setup(client, "rcinc")
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("c1"), headers=auth_headers(owner))
+        client.post(f"/api/playlist/{playlist_id}/tracks:batch", json={"tracks": [_track("c2"), _track("c3")]},
+                    headers=auth_headers(friend))
+        assert self._contributions(db_rollback, playlist_id) == {owner_id: 1, friend_id: 2}
+
+        client.delete(f"/api/playlist/{playlist_id}/tracks/c2", headers=auth_headers(owner))
+        assert self._contributions(db_rollback, playlist_id) == {owner_id: 1, friend_id: 1}
+
+        # A full recount agrees with the running counters
+        rebuild_contributions(db_rollback)
+        assert self._contributions(db_rollback, playlist_id) == {owner_id: 1, friend_id: 1}
+
+    def test_endpoint_only_reads(self, client, db_rollback):
+        owner, _, _, playlist_id = self._setup(client, "rcread")
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("r1"), headers=auth_headers(owner))
+        r = client.get(f"/api/playlist/{playlist_id}/recap", headers=auth_headers(owner))
+        assert r.status_code == 200
+        assert r.json() is None
+        assert db_rollback.query(WeeklyRecap).filter(WeeklyRecap.playlist_id == playlist_id).count() == 0
+
+    def test_batch_pass_writes_each_recap_once(self, client, db_rollback):
+        owner, friend, (owner_id, friend_id), playlist_id = self._setup(client, "rcbatch")
+        other_id = create_playlist(client, owner, "Quiet")
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("old", "Old"), headers=auth_headers(owner))
+        # Backdate one track into an earlier week
+        db_rollback.query(PlaylistTrack).filter(PlaylistTrack.spotify_id == "old").update(
+            {"added_at": datetime.utcnow() - timedelta(days=14)},
+        )
+        rebuild_contributions(db_rollback)
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("n1", "New"), headers=auth_headers(friend))
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("n2", "Newer"), headers=auth_headers(friend))
+        client.post(f"/api/playlist/{playlist_id}/tracks", json=_track("n3", "Newest"), headers=auth_headers(owner))
+
+        week = week_start_of(datetime.utcnow())
+        assert generate_weekly_recaps(db_rollback, week) >= 2
+        assert generate_weekly_recaps(db_rollback, week) == 0
+
+        recap = client.get(f"/api/playlist/{playlist_id}/recap", headers=auth_headers(owner)).json()
+        assert recap["week_start"] == week.isoformat()
+        assert recap["recap_data"] == {
+            "tracks_added": 3,
+            "top_contributor": friend_id,
+            "total_tracks": 4,
+            "week_tracks": [
+                {"track_name": "New", "artist": "Artist"},
+                {"track_name": "Newer", "artist": "Artist"},
+                {"track_name": "Newest", "artist": "Artist"},
+            ],
+        }
+        quiet = client.get(f"/api/playlist/{other_id}/recap", headers=auth_headers(owner)).json()
+        assert quiet["recap_data"]["tracks_added"] == 0
+        assert quiet["recap_data"]["top_contributor"] is None
+
+    def test_one_recap_per_playlist_week(self, client, db_rollback):
+        token = register_user(client, suffix="rcuniq")
+        playlist_id = create_playlist(client, token)
+        week = week_start_of(datetime.utcnow())
+        db_rollback.add(WeeklyRecap(playlist_id=playlist_id, week_start=week, recap_data={}))
+        db_rollback.flush()
+        with pytest.raises(IntegrityError), db_rollback.begin_nested():
+            db_rollback.add(WeeklyRecap(playlist_id=playlist_id, week_start=week, recap_data={}))
+            db_rollback.flush()
+
+    def test_unique_index_added_to_old_recap_tables(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE weekly_recaps (id INTEGER PRIMARY KEY, playlist_id INTEGER NOT NULL, "
+                "week_start DATE NOT NULL, recap_data JSON, created_at DATETIME)"
+            ))
+            conn.execute(text(
+                "INSERT INTO weekly_recaps (id, playlist_id, week_start) VALUES "
+                "(1, 7, '2026-03-02'), (2, 7, '2026-03-02'), (3, 7, '2026-03-09')"
+            ))
+
+        # Startup upgrades stay additive: nothing is deleted or made unique there
+        upgrade_schema(engine)
+        assert not any(i["unique"] for i in inspect(engine).get_indexes("weekly_recaps"))
+
+        with Session(engine) as db:
+            assert add_weekly_recap_unique_index(db) == 1
+            assert add_weekly_recap_unique_index(db) == 0
+            db.commit()
+            assert [row.id for row in db.execute(text("SELECT id FROM weekly_recaps ORDER BY id"))] == [1, 3]
+        indexes = {i["name"]: i for i in inspect(engine).get_indexes("weekly_recaps")}
+        assert indexes["uq_weekly_recap"]["unique"]
+        engine.dispose()
+
+    def test_scheduler_runs_once_per_week_boundary(self, client, db_rollback):
+        token = register_user(client, suffix="rcsched")
+        playlist_id = create_playlist(client, token)
+        connection = db_rollback.connection()
+        now = [datetime(2026, 3, 4, 12, 0)]
+        scheduler = WeeklyRecapScheduler(
+            lambda: TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint"),
+            clock=lambda: now[0],
+        )
+
+        def recap_weeks():
+            rows = db_rollback.query(WeeklyRecap.week_start).filter(WeeklyRecap.playlist_id == playlist_id)
+            return sorted(week for week, in rows)
+
+        assert scheduler.run_due() >= 1
+        assert scheduler.run_due() == 0
+        assert recap_weeks() == [last_completed_week(now[0])]
+
+        now[0] += timedelta(days=7)
+        assert scheduler.run_due() >= 1
+        assert recap_weeks() == [last_completed_week(now[0]) - timedelta(days=7), last_completed_week(now[0])]
+        latest = client.get(f"/api/playlist/{playlist_id}/recap", headers=auth_headers(token)).json()
+        assert latest["week_start"] == last_completed_week(now[0]).isoformat()
+
+    def test_last_completed_week(self):
+        assert last_completed_week(datetime(2026, 3, 4, 12, 0)).isoformat() == "2026-02-23"
+        assert last_completed_week(datetime(2026, 3, 2, 0, 0)).isoformat() == "2026-02-23"
+
+
+class TestMigrateJsonTracks:
+    def test_explodes_legacy_arrays(self, client, db_rollback):
+        token = register_user(client, suffix="plmig")
+        me = client.get("/api/auth/me", headers=auth_headers(token)).json()["id"]
+        playlist = SharedPlaylist(name="Legacy", created_by=me, playlist_type="group", tracks=[
+            {**_track("m1"), "added_by": me, "added_at": "2024-01-02T03:04:05"},
+            _track("m2"),
+            _track("m1"),
+            {"track_name": "No id", "artist": "Artist"},
+        ])
+        db_rollback.add(playlist)
+        db_rollback.flush()
+        db_rollback.add(PlaylistMember(playlist_id=playlist.id, user_id=me, role="owner"))
+
+        assert migrate_json_tracks(db_rollback) == 2
+        assert migrate_json_tracks(db_rollback) == 0
+        tracks = get_tracks(db_rollback, playlist.id)
+        assert [(t.spotify_id, t.position) for t in tracks] == [("m1", 0), ("m2", 1)]
+        assert tracks[0].added_by == me
+        assert tracks[0].added_at.isoformat() == "2024-01-02T03:04:05"
+        assert playlist.tracks == []
+
+        r = client.get(f"/api/playlist/{playlist.id}", headers=auth_headers(token))
+        assert [t["spotify_id"] for t in r.json()["tracks"]] == ["m1", "m2"]
+
+    def test_migrated_when_table_is_first_created(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'pre_tracks.db'}")
+        tables = [t for t in Base.metadata.sorted_tables if t.name != "playlist_tracks"]
+        Base.metadata.create_all(engine, tables=tables)
+        with Session(engine) as db:
+            me = User(email="plc@student.manchester.ac.uk", hashed_password="x", display_name="Me")
+            db.add(me)
+            db.flush()
+            playlist = SharedPlaylist(name="Legacy", created_by=me.id, playlist_type="group", tracks=[
+                {**_track("c1"), "added_by": me.id, "added_at": "2026-03-04T05:06:07"}, _track("c2"),
+            ])
+            db.add(playlist)
+            db.flush()
+            db.add(PlaylistMember(playlist_id=playlist.id, user_id=me.id, role="owner"))
+            db.commit()
+            me_id, playlist_id = me.id, playlist.id
+
+        Base.metadata.create_all(engine)
+
+        with Session(engine) as db:
+            assert [t.spotify_id for t in get_tracks(db, playlist_id)] == ["c1", "c2"]
+            assert get_playlist_counts(db, [playlist_id]) == {playlist_id: (1, 2)}
+            assert db.get(SharedPlaylist, playlist_id).tracks == []
+            contribution = db.query(PlaylistContribution).one()
+            assert (contribution.user_id, contribution.count) == (me_id, 1)
+        engine.dispose()
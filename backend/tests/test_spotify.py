@@ -1,5 +1,14 @@
 """Tests for /api/spotify endpoints (mock mode)."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+
+from app.core import metrics
+from app.services import search_cache
+from app.services.search_cache import SearchCache
+from app.services.spotify import search_tracks_cached
 from tests.conftest import auth_headers, register_user
 
 
@@ -105,3 +114,80 @@ class TestSpotifyDisconnect:
         token = register_user(client, suffix="spotdisc2")
         r = client.delete("/api/spotify/disconnect", headers=auth_headers(token))
         assert r.status_code == 200
+
+
+class TestSearchCache:
+    def _cache(self, maxsize=3, ttl=10.0):
+        now = {"t": 0.0}
+        return SearchCache(maxsize, ttl, clock=lambda: now["t"]), now
+
+    def test_hit_until_ttl_expires(self):
+        cache, now = self._cache()
+        calls = []
+        fetch = lambda: calls.append(1) or ["result"]  # noqa: E731
+        assert cache.get_or_fetch("q", fetch) == ["result"]
+        now["t"] = 9.9
+        assert cache.get_or_fetch("q", fetch) == ["result"]
+        assert len(calls) == 1
+        now["t"] = 10.0
+        cache.get_or_fetch("q", fetch)
+        assert len(calls) == 2
+
+    def test_least_recently_used_evicted(self):
+        cache, _ = self._cache(maxsize=2)
+        calls = []
+
+        def fetch(key):
+            return lambda: calls.append(key) or [key]
+
+        for key in ("a", "b", "a", "c", "a", "b"):
+            cache.get_or_fetch(key, fetch(key))
+        # "b" was evicted by "c" because "a" had been used more recently
+        assert calls == ["a", "b", "c", "b"]
+        assert len(cache) == 2
+
+    def test_concurrent_misses_coalesce(self):
+        cache, _ = self._cache()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ["shared"]
+
+        coalesced = metrics.get_counter("search_cache.coalesced")
+        with ThreadPoolExecutor(8) as pool:
+            first = pool.submit(cache.get_or_fetch, "q", slow_fetch)
+            started.wait(5)
+            rest = [pool.submit(cache.get_or_fetch, "q", slow_fetch) for _ in range(7)]
+            while metrics.get_counter("search_cache.coalesced") < coalesced + 7:
+                time.sleep(0.01)
+            release.set()
+            assert [f.result() for f in [first, *rest]] == [["shared"]] * 8
+        assert len(calls) == 1
+
+    def test_failures_are_not_cached(self):
+        cache, _ = self._cache()
+
+        def failing():
+            raise RuntimeError("spotify down")
+
+        with pytest.raises(RuntimeError):
+            cache.get_or_fetch("q", failing)
+        assert cache.get_or_fetch("q", lambda: ["back"]) == ["back"]
+
+    def test_routes_share_normalized_entries(self, monkeypatch):
+        calls = []
+
+        def fake_search(access_token, query, limit=10):
+            calls.append(query)
+            return [{"track_name": query}]
+
+        monkeypatch.setattr("app.services.spotify.search_tracks", fake_search)
+        search_cache.clear()
+        first = search_tracks_cached("token-a", "  Blinding   LIGHTS ")
+        assert search_tracks_cached("token-b", "blinding lights") == first
+        assert calls == ["blinding lights"]
+        assert search_cache.cache_stats()["upstream_calls_saved"] >= 1
@@ -1,7 +1,7 @@
 import { useEffect, useState, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
-import { getMatches, getUnreadCount, getConversation, sendMessage, markAsRead, getChatPrompts } from '../services/api';
+import { getInbox, getConversation, sendMessage, markAsRead, getChatPrompts } from '../services/api';
 import SongSearchModal from '../components/SongSearchModal';
 import NavBar from '../components/NavBar';
 
@@ -24,8 +24,7 @@ export default function FriendsPage() {
   const pollRef = useRef(null);
 
   useEffect(() => {
-    loadMatches();
-    loadUnread();
+    loadInbox();
   }, []);
 
   useEffect(() => {
@@ -44,17 +43,11 @@ export default function FriendsPage() {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
-  async function loadMatches() {
+  async function loadInbox() {
     try {
-      const data = await getMatches();
+      const data = await getInbox();
       setMatches(data);
-    } catch { /* ignore */ }
-  }
-
-  async function loadUnread() {
-    try {
-      const data = await getUnreadCount();
-      setUnreadByMatch(data.by_match || {});
+      setUnreadByMatch(Object.fromEntries(data.map(entry => [entry.id, entry.unread_count])));
     } catch { /* ignore */ }
   }
 
@@ -107,8 +100,11 @@ export default function FriendsPage() {
   const selectedMatch = matches.find(m => m.id === selectedMatchId);
 
   function getLastMessage(match) {
-    // We don't store last message per match client-side, show score as fallback
-    return `${Math.round(match.compatibility_score)}% compatible`;
+    const last = match.last_message;
+    if (!last) return `${Math.round(match.compatibility_score)}% compatible`;
+    const prefix = last.sender_id === user?.id ? 'You: ' : '';
+    if (last.message_type === 'song_share') return `${prefix}Shared a song`;
+    return `${prefix}${last.content}`;
   }
 
   function getAvatar(u) {
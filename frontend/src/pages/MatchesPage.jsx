@@ -1,6 +1,6 @@
 import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getMatches, getUnreadCount } from '../services/api';
+import { getMatches, getUnreadCount, subscribeToEvents } from '../services/api';
 import NavBar from '../components/NavBar';
 
 export default function MatchesPage() {
@@ -14,6 +14,16 @@ export default function MatchesPage() {
   useEffect(() => {
     loadMatches();
     loadUnread();
+    return subscribeToEvents((event) => {
+      if (event.type === 'unread') {
+        setUnreadByMatch(prev => ({ ...prev, [event.match_id]: event.count }));
+      } else if (event.type === 'match') {
+        loadMatches();
+      } else if (event.type === 'resync') {
+        loadMatches();
+        loadUnread();
+      }
+    });
   }, []);
 
   async function loadMatches() {
@@ -17,6 +17,8 @@ export default function PlaylistDetailPage() {
   const navigate = useNavigate();
   const { user } = useAuth();
   const [playlist, setPlaylist] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [showSongSearch, setShowSongSearch] = useState(false);
@@ -29,8 +31,9 @@ export default function PlaylistDetailPage() {
 
   async function loadPlaylist() {
     try {
-      const data = await getPlaylist(playlistId);
-      setPlaylist(data);
+      const page = await getPlaylist(playlistId);
+      setPlaylist(page.playlist);
+      setNextCursor(page.nextCursor);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -38,6 +41,19 @@ export default function PlaylistDetailPage() {
     }
   }
 
+  async function loadMoreTracks() {
+    setLoadingMore(true);
+    try {
+      const page = await getPlaylist(playlistId, nextCursor);
+      setPlaylist((prev) => ({ ...prev, tracks: [...prev.tracks, ...page.playlist.tracks] }));
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   async function loadRecap() {
     try {
       const data = await getWeeklyRecap(playlistId);
@@ -57,8 +73,13 @@ export default function PlaylistDetailPage() {
         spotify_url: track.spotify_url,
         spotify_id: track.spotify_id,
       };
-      const updated = await addTrackToPlaylist(playlistId, trackData);
-      setPlaylist(updated);
+      const delta = await addTrackToPlaylist(playlistId, trackData);
+      // New tracks go last, so only show it once the final page is loaded
+      setPlaylist((prev) => ({
+        ...prev,
+        tracks: nextCursor ? prev.tracks : [...prev.tracks, delta.added],
+        track_count: delta.track_count,
+      }));
       setShowSongSearch(false);
     } catch (err) {
       setError(err.message);
@@ -67,8 +88,12 @@ export default function PlaylistDetailPage() {
 
   async function handleRemoveTrack(spotifyId) {
     try {
-      const updated = await removeTrackFromPlaylist(playlistId, spotifyId);
-      setPlaylist(updated);
+      const delta = await removeTrackFromPlaylist(playlistId, spotifyId);
+      setPlaylist((prev) => ({
+        ...prev,
+        tracks: prev.tracks.filter((t) => t.spotify_id !== delta.removed),
+        track_count: delta.track_count,
+      }));
     } catch (err) {
       setError(err.message);
     }
@@ -76,8 +101,8 @@ export default function PlaylistDetailPage() {
 
   async function handleRemoveMember(userId) {
     try {
-      const updated = await removePlaylistMember(playlistId, userId);
-      setPlaylist(updated);
+      const members = await removePlaylistMember(playlistId, userId);
+      setPlaylist((prev) => ({ ...prev, members, member_count: members.length }));
     } catch (err) {
       setError(err.message);
     }
@@ -157,7 +182,7 @@ export default function PlaylistDetailPage() {
         {/* Weekly Recap */}
         {recap && recap.recap_data && recap.recap_data.tracks_added > 0 && (
           <div className="weekly-recap-card">
-            <h3>This Week's Recap</h3>
+            <h3>Week of {recap.week_start}</h3>
             <div className="recap-stats">
               <div className="recap-stat">
                 <span className="recap-stat-value">{recap.recap_data.tracks_added}</span>
@@ -208,6 +233,15 @@ export default function PlaylistDetailPage() {
                   </button>
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  className="btn-secondary"
+                  onClick={loadMoreTracks}
+                  disabled={loadingMore}
+                >
+                  {loadingMore ? 'Loading...' : 'Load more tracks'}
+                </button>
+              )}
             </div>
           )}
         </div>
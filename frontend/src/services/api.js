@@ -1,6 +1,6 @@
 const API_BASE = import.meta.env.VITE_API_URL || '/api';
 
-async function request(endpoint, options = {}) {
+async function requestWithResponse(endpoint, options = {}) {
   const token = localStorage.getItem('token');
   const headers = {
     'Content-Type': 'application/json',
@@ -22,9 +22,28 @@ async function request(endpoint, options = {}) {
     throw new Error(data.detail || 'Something went wrong');
   }
 
+  return { data, response };
+}
+
+async function request(endpoint, options = {}) {
+  const { data } = await requestWithResponse(endpoint, options);
   return data;
 }
 
+// Follow X-Next-Cursor headers and return the items of every page
+async function requestAllPages(endpoint) {
+  const items = [];
+  let cursor = null;
+  do {
+    const separator = endpoint.includes('?') ? '&' : '?';
+    const url = cursor ? `${endpoint}${separator}cursor=${encodeURIComponent(cursor)}` : endpoint;
+    const { data, response } = await requestWithResponse(url);
+    items.push(...data);
+    cursor = response.headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+}
+
 // UoM CAS authentication
 export function casInitiate(callbackUrl) {
   return request(`/auth/cas/initiate?callback_url=${encodeURIComponent(callbackUrl)}`);
@@ -123,12 +142,24 @@ export function swipe(targetUserId, action) {
 }
 
 export function getMatches() {
-  return request('/match/matches');
+  return requestAllPages('/match/matches?limit=100');
 }
 
 // Chat
-export function getConversation(matchId, limit = 50, offset = 0) {
-  return request(`/chat/${matchId}?limit=${limit}&offset=${offset}`);
+// Latest messages by default; pass { beforeId } for older history or { afterId } for newer
+export function getConversation(matchId, limit = 50, { beforeId, afterId } = {}) {
+  const params = new URLSearchParams({ limit });
+  if (beforeId) params.set('before_id', beforeId);
+  if (afterId) params.set('after_id', afterId);
+  return request(`/chat/${matchId}?${params}`);
+}
+
+// Full-text hits within one conversation, newest first; pass the X-Next-Cursor value for more
+export async function searchConversation(matchId, query, cursor = null) {
+  const params = new URLSearchParams({ q: query });
+  if (cursor) params.set('cursor', cursor);
+  const { data, response } = await requestWithResponse(`/chat/${matchId}/search?${params}`);
+  return { hits: data, nextCursor: response.headers.get('X-Next-Cursor') };
 }
 
 export function sendMessage(matchId, data) {
@@ -142,6 +173,21 @@ export function markAsRead(matchId) {
   return request(`/chat/${matchId}/read`, { method: 'PUT' });
 }
 
+// Every conversation with its last message and unread count, most recently active first
+export function getInbox() {
+  return requestAllPages('/chat/inbox?limit=100');
+}
+
+// Server-sent badge events (unread, match, reaction, resync); returns a function that closes the stream
+export function subscribeToEvents(onEvent) {
+  const token = localStorage.getItem('token');
+  const source = new EventSource(`${API_BASE}/events/stream?token=${encodeURIComponent(token || '')}`);
+  for (const type of ['unread', 'match', 'reaction', 'resync']) {
+    source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)));
+  }
+  return () => source.close();
+}
+
 export function getUnreadCount() {
   return request('/chat/unread/count');
 }
@@ -159,8 +205,12 @@ export function getPlaylists() {
   return request('/playlist');
 }
 
-export function getPlaylist(playlistId) {
-  return request(`/playlist/${playlistId}`);
+// The playlist with its first page of tracks; pass the returned nextCursor for more
+export async function getPlaylist(playlistId, cursor = null) {
+  const params = new URLSearchParams();
+  if (cursor) params.set('cursor', cursor);
+  const { data, response } = await requestWithResponse(`/playlist/${playlistId}?${params}`);
+  return { playlist: data, nextCursor: response.headers.get('X-Next-Cursor') };
 }
 
 export function createPlaylist(data) {
@@ -170,6 +220,7 @@ export function createPlaylist(data) {
   });
 }
 
+// Track mutations return a delta: { added | removed, track_count }
 export function addTrackToPlaylist(playlistId, track) {
   return request(`/playlist/${playlistId}/tracks`, {
     method: 'POST',
@@ -177,6 +228,14 @@ export function addTrackToPlaylist(playlistId, track) {
   });
 }
 
+// Add many tracks at once; returns { added, skipped, track_count }
+export function addTracksToPlaylist(playlistId, tracks) {
+  return request(`/playlist/${playlistId}/tracks:batch`, {
+    method: 'POST',
+    body: JSON.stringify({ tracks }),
+  });
+}
+
 export function removeTrackFromPlaylist(playlistId, spotifyId) {
   return request(`/playlist/${playlistId}/tracks/${spotifyId}`, {
     method: 'DELETE',